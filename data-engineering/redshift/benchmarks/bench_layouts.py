@@ -0,0 +1,136 @@
+"""
+Parquet Layout Benchmark
+Compares the index-suffixed flattened layout against the nested struct/list
+layout on generated orders: file size, write time, column count and how many
+distinct schemas the batches produce. Exits non-zero if the nested batches
+do not all share one schema.
+"""
+
+import argparse
+import json
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from json_to_parquet import create_flattened_dataframe, create_nested_table, optimize_dtypes
+from order_generator import OrderGenerator, fake
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def generate_orders(count: int, min_items: int, max_items: int, seed: int) -> List[Dict[str, Any]]:
+    """Generate a reproducible list of orders."""
+    random.seed(seed)
+    fake.seed_instance(seed)
+    generator = OrderGenerator()
+    return [generator.generate_order(min_items, max_items) for _ in range(count)]
+
+
+def write_flattened(orders: List[Dict[str, Any]], path: Path, compression: str) -> pa.Schema:
+    df = optimize_dtypes(create_flattened_dataframe(orders))
+    df.to_parquet(path, compression=compression, index=False)
+    return pa.Schema.from_pandas(df, preserve_index=False)
+
+
+def write_nested(orders: List[Dict[str, Any]], path: Path, compression: str) -> pa.Schema:
+    table = create_nested_table(orders)
+    pq.write_table(table, path, compression=compression)
+    return table.schema
+
+
+def run_layout(name: str, writer, batches: List[List[Dict[str, Any]]], output_dir: Path,
+               compression: str) -> Dict[str, Any]:
+    """Write every batch with one layout and collect size/time/schema figures."""
+    schemas = set()
+    total_bytes = 0
+    max_columns = 0
+    started = time.perf_counter()
+    for index, batch in enumerate(batches):
+        path = output_dir / f"{name}_{index:04d}.parquet"
+        schema = writer(batch, path, compression)
+        schemas.add(schema.remove_metadata().to_string())
+        total_bytes += path.stat().st_size
+        max_columns = max(max_columns, pq.ParquetFile(path).metadata.num_columns)
+    elapsed = time.perf_counter() - started
+
+    orders = sum(len(batch) for batch in batches)
+    return {
+        'write_seconds': round(elapsed, 3),
+        'orders_per_second': round(orders / elapsed, 1) if elapsed else None,
+        'total_bytes': total_bytes,
+        'bytes_per_order': round(total_bytes / orders, 1),
+        'max_leaf_columns': max_columns,
+        'distinct_batch_schemas': len(schemas),
+    }
+
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compare flattened vs nested Parquet layouts on generated orders.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python bench_layouts.py
+  python bench_layouts.py --orders 5000 --batch-size 500 --max-items 50
+  python bench_layouts.py --compression zstd --json-output layouts.json
+        """
+    )
+
+    parser.add_argument('--orders', type=int, default=2000, help='Number of orders to generate (default: 2000)')
+    parser.add_argument('--batch-size', type=int, default=250, help='Orders per output file (default: 250)')
+    parser.add_argument('--min-items', type=int, default=1, help='Minimum items per order (default: 1)')
+    parser.add_argument('--max-items', type=int, default=50, help='Maximum items per order (default: 50)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('-c', '--compression', choices=['snappy', 'gzip', 'brotli', 'lz4', 'zstd'],
+                        default='snappy', help='Compression algorithm to use (default: snappy)')
+    parser.add_argument('--json-output', help='Write the results as JSON to this file')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main execution function."""
+    args = parse_arguments()
+
+    logger.info(f"Generating {args.orders} orders with {args.min_items}-{args.max_items} items...")
+    orders = generate_orders(args.orders, args.min_items, args.max_items, args.seed)
+    batches = [orders[i:i + args.batch_size] for i in range(0, len(orders), args.batch_size)]
+
+    results = {'orders': args.orders, 'batch_size': args.batch_size,
+               'items': [args.min_items, args.max_items], 'compression': args.compression}
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, writer in (('flattened', write_flattened), ('nested', write_nested)):
+            logger.info(f"Writing {len(batches)} batch(es) with the {name} layout...")
+            results[name] = run_layout(name, writer, batches, Path(tmp), args.compression)
+
+    print("\n" + "="*60)
+    print("LAYOUT BENCHMARK")
+    print("="*60)
+    print(f"{'metric':<26}{'flattened':>16}{'nested':>16}")
+    for metric in results['flattened']:
+        print(f"{metric:<26}{str(results['flattened'][metric]):>16}{str(results['nested'][metric]):>16}")
+
+    if args.json_output:
+        Path(args.json_output).write_text(json.dumps(results, indent=2))
+        logger.info(f"Results written to: {args.json_output}")
+
+    # The nested layout is built against a declared schema, so every batch must share it
+    if results['nested']['distinct_batch_schemas'] != 1:
+        logger.error(f"Nested layout produced {results['nested']['distinct_batch_schemas']} distinct batch schemas")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
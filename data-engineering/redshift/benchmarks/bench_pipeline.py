@@ -0,0 +1,290 @@
+"""
+Pipeline Scaling Benchmark
+Runs the generator -> JSON -> Parquet -> read-back pipeline at several
+dataset scales with fixed seeds and records per-step time, throughput, peak
+memory and output size. Each case runs in a fresh process so its peak RSS is
+its own. Results are appended to a JSON Lines history keyed by git commit, so
+scaling curves and regressions can be compared across commits; everything
+runs offline.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from json_to_parquet import convert_json_stream
+from order_generator import OrderGenerator, fake
+from profiling import peak_rss_mb
+from validation import OrderValidator
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_RESULTS = Path(__file__).resolve().parent / 'results' / 'pipeline.jsonl'
+TIMED_STEPS = ('generate', 'serialize', 'convert', 'read_back')
+
+
+def parse_item_range(value: str) -> Tuple[int, int]:
+    """Parse '1-5' into (1, 5)."""
+    low, _, high = value.partition('-')
+    return int(low), int(high or low)
+
+
+def git_revision() -> Dict[str, Any]:
+    """Return the current commit and whether the tree has uncommitted changes."""
+    cwd = Path(__file__).resolve().parent
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=cwd,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=cwd,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {'commit': 'unknown', 'dirty': None}
+    return {'commit': commit, 'dirty': dirty}
+
+
+def write_dataset(input_dir: Path, orders: int, min_items: int, max_items: int,
+                  seed: int, shard_size: int) -> Dict[str, Any]:
+    """
+    Generate orders and write them as NDJSON shards of shard_size orders.
+
+    Orders are produced and serialized one shard at a time so memory does not
+    grow with the dataset size; generation and serialization are timed apart.
+
+    Returns:
+        Step timings and the total JSON size
+    """
+    random.seed(seed)
+    fake.seed_instance(seed)
+    generator = OrderGenerator()
+    generate_seconds = serialize_seconds = 0.0
+    json_bytes = 0
+
+    for shard, start in enumerate(range(0, orders, shard_size)):
+        count = min(shard_size, orders - start)
+        started = time.perf_counter()
+        batch = [generator.generate_order(min_items, max_items) for _ in range(count)]
+        generate_seconds += time.perf_counter() - started
+
+        started = time.perf_counter()
+        text = '\n'.join(json.dumps(order, ensure_ascii=False) for order in batch) + '\n'
+        with open(input_dir / f"orders-{shard:05d}.ndjson", 'w', encoding='utf-8') as f:
+            json_bytes += f.write(text)
+        serialize_seconds += time.perf_counter() - started
+
+    return {'generate': generate_seconds, 'serialize': serialize_seconds, 'json_bytes': json_bytes}
+
+
+def read_back(paths: List[str]) -> int:
+    """Read every output file fully and return the total row count."""
+    return sum(pq.read_table(path).num_rows for path in paths)
+
+
+def run_case(case: Dict[str, Any]) -> Dict[str, Any]:
+    """Run one scale/items case end to end; executed in its own process."""
+    logging.getLogger().setLevel(logging.WARNING)
+    orders = case['orders']
+    with tempfile.TemporaryDirectory() as tmp:
+        input_dir, output_dir = Path(tmp) / 'json', Path(tmp) / 'parquet'
+        input_dir.mkdir()
+        dataset = write_dataset(input_dir, orders, case['min_items'], case['max_items'],
+                                case['seed'], case['shard_size'])
+
+        validator = OrderValidator() if case['validate'] else None
+        started = time.perf_counter()
+        created = convert_json_stream([str(input_dir)], str(output_dir), compression=case['compression'],
+                                      layout=case['layout'], batch_size=case['batch_size'], validator=validator)
+        convert_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        rows = read_back(list(created.values()))
+        read_seconds = time.perf_counter() - started
+
+        parquet_bytes = sum(Path(p).stat().st_size for p in created.values())
+
+    seconds = {'generate': dataset['generate'], 'serialize': dataset['serialize'],
+               'convert': convert_seconds, 'read_back': read_seconds}
+    return {
+        **case,
+        'seconds': {step: round(value, 3) for step, value in seconds.items()},
+        'orders_per_second': {step: round(orders / value, 1) if value else None for step, value in seconds.items()},
+        'json_bytes': dataset['json_bytes'],
+        'parquet_bytes': parquet_bytes,
+        'compression_ratio': round(dataset['json_bytes'] / parquet_bytes, 2) if parquet_bytes else None,
+        'parquet_files': len(created),
+        'rows_read': rows,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def case_key(result: Dict[str, Any]) -> Tuple:
+    return (result['orders'], result['min_items'], result['max_items'], result['layout'],
+            result['compression'], result.get('validate', False))
+
+
+def load_history(path: Path) -> List[Dict[str, Any]]:
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare_runs(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Print per-step ratios against a baseline run.
+
+    Returns:
+        Regressions where a step got slower (or peak memory grew) by more than threshold
+    """
+    baseline_cases = {case_key(r): r for r in baseline['results']}
+    regressions = []
+    print(f"\nComparison with {baseline['commit']} (ratio = current / baseline):")
+    for result in current['results']:
+        old = baseline_cases.get(case_key(result))
+        if old is None:
+            continue
+        label = f"{result['orders']:>9,} orders, {result['min_items']}-{result['max_items']} items"
+        ratios = {step: result['seconds'][step] / old['seconds'][step]
+                  for step in TIMED_STEPS if old['seconds'].get(step)}
+        if old.get('peak_rss_mb') and result.get('peak_rss_mb'):
+            ratios['peak_rss'] = result['peak_rss_mb'] / old['peak_rss_mb']
+        print(f"  {label}: " + ', '.join(f"{name} x{ratio:.2f}" for name, ratio in ratios.items()))
+        regressions.extend(f"{label}: {name} x{ratio:.2f}" for name, ratio in ratios.items()
+                           if ratio > 1 + threshold)
+    return regressions
+
+
+def find_baseline(history: List[Dict[str, Any]], commit: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Latest recorded run for the given commit prefix, or the latest run if commit is None."""
+    for run in reversed(history):
+        if commit is None or run['commit'].startswith(commit) or commit.startswith(run['commit']):
+            return run
+    return None
+
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print("\n" + "="*96)
+    print("PIPELINE SCALING BENCHMARK")
+    print("="*96)
+    print(f"{'orders':>10}{'items':>8}" + ''.join(f"{step + ' o/s':>14}" for step in TIMED_STEPS)
+          + f"{'peak MiB':>10}{'json MiB':>10}{'pq MiB':>9}")
+    for r in results:
+        rates = ''.join(f"{str(r['orders_per_second'][step]):>14}" for step in TIMED_STEPS)
+        print(f"{r['orders']:>10,}{str(r['min_items']) + '-' + str(r['max_items']):>8}{rates}"
+              f"{str(r['peak_rss_mb']):>10}{r['json_bytes'] / 1048576:>10.1f}{r['parquet_bytes'] / 1048576:>9.1f}")
+
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark generation, serialization, conversion and read-back at several scales.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python bench_pipeline.py --scales 1000
+  python bench_pipeline.py --scales 1000,100000 --items 1-5,1-50
+  python bench_pipeline.py --compare HEAD~1 --max-regression 0.15
+  python bench_pipeline.py --layout nested --results nested.jsonl --no-record
+  python bench_pipeline.py --scales 100000 --items 1-50 --validate --compare
+        """
+    )
+
+    parser.add_argument('--scales', default='1000,100000,1000000',
+                        help='Comma-separated order counts (default: 1000,100000,1000000)')
+    parser.add_argument('--items', default='1-5,1-50',
+                        help='Comma-separated items-per-order ranges (default: 1-5,1-50)')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed (default: 42)')
+    parser.add_argument('--layout', choices=['flattened', 'nested'], default='flattened',
+                        help='Parquet layout to convert to (default: flattened)')
+    parser.add_argument('-c', '--compression', choices=['snappy', 'gzip', 'brotli', 'lz4', 'zstd'],
+                        default='snappy', help='Compression algorithm to use (default: snappy)')
+    parser.add_argument('--validate', action='store_true', help='Run pre-load validation during conversion')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Orders per record batch (default: 1000)')
+    parser.add_argument('--shard-size', type=int, default=10000,
+                        help='Orders per generated NDJSON file (default: 10000)')
+    parser.add_argument('--results', default=str(DEFAULT_RESULTS),
+                        help=f'JSON Lines history to append to (default: {DEFAULT_RESULTS.name} in benchmarks/results)')
+    parser.add_argument('--no-record', action='store_true', help='Do not append this run to the history')
+    parser.add_argument('--compare', metavar='COMMIT', nargs='?', const='',
+                        help='Compare with the latest recorded run of COMMIT (or the previous run if omitted)')
+    parser.add_argument('--max-regression', type=float, default=0.10,
+                        help='With --compare, fail if a step is this much slower (default: 0.10)')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main execution function."""
+    args = parse_arguments()
+    scales = [int(s) for s in args.scales.split(',') if s.strip()]
+    item_ranges = [parse_item_range(r) for r in args.items.split(',') if r.strip()]
+
+    history = load_history(Path(args.results))
+    revision = git_revision()
+    run = {
+        **revision,
+        'recorded_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'pyarrow': pyarrow.__version__,
+        'machine': platform.machine(),
+        'results': [],
+    }
+
+    # A fresh spawned process per case keeps peak RSS figures independent
+    context = multiprocessing.get_context('spawn')
+    for orders in scales:
+        for min_items, max_items in item_ranges:
+            case = {'orders': orders, 'min_items': min_items, 'max_items': max_items, 'seed': args.seed,
+                    'layout': args.layout, 'compression': args.compression, 'validate': args.validate,
+                    'batch_size': args.batch_size, 'shard_size': args.shard_size}
+            logger.info(f"Running {orders:,} orders with {min_items}-{max_items} items...")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                result = pool.submit(run_case, case).result()
+            logger.info(f"Finished in {sum(result['seconds'].values()):.1f}s, peak RSS {result['peak_rss_mb']} MiB")
+            run['results'].append(result)
+
+    print_results(run['results'])
+
+    if not args.no_record:
+        results_path = Path(args.results)
+        results_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(results_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run) + '\n')
+        logger.info(f"Recorded run for commit {revision['commit']} in: {results_path}")
+
+    if args.compare is not None:
+        commit = args.compare or None
+        if commit:
+            resolved = subprocess.run(['git', 'rev-parse', '--short', commit], cwd=Path(__file__).resolve().parent,
+                                      capture_output=True, text=True)
+            commit = resolved.stdout.strip() or commit
+        baseline = find_baseline(history, commit)
+        if baseline is None:
+            logger.error(f"No recorded run found for {commit or 'a previous run'} in {args.results}")
+            sys.exit(2)
+        regressions = compare_runs(run, baseline, args.max_regression)
+        if regressions:
+            for regression in regressions:
+                logger.error(f"Regression: {regression}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+CLI Cold-Start Check
+Runs each CLI with `python -X importtime <script> --help` in a fresh
+interpreter and fails when its import time exceeds a budget or when a heavy
+dependency (pandas, pyarrow, numpy, faker) is loaded just to print help.
+Import time is measured on top of a bare interpreter, so what `site` loads
+in a given environment does not count against the scripts. Exits non-zero
+on a breach. The repo has no test runner or CI, so nothing runs this
+automatically: run it by hand after changing what a CLI imports at startup.
+"""
+
+import argparse
+import logging
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRIPT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_SCRIPTS = ('json_to_parquet.py', 'order_generator.py')
+DEFAULT_FORBIDDEN = ('pandas', 'pyarrow', 'numpy', 'faker')
+
+# "import time:       self [us] |  cumulative | imported package"
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)')
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """
+    Parse `-X importtime` output.
+
+    Args:
+        stderr: Standard error of the interpreter
+
+    Returns:
+        Mapping of module name to its self import time in microseconds
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            modules[match.group(4)] = int(match.group(1))
+    return modules
+
+
+def measure(args: List[str]) -> Dict[str, Any]:
+    """Run one fresh interpreter with -X importtime and return wall time and imported modules."""
+    command = [sys.executable, '-X', 'importtime'] + args
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=SCRIPT_DIR, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(args)} exited with {result.returncode}:\n{result.stderr[-2000:]}")
+    return {'wall_ms': wall * 1000, 'modules': parse_importtime(result.stderr)}
+
+
+def check_script(script: str, baseline: Dict[str, int], repeat: int,
+                 forbidden: List[str]) -> Dict[str, Any]:
+    """
+    Measure the cold start of one CLI.
+
+    Args:
+        script: Script file name, relative to the redshift directory
+        baseline: Modules a bare interpreter imports, to leave out of the total
+        repeat: Runs to take the fastest of
+        forbidden: Top-level packages that must not be imported for --help
+
+    Returns:
+        Best import/wall times, the slowest imports and any forbidden packages loaded
+    """
+    runs = [measure([script, '--help']) for _ in range(repeat)]
+    best = min(runs, key=lambda run: sum(run['modules'].values()))
+    own = {name: us for name, us in best['modules'].items() if name not in baseline}
+    loaded = sorted({name.split('.')[0] for name in own} & set(forbidden))
+    return {
+        'script': script,
+        'import_ms': sum(own.values()) / 1000,
+        'wall_ms': min(run['wall_ms'] for run in runs),
+        'slowest': sorted(own.items(), key=lambda item: item[1], reverse=True)[:5],
+        'forbidden_loaded': loaded,
+    }
+
+
+def parse_arguments():
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Fail when a CLI takes too long to start or loads heavy dependencies for --help.',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python benchmarks/check_startup.py
+  python benchmarks/check_startup.py --budget-ms 50 --repeat 5
+  python benchmarks/check_startup.py --script json_to_parquet.py --allow numpy
+        """
+    )
+    parser.add_argument(
+        '--script',
+        action='append',
+        help=f'CLI to check, relative to the redshift directory; repeatable (default: {", ".join(DEFAULT_SCRIPTS)})'
+    )
+    parser.add_argument(
+        '--budget-ms',
+        type=float,
+        default=80.0,
+        help='Maximum import time per script beyond a bare interpreter, in ms (default: 80)'
+    )
+    parser.add_argument(
+        '--repeat',
+        type=int,
+        default=3,
+        help='Runs per script; the fastest is compared to the budget (default: 3)'
+    )
+    parser.add_argument(
+        '--allow',
+        action='append',
+        default=[],
+        help=f'Heavy package allowed at startup; repeatable (checked: {", ".join(DEFAULT_FORBIDDEN)})'
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_arguments()
+    scripts = args.script or list(DEFAULT_SCRIPTS)
+    forbidden = [name for name in DEFAULT_FORBIDDEN if name not in args.allow]
+
+    try:
+        baseline = min((measure(['-c', 'pass'])['modules'] for _ in range(args.repeat)),
+                       key=lambda modules: sum(modules.values()))
+        results = [check_script(script, baseline, args.repeat, forbidden) for script in scripts]
+    except RuntimeError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    failed = False
+    print(f"\n⏱️  Cold start (--help), budget {args.budget_ms:.0f} ms of imports per script:")
+    for result in results:
+        over_budget = result['import_ms'] > args.budget_ms
+        ok = not over_budget and not result['forbidden_loaded']
+        failed = failed or not ok
+        print(f"   {'✅' if ok else '❌'} {result['script']}: imports {result['import_ms']:.1f} ms, "
+              f"wall {result['wall_ms']:.0f} ms")
+        if result['forbidden_loaded']:
+            print(f"      Heavy packages loaded: {', '.join(result['forbidden_loaded'])}")
+        if over_budget or result['forbidden_loaded']:
+            for name, us in result['slowest']:
+                print(f"      {us / 1000:8.1f} ms  {name}")
+
+    if failed:
+        print("\n❌ Startup check failed")
+        sys.exit(1)
+    print("\n✅ Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""
+Column Profiler and Redshift DDL Advisor
+Streams record batches of Parquet outputs through per-column profiles
+(HyperLogLog distinct count, null ratio, min/max, maximum byte length and
+the most frequent values) and turns them into Redshift DDL: VARCHAR(n) and
+integer widths sized from the data with headroom for growth, AZ64/ZSTD/BYTEDICT
+encodings, and a DISTKEY/SORTKEY suggestion checked against cardinality and
+skew. Replaces the hand-written, unencoded CREATE TABLE statements of the
+guide. Memory per column is fixed (16 KiB of HyperLogLog registers plus a
+bounded heavy-hitter table), so any dataset size can be profiled.
+"""
+
+import argparse
+import json
+import logging
+import math
+import re
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from compact_parquet import DEFAULT_TABLE_PATTERN, live_files, table_name
+from schema_unification import SchemaUnifier
+from sorted_output import DEFAULT_SORT_KEYS, resolve_column
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+HLL_PRECISION = 14  # 16384 registers, ~0.8% standard error
+HEAVY_HITTERS = 64
+BYTEDICT_MAX_DISTINCT = 255
+# Near-unique columns, or samples too small to tell, compress better with ZSTD than a dictionary
+BYTEDICT_MAX_DISTINCT_RATIO = 0.1
+BYTEDICT_MIN_ROWS = 1000
+# One sample says little about tomorrow's values, so widths leave this much room to grow
+SIZE_HEADROOM = 1.25
+VARCHAR_MAX = 65535
+# Codes with a fixed format keep their exact width; other fixed-width samples get headroom
+FIXED_WIDTH_CODE = re.compile(r'(?i)(^|[_.])(state|currency|country)$')
+# Ids and sequences only grow, so they are BIGINT whatever the sample holds
+GROWING_INTEGER = re.compile(r'(?i:(^|[_.])(id|seq|sequence))$|[a-z0-9](Id|Seq|Sequence)$')
+
+# Join key shared by orders and items, so a DISTKEY on it co-locates their joins
+DISTKEY_CANDIDATES = ('orderId',)
+DISTKEY_MIN_DISTINCT = 1000
+DISTKEY_MAX_TOP_SHARE = 0.05  # Rows of the most frequent value, all stored on one slice
+DISTKEY_MAX_NULL_RATIO = 0.05
+DISTSTYLE_ALL_MAX_ROWS = 100_000
+
+# json_to_parquet output name -> table name used in the guide
+REDSHIFT_TABLE_NAMES = {'order_summary': 'orders'}
+
+AZ64_TYPES = ('SMALLINT', 'INTEGER', 'BIGINT', 'DECIMAL', 'DATE', 'TIMESTAMP', 'TIMESTAMPTZ')
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class HyperLogLog:
+    """Mergeable distinct-count sketch over 64-bit hashes."""
+
+    def __init__(self, precision: int = HLL_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        """Fold an array of uint64 hashes into the registers."""
+        if not len(hashes):
+            return
+        width = 64 - self.precision
+        index = (hashes >> np.uint64(width)).astype(np.intp)
+        rest = hashes & np.uint64((1 << width) - 1)
+        # Bit length of the remaining bits by binary search, vectorized
+        length = np.zeros(len(rest), dtype=np.uint8)
+        for shift in (32, 16, 8, 4, 2, 1):
+            wide = rest >= np.uint64(1 << shift)
+            rest = np.where(wide, rest >> np.uint64(shift), rest)
+            length += wide.astype(np.uint8) * shift
+        length += (rest > 0).astype(np.uint8)
+        np.maximum.at(self.registers, index, (width + 1 - length).astype(np.uint8))
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int32)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # Linear counting is more accurate for small sets
+        return int(round(estimate))
+
+
+def _hash_values(values: pa.Array) -> np.ndarray:
+    if pa.types.is_temporal(values.type):
+        values = values.view(pa.int64()) if values.type.bit_width == 64 else values.cast(pa.int64())
+    elif pa.types.is_decimal(values.type) or pa.types.is_binary(values.type):
+        values = values.cast(pa.string())
+    elif pa.types.is_boolean(values.type):
+        values = values.cast(pa.uint8())
+    return pd.util.hash_array(values.to_numpy(zero_copy_only=False), categorize=False)
+
+
+class ColumnProfile:
+    """Streaming statistics for one column."""
+
+    def __init__(self, name: str, data_type: pa.DataType):
+        self.name = name
+        self.type = data_type
+        self.rows = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        self.min_bytes = None
+        self.max_bytes = None
+        self.hll = HyperLogLog()
+        # Misra-Gries summary: counts are lower bounds, off by at most rows / (HEAVY_HITTERS + 1)
+        self.heavy: Dict[Any, int] = {}
+
+    @property
+    def scalar(self) -> bool:
+        return not (pa.types.is_nested(self.type) or pa.types.is_null(self.type))
+
+    def update(self, column: pa.Array) -> None:
+        """Fold one batch of the column into the profile."""
+        self.rows += len(column)
+        self.nulls += column.null_count
+        if not self.scalar or column.null_count == len(column):
+            return
+
+        bounds = pc.min_max(column)
+        low, high = bounds['min'].as_py(), bounds['max'].as_py()
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        if pa.types.is_string(self.type) or pa.types.is_large_string(self.type) or pa.types.is_binary(self.type):
+            lengths = pc.min_max(pc.binary_length(column))
+            low, high = lengths['min'].as_py(), lengths['max'].as_py()
+            self.min_bytes = low if self.min_bytes is None else min(self.min_bytes, low)
+            self.max_bytes = high if self.max_bytes is None else max(self.max_bytes, high)
+
+        # Hashing each distinct value of the batch once is enough for the sketch
+        counts = pc.value_counts(column.drop_null())
+        self.hll.add_hashes(_hash_values(counts.field('values')))
+        for value, count in zip(counts.field('values').to_pylist(), counts.field('counts').to_pylist()):
+            self.heavy[value] = self.heavy.get(value, 0) + count
+        if len(self.heavy) > HEAVY_HITTERS:
+            cut = sorted(self.heavy.values(), reverse=True)[HEAVY_HITTERS]
+            self.heavy = {value: count - cut for value, count in self.heavy.items() if count > cut}
+
+    @property
+    def distinct(self) -> int:
+        return min(self.hll.estimate(), self.rows - self.nulls)
+
+    @property
+    def null_ratio(self) -> float:
+        return self.nulls / self.rows if self.rows else 0.0
+
+    @property
+    def top_share(self) -> Optional[float]:
+        """Share of non-null rows holding the most frequent value (a lower bound, see heavy)."""
+        non_null = self.rows - self.nulls
+        if not self.heavy or not non_null:
+            return None
+        return max(self.heavy.values()) / non_null
+
+    def to_dict(self) -> Dict[str, Any]:
+        top = sorted(self.heavy.items(), key=lambda item: item[1], reverse=True)[:5]
+        return {
+            'type': str(self.type),
+            'rows': self.rows,
+            'nulls': self.nulls,
+            'null_ratio': round(self.null_ratio, 4),
+            'distinct': self.distinct if self.scalar else None,
+            'min': self.min,
+            'max': self.max,
+            'min_bytes': self.min_bytes,
+            'max_bytes': self.max_bytes,
+            'top_share': round(self.top_share, 4) if self.top_share is not None else None,
+            'top_values': [{'value': value, 'count': count} for value, count in top],
+        }
+
+
+class TableProfile:
+    """Column profiles of one output, fed with batches conformed to its unified schema."""
+
+    def __init__(self, name: str, schema: pa.Schema):
+        self.name = name
+        self.rows = 0
+        self.files = 0
+        self.columns = {field.name: ColumnProfile(field.name, field.type) for field in schema}
+
+    def update(self, batch: pa.RecordBatch) -> None:
+        self.rows += batch.num_rows
+        for name, column in zip(batch.schema.names, batch.columns):
+            self.columns[name].update(column)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'rows': self.rows,
+            'files': self.files,
+            'columns': {name: profile.to_dict() for name, profile in self.columns.items()},
+        }
+
+
+def profile_files(paths: Iterable[str], root: str, table_pattern: str = DEFAULT_TABLE_PATTERN,
+                  batch_rows: int = 65536) -> Dict[str, TableProfile]:
+    """
+    Profile Parquet files batch by batch, grouped into tables like compact_parquet.py does.
+
+    Files of one table may have drifted apart (a column added, int widened to
+    double), so every batch is conformed to the table's unified schema first.
+
+    Args:
+        paths: Parquet files to profile
+        root: Dataset root the files live under (for table names)
+        table_pattern: Regex with a 'table' group mapping a top-level file stem to its table
+        batch_rows: Rows per record batch read
+
+    Returns:
+        Profile per table name
+    """
+    root_path = Path(root)
+    pattern = re.compile(table_pattern)
+    grouped: Dict[str, List[Path]] = {}
+    for path in map(Path, sorted(paths)):
+        grouped.setdefault(table_name(path, root_path, pattern), []).append(path)
+
+    tables = {}
+    for name, files in grouped.items():
+        unifier = SchemaUnifier()
+        for path in files:
+            unifier.observe(pq.read_schema(path).remove_metadata())
+        table = tables[name] = TableProfile(name, unifier.schema)
+        for path in files:
+            table.files += 1
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=batch_rows):
+                table.update(unifier.conform(batch))
+    return tables
+
+
+def _varchar_length(profile: ColumnProfile) -> int:
+    if profile.max_bytes is None:
+        return 256  # No values seen, nothing to size it by
+    if profile.min_bytes == profile.max_bytes and FIXED_WIDTH_CODE.search(profile.name):
+        return max(profile.max_bytes, 1)
+    return min(max(int(math.ceil(profile.max_bytes * SIZE_HEADROOM / 16)) * 16, 16), VARCHAR_MAX)
+
+
+def redshift_type(profile: ColumnProfile) -> str:
+    """Narrowest Redshift type for the observed values of a column."""
+    data_type = profile.type
+    if pa.types.is_boolean(data_type):
+        return 'BOOLEAN'
+    if pa.types.is_integer(data_type):
+        # SMALLINT saves too little to risk a COPY overflowing once values outgrow the sample
+        if GROWING_INTEGER.search(profile.name):
+            return 'BIGINT' if (profile.max or 0) < (1 << 63) else 'DECIMAL(20, 0)'
+        magnitude = max(abs(profile.min or 0), abs(profile.max or 0)) * SIZE_HEADROOM
+        for name, bits in (('INTEGER', 32), ('BIGINT', 64)):
+            if magnitude < (1 << (bits - 1)):
+                return name
+        return 'DECIMAL(20, 0)'
+    if pa.types.is_float32(data_type):
+        return 'REAL'
+    if pa.types.is_floating(data_type):
+        return 'DOUBLE PRECISION'
+    if pa.types.is_decimal(data_type):
+        return f'DECIMAL({min(data_type.precision, 38)}, {data_type.scale})'
+    if pa.types.is_timestamp(data_type):
+        return 'TIMESTAMPTZ' if data_type.tz else 'TIMESTAMP'
+    if pa.types.is_date(data_type):
+        return 'DATE'
+    if pa.types.is_time(data_type):
+        return 'TIME'
+    if pa.types.is_binary(data_type) or pa.types.is_large_binary(data_type):
+        return f'VARBYTE({_varchar_length(profile)})'
+    if pa.types.is_nested(data_type):
+        return 'SUPER'
+    return f'VARCHAR({_varchar_length(profile)})'
+
+
+def column_encoding(profile: ColumnProfile, column_type: str, sort_leading: bool) -> str:
+    """
+    Compression encoding for a column.
+
+    The leading sort key stays RAW so zone maps stay cheap to evaluate; few
+    distinct values that repeat often get BYTEDICT, numbers and dates AZ64,
+    everything else ZSTD.
+    """
+    if sort_leading or column_type == 'BOOLEAN':
+        return 'RAW'
+    if column_type.split('(')[0] in AZ64_TYPES:
+        return 'AZ64'
+    non_null = profile.rows - profile.nulls
+    if (profile.scalar and column_type.startswith('VARCHAR') and profile.distinct <= BYTEDICT_MAX_DISTINCT
+            and non_null >= BYTEDICT_MIN_ROWS and profile.distinct < non_null * BYTEDICT_MAX_DISTINCT_RATIO):
+        return 'BYTEDICT'
+    return 'ZSTD'
+
+
+def suggest_keys(table: TableProfile) -> Tuple[Optional[str], Optional[str], str]:
+    """
+    Suggest the distribution and sort keys of a table.
+
+    The DISTKEY is the first join key candidate with enough distinct values,
+    few nulls and no heavy skew; without one, small tables are copied to
+    every node (DISTSTYLE ALL) and large ones spread evenly. The SORTKEY is
+    the order date, or else the most selective date/timestamp column.
+
+    Returns:
+        (distkey column or None, sortkey column or None, reason for the DISTSTYLE)
+    """
+    names = list(table.columns)
+    distkey, reason = None, None
+    for key in DISTKEY_CANDIDATES:
+        column = resolve_column(names, key)
+        if column is None or not table.columns[column].scalar:
+            continue
+        profile = table.columns[column]
+        if profile.distinct < min(DISTKEY_MIN_DISTINCT, table.rows):
+            reason = f"{column} has only {profile.distinct} distinct value(s)"
+        elif profile.null_ratio > DISTKEY_MAX_NULL_RATIO:
+            reason = f"{column} is {profile.null_ratio:.0%} null"
+        elif (profile.top_share or 0.0) > DISTKEY_MAX_TOP_SHARE:
+            reason = f"{column} is skewed (one value holds {profile.top_share:.0%} of the rows)"
+        else:
+            distkey = column
+            reason = f"join key {column}, {profile.distinct:,} distinct, top value {profile.top_share or 0.0:.1%} of rows"
+            break
+    if distkey is None:
+        style = 'ALL' if table.rows <= DISTSTYLE_ALL_MAX_ROWS else 'EVEN'
+        reason = f"DISTSTYLE {style}: " + (reason or 'no join key column')
+
+    temporal = [name for name, p in table.columns.items()
+                if p.scalar and (pa.types.is_timestamp(p.type) or pa.types.is_date(p.type)) and p.distinct > 1]
+    sortkey = resolve_column(temporal, DEFAULT_SORT_KEYS[0])
+    if sortkey is None and temporal:
+        sortkey = max(temporal, key=lambda name: table.columns[name].distinct)
+    return distkey, sortkey or distkey, reason
+
+
+def _identifier(name: str) -> str:
+    return name if IDENTIFIER.match(name) else '"' + name.replace('"', '""') + '"'
+
+
+def _describe(profile: ColumnProfile) -> str:
+    parts = [f"{profile.null_ratio:.1%} null"]
+    if profile.scalar:
+        parts.insert(0, f"~{profile.distinct:,} distinct")
+    if profile.max_bytes is not None:
+        parts.append(f"max {profile.max_bytes} bytes")
+    return ', '.join(parts)
+
+
+def redshift_ddl(table: TableProfile, table_name_override: Optional[str] = None) -> str:
+    """
+    Build a CREATE TABLE statement from a table profile.
+
+    Args:
+        table: Profile of one output
+        table_name_override: Redshift table name (default: REDSHIFT_TABLE_NAMES or the output name)
+
+    Returns:
+        DDL text ending in a semicolon
+    """
+    name = table_name_override or REDSHIFT_TABLE_NAMES.get(table.name, table.name.replace('/', '_'))
+    distkey, sortkey, reason = suggest_keys(table)
+    lines = []
+    columns = list(table.columns.values())
+    for index, profile in enumerate(columns):
+        column_type = redshift_type(profile)
+        encoding = column_encoding(profile, column_type, profile.name == sortkey)
+        separator = ',' if index < len(columns) - 1 else ''
+        lines.append(f"    {_identifier(profile.name)} {column_type} ENCODE {encoding}{separator}"
+                     f"  -- {_describe(profile)}")
+
+    ddl = [f"-- {table.name}: {table.rows:,} row(s) in {table.files} file(s); {reason}",
+           f"CREATE TABLE {_identifier(name)} ("] + lines + [")"]
+    if distkey:
+        ddl += ["DISTSTYLE KEY", f"DISTKEY ({_identifier(distkey)})"]
+    else:
+        ddl.append(f"DISTSTYLE {'ALL' if table.rows <= DISTSTYLE_ALL_MAX_ROWS else 'EVEN'}")
+    if sortkey:
+        ddl.append(f"COMPOUND SORTKEY ({_identifier(sortkey)})")
+    ddl[-1] += ';'
+    return '\n'.join(ddl)
+
+
+def write_redshift_ddl(ddl_path: str, tables: Dict[str, TableProfile]) -> None:
+    """Write the CREATE TABLE statement of every profiled table to a SQL file."""
+    statements = [redshift_ddl(tables[name]) for name in sorted(tables)]
+    Path(ddl_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(ddl_path, 'w', encoding='utf-8') as f:
+        f.write(f"-- Generated by column_profile.py at {datetime.now().isoformat()}\n\n")
+        f.write('\n\n'.join(statements) + '\n')
+    logger.info(f"Redshift DDL written to: {ddl_path}")
+
+
+def write_profile_json(profile_path: str, tables: Dict[str, TableProfile]) -> None:
+    """Write the column profiles of every table to a JSON report."""
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'tables': {name: table.to_dict() for name, table in sorted(tables.items())},
+    }
+    Path(profile_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(profile_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    logger.info(f"Column profiles written to: {profile_path}")
+
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Profile Parquet outputs and generate Redshift DDL with encodings and dist/sort keys.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python column_profile.py parquet_output/
+  python column_profile.py parquet_output/ --ddl redshift_tables.sql --json column_profile.json
+  python column_profile.py warehouse/ --batch-rows 100000
+        """
+    )
+
+    parser.add_argument('directory', help='Dataset root written by json_to_parquet.py or merge_parquet.py')
+    parser.add_argument('--ddl', metavar='PATH', help='Write the DDL to this file instead of stdout')
+    parser.add_argument('--json', metavar='PATH', help='Also write the column profiles to this JSON file')
+    parser.add_argument('--batch-rows', type=int, default=65536, help='Rows per record batch read (default: 65536)')
+    parser.add_argument('--table-pattern', default=DEFAULT_TABLE_PATTERN,
+                        help='Regex with a (?P<table>...) group mapping top-level file stems to table names')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose logging')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main execution function."""
+    args = parse_arguments()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    if not Path(args.directory).is_dir():
+        logger.error(f"Directory not found: {args.directory}")
+        sys.exit(1)
+
+    try:
+        tables = profile_files(live_files(args.directory), args.directory, args.table_pattern, args.batch_rows)
+    except Exception as e:
+        logger.error(f"Profiling failed: {e}")
+        sys.exit(1)
+    if not tables:
+        logger.error(f"No Parquet files found under {args.directory}")
+        sys.exit(1)
+
+    if args.json:
+        write_profile_json(args.json, tables)
+    if not args.ddl:
+        print('\n\n'.join(redshift_ddl(tables[name]) for name in sorted(tables)))
+        return
+    write_redshift_ddl(args.ddl, tables)
+
+    print("\n" + "="*60)
+    print("COLUMN PROFILE SUMMARY")
+    print("="*60)
+    for name in sorted(tables):
+        table = tables[name]
+        distkey, sortkey, reason = suggest_keys(table)
+        print(f"\n📊 {name}: {table.rows:,} row(s), {len(table.columns)} column(s)")
+        print(f"   🔑 Distribution: {reason}")
+        print(f"   ↕️  Sort key: {sortkey or 'none'}")
+    print(f"\n📝 DDL: {args.ddl}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+Parquet Compaction
+Rewrites the many small Parquet files that accumulate in an output area
+(per-run order_summary.parquet files, streaming part files, ...) into a few
+target-sized files. Files are grouped by table and compatible schema, read
+with iter_batches so memory stays around one row group, and swapped in with
+a manifest so readers never see a half-compacted state.
+
+The swap works in three steps:
+  1. New files are written to a hidden staging directory (.compaction-<id>).
+  2. _manifest.json is replaced atomically with a record of the swap (files
+     replaced, staged files and their final names); this is the commit
+     point. Readers that list files through live_files() switch from the old
+     to the new files in one step.
+  3. Staged files are moved into place and the replaced files are deleted.
+     An interrupted step 3 is finished by the next run.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import re
+import shutil
+import sys
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from schema_unification import SchemaConflictError, SchemaUnifier
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = '_manifest.json'
+STAGING_PREFIX = '.compaction-'
+
+# Strips part counters and earlier compaction ids so reruns group with their table
+DEFAULT_TABLE_PATTERN = r'^(?P<table>.+?)(-c\d{8}T\d{6}(-[0-9a-f]{8})?)?([-_]part)?([-_]\d+)?$'
+
+
+def new_swap_id() -> str:
+    """Return a rewrite id that stays unique even for rewrites started in the same second."""
+    return f"{datetime.now():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def _is_hidden(path: Path, root: Path) -> bool:
+    # Same convention as Spark, Spectrum and pyarrow.dataset: _ and . prefixes are not data
+    return any(part.startswith(('.', '_')) for part in path.relative_to(root).parts)
+
+
+def read_manifest(root: str) -> Optional[Dict[str, Any]]:
+    """Return the manifest of a compacted directory, or None if it has none."""
+    path = Path(root) / MANIFEST_NAME
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def live_files(root: str) -> List[str]:
+    """
+    List the data files a reader should use.
+
+    Normally this is the directory listing. While a committed compaction is
+    still being moved into place, the replaced files are left out and the new
+    files are taken from wherever they currently are, so a reader never mixes
+    files from before and after a compaction.
+    """
+    root_path = Path(root)
+    manifest = read_manifest(root)
+    pending = manifest.get('pending') if manifest else None
+    listed = {p.relative_to(root_path).as_posix() for p in root_path.rglob('*.parquet')
+              if not _is_hidden(p, root_path)}
+    if pending:
+        listed -= set(pending['replaced'])
+        for staged, final in pending['moves']:
+            listed.add(final if (root_path / final).exists() else staged)
+    return [str(root_path / rel) for rel in sorted(listed)]
+
+
+def _write_manifest(root: Path, manifest: Dict[str, Any]) -> None:
+    tmp = root / f"{MANIFEST_NAME}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, root / MANIFEST_NAME)
+
+
+def table_name(path: Path, root: Path, pattern: re.Pattern) -> str:
+    """Files in a subdirectory belong to that directory's table; top-level files to their cleaned stem."""
+    relative = path.relative_to(root)
+    if len(relative.parts) > 1:
+        return relative.parent.as_posix()
+    match = pattern.match(path.stem)
+    return match.group('table') if match else path.stem
+
+
+def scan_files(root: Path, pattern: re.Pattern) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Read the footer of every live Parquet file under root.
+
+    Returns:
+        File descriptions (path, size, rows, schema) per table name
+    """
+    tables = defaultdict(list)
+    for path in map(Path, live_files(str(root))):
+        metadata = pq.read_metadata(path)
+        tables[table_name(path, root, pattern)].append({
+            'path': path,
+            'bytes': path.stat().st_size,
+            'rows': metadata.num_rows,
+            'schema': pq.read_schema(path),
+        })
+    return tables
+
+
+def group_files(files: List[Dict[str, Any]], unify: bool) -> List[Tuple[pa.Schema, List[Dict[str, Any]]]]:
+    """
+    Split one table's files into groups that can be written with one schema.
+
+    Args:
+        files: File descriptions from scan_files
+        unify: Merge schemas that unify_schemas can reconcile (otherwise schemas must match exactly)
+
+    Returns:
+        (output schema, files) per group
+    """
+    groups: List[Tuple[SchemaUnifier, List[Dict[str, Any]]]] = []
+    for info in files:
+        schema = info['schema']
+        for unifier, members in groups:
+            if unify:
+                trial = SchemaUnifier(unifier.schema)
+                try:
+                    trial.observe(schema.remove_metadata())
+                except SchemaConflictError:
+                    continue
+                unifier.schema = trial.schema
+            elif not schema.remove_metadata().equals(unifier.schema):
+                continue
+            members.append(info)
+            break
+        else:
+            groups.append((SchemaUnifier(schema.remove_metadata()), [info]))
+
+    result = []
+    for unifier, members in groups:
+        schema = unifier.schema
+        if not unify:
+            # Exact groups keep the first file's metadata (e.g. pandas index info)
+            schema = members[0]['schema']
+        result.append((schema, members))
+    return result
+
+
+class CompactedWriter:
+    """Writes a stream of batches into files of about target_bytes each."""
+
+    def __init__(self, directory: Path, prefix: str, schema: pa.Schema, compression: str,
+                 target_bytes: int, row_group_bytes: int, start_index: int = 0):
+        self.directory = directory
+        self.prefix = prefix
+        self.start_index = start_index
+        self.schema = schema
+        self.compression = compression
+        self.target_bytes = target_bytes
+        self.row_group_bytes = row_group_bytes
+        self.paths: List[Path] = []
+        self.rows = 0
+        self._sink = None
+        self._writer = None
+        self._pending: List[pa.RecordBatch] = []
+        self._pending_bytes = 0
+
+    def write(self, batch: pa.RecordBatch) -> None:
+        self._pending.append(batch)
+        self._pending_bytes += batch.nbytes
+        if self._pending_bytes >= self.row_group_bytes:
+            self._flush_row_group()
+
+    def _flush_row_group(self) -> None:
+        if not self._pending:
+            return
+        if self._writer is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"{self.prefix}-{self.start_index + len(self.paths):05d}.parquet"
+            self._sink = pa.OSFile(str(path), 'wb')
+            self._writer = pq.ParquetWriter(self._sink, self.schema, compression=self.compression)
+            self.paths.append(path)
+        table = pa.Table.from_batches(self._pending, schema=self.schema)
+        self._writer.write_table(table, row_group_size=max(table.num_rows, 1))
+        self.rows += table.num_rows
+        self._pending, self._pending_bytes = [], 0
+        # Row groups are flushed as they are written, so tell() tracks the file size
+        if self._sink.tell() >= self.target_bytes:
+            self._close_file()
+
+    def _close_file(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+    def close(self) -> List[Path]:
+        self._flush_row_group()
+        self._close_file()
+        return self.paths
+
+
+def compact_group(schema: pa.Schema, members: List[Dict[str, Any]], staging_dir: Path, prefix: str,
+                  compression: str, target_bytes: int, row_group_bytes: int, batch_rows: int,
+                  start_index: int = 0) -> List[Path]:
+    """
+    Stream one group's files into target-sized files in the staging directory.
+
+    Raises:
+        RuntimeError: If the rows written do not match the rows read
+    """
+    unifier = SchemaUnifier(schema)
+    writer = CompactedWriter(staging_dir, prefix, schema, compression, target_bytes, row_group_bytes, start_index)
+    expected = 0
+    for info in members:
+        parquet_file = pq.ParquetFile(info['path'])
+        for batch in parquet_file.iter_batches(batch_size=batch_rows):
+            writer.write(unifier.conform(batch))
+        expected += info['rows']
+    paths = writer.close()
+    if writer.rows != expected:
+        raise RuntimeError(f"Compaction of {prefix} wrote {writer.rows} rows, expected {expected}")
+    return paths
+
+
+def finish_pending(root: Path) -> None:
+    """Complete an interrupted swap and remove staging directories that were never committed."""
+    manifest = read_manifest(str(root))
+    pending = manifest.get('pending') if manifest else None
+    if pending:
+        logger.debug(f"Moving compaction {pending['id']} into place")
+        for staged, final in pending['moves']:
+            if (root / staged).exists():
+                (root / final).parent.mkdir(parents=True, exist_ok=True)
+                os.replace(root / staged, root / final)
+        for rel in pending['replaced']:
+            (root / rel).unlink(missing_ok=True)
+        shutil.rmtree(root / f"{STAGING_PREFIX}{pending['id']}", ignore_errors=True)
+        manifest['pending'] = None
+        _write_manifest(root, manifest)
+
+    for staging in root.glob(f"{STAGING_PREFIX}*"):
+        logger.info(f"Removing uncommitted staging directory: {staging}")
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def commit_swap(root: Path, swap_id: str, moves: List[Tuple[str, str]], replaced: List[str],
+                **records: Any) -> Dict[str, Any]:
+    """
+    Switch readers from the replaced files to the staged ones, then move them into place.
+
+    Also used by merge_parquet.py, so every rewrite of a dataset goes through
+    the same manifest and an interrupted one is finished by either tool.
+
+    Args:
+        root: Dataset root
+        swap_id: Id of the rewrite; staged files live in <root>/.compaction-<swap_id>
+        moves: (staged, final) paths relative to root
+        replaced: Paths relative to root of the files the staged files replace
+        records: Top-level manifest entries describing the rewrite (e.g. last_compaction)
+
+    Returns:
+        The committed manifest
+
+    Raises:
+        FileExistsError: If a staged file would overwrite a replaced or existing file
+    """
+    finals = {final for _, final in moves}
+    clashes = sorted(finals & set(replaced)) + sorted(f for f in finals - set(replaced) if (root / f).exists())
+    if clashes:
+        # Moving would overwrite a live file that the unlink step then deletes as well
+        raise FileExistsError(f"Rewrite {swap_id} would overwrite existing file(s): {', '.join(clashes)}")
+    previous = read_manifest(str(root)) or {}
+    manifest = {
+        **previous,
+        'version': previous.get('version', 0) + 1,
+        'updated_at': datetime.now().isoformat(),
+        'pending': {'id': swap_id, 'moves': moves, 'replaced': replaced},
+        **records,
+    }
+    # Commit point: from here on readers see the new files instead of the replaced ones
+    _write_manifest(root, manifest)
+    finish_pending(root)
+    return manifest
+
+
+def compact_directory(
+    root: str,
+    target_mb: int = 128,
+    small_file_mb: Optional[int] = None,
+    row_group_mb: int = 64,
+    batch_rows: int = 65536,
+    compression: str = 'snappy',
+    unify: bool = False,
+    table_pattern: str = DEFAULT_TABLE_PATTERN,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Compact the small Parquet files under a directory.
+
+    Args:
+        root: Directory or dataset root to compact
+        target_mb: Approximate size of each output file
+        small_file_mb: Files at or above this size are left alone (default: half of target_mb)
+        row_group_mb: In-memory Arrow size of each written row group
+        batch_rows: Rows per batch read from the source files
+        compression: Compression algorithm for the new files
+        unify: Also merge files whose schemas differ but can be unified
+        table_pattern: Regex with a 'table' group mapping a top-level file stem to its table
+        dry_run: Only report what would be compacted
+
+    Returns:
+        Summary with the planned or performed compactions
+    """
+    root_path = Path(root)
+    target_bytes = target_mb * 1024 * 1024
+    small_bytes = (small_file_mb if small_file_mb is not None else target_mb / 2) * 1024 * 1024
+    pattern = re.compile(table_pattern)
+    compaction_id = new_swap_id()
+
+    if not dry_run:
+        finish_pending(root_path)
+
+    tables = scan_files(root_path, pattern)
+    plan = []
+    for table, files in sorted(tables.items()):
+        small = [f for f in files if f['bytes'] < small_bytes]
+        for schema, members in group_files(small, unify):
+            # Skip groups whose rewrite would not reduce the number of files
+            if len(members) > 1 and math.ceil(sum(m['bytes'] for m in members) / target_bytes) < len(members):
+                plan.append((table, schema, members))
+
+    summary = {
+        'root': str(root_path),
+        'compaction_id': compaction_id,
+        'dry_run': dry_run,
+        'groups': [],
+    }
+    for table, _, members in plan:
+        summary['groups'].append({
+            'table': table,
+            'files_in': len(members),
+            'rows': sum(m['rows'] for m in members),
+            'bytes_in': sum(m['bytes'] for m in members),
+        })
+    if dry_run or not plan:
+        if not plan:
+            logger.info("Nothing to compact")
+        return summary
+
+    staging_root = root_path / f"{STAGING_PREFIX}{compaction_id}"
+    moves, replaced = [], []
+    files_per_table = defaultdict(int)
+    try:
+        for index, (table, schema, members) in enumerate(plan):
+            table_dir = members[0]['path'].parent
+            base = 'part' if table_dir != root_path else table.replace('/', '_')
+            logger.info(f"Compacting {len(members)} file(s) of {table} into {table_dir}")
+            staged = compact_group(schema, members, staging_root / str(index), f"{base}-c{compaction_id}",
+                                   compression, target_bytes, int(row_group_mb * 1024 * 1024), batch_rows,
+                                   start_index=files_per_table[table])
+            files_per_table[table] += len(staged)
+            for path in staged:
+                moves.append((path.relative_to(root_path).as_posix(),
+                              (table_dir / path.name).relative_to(root_path).as_posix()))
+            replaced.extend(m['path'].relative_to(root_path).as_posix() for m in members)
+            summary['groups'][index]['files_out'] = len(staged)
+            summary['groups'][index]['bytes_out'] = sum(p.stat().st_size for p in staged)
+    except Exception:
+        shutil.rmtree(staging_root, ignore_errors=True)
+        raise
+
+    manifest = commit_swap(root_path, compaction_id, moves, replaced, last_compaction={
+        'id': compaction_id,
+        'groups': summary['groups'],
+        'created': [final for _, final in moves],
+    })
+
+    logger.info(f"Compaction {compaction_id} committed (manifest version {manifest['version']})")
+    return summary
+
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Compact small Parquet files into target-sized files with an atomic manifest swap.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python compact_parquet.py parquet_files --dry-run
+  python compact_parquet.py parquet_output --target-mb 128 --row-group-mb 64
+  python compact_parquet.py parquet_output --unify-schemas --compression zstd
+  python compact_parquet.py parquet_files --table-pattern '^(?P<table>order_[a-z]+)(_fixed)?$'
+        """
+    )
+
+    parser.add_argument('directory', help='Parquet directory or dataset root to compact')
+    parser.add_argument('--target-mb', type=int, default=128, help='Target output file size in MiB (default: 128)')
+    parser.add_argument('--small-file-mb', type=int,
+                        help='Only compact files smaller than this (default: half of --target-mb)')
+    parser.add_argument('--row-group-mb', type=float, default=64,
+                        help='Arrow in-memory size of each written row group in MiB (default: 64)')
+    parser.add_argument('--batch-rows', type=int, default=65536,
+                        help='Rows per batch read from source files (default: 65536)')
+    parser.add_argument('-c', '--compression', choices=['snappy', 'gzip', 'brotli', 'lz4', 'zstd'],
+                        default='snappy', help='Compression algorithm to use (default: snappy)')
+    parser.add_argument('--unify-schemas', action='store_true',
+                        help='Also merge files whose schemas differ but can be unified (default: exact match only)')
+    parser.add_argument('--table-pattern', default=DEFAULT_TABLE_PATTERN,
+                        help='Regex with a (?P<table>...) group mapping top-level file stems to table names')
+    parser.add_argument('--dry-run', action='store_true', help='Show what would be compacted without writing')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose logging')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main execution function."""
+    args = parse_arguments()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    if not Path(args.directory).is_dir():
+        logger.error(f"Directory not found: {args.directory}")
+        sys.exit(1)
+
+    try:
+        summary = compact_directory(
+            args.directory,
+            target_mb=args.target_mb,
+            small_file_mb=args.small_file_mb,
+            row_group_mb=args.row_group_mb,
+            batch_rows=args.batch_rows,
+            compression=args.compression,
+            unify=args.unify_schemas,
+            table_pattern=args.table_pattern,
+            dry_run=args.dry_run
+        )
+    except Exception as e:
+        logger.error(f"Compaction failed: {e}")
+        if args.verbose:
+            import traceback
+            traceback.print_exc()
+        sys.exit(1)
+
+    print("\n" + "="*60)
+    print("COMPACTION PLAN" if args.dry_run else "COMPACTION SUMMARY")
+    print("="*60)
+    print(f"📁 Directory: {summary['root']}")
+    for group in summary['groups']:
+        line = f"  - {group['table']}: {group['files_in']} file(s), {group['rows']:,} rows, {group['bytes_in']:,} bytes"
+        if 'files_out' in group:
+            line += f" -> {group['files_out']} file(s), {group['bytes_out']:,} bytes"
+        print(line)
+    if not summary['groups']:
+        print("  Nothing to compact")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,38 @@ Converts any nested JSON file to Parquet format using pandas and pyarrow.
 Supports command-line configuration for input file, output directory, and compression.
 """
 
+from __future__ import annotations
+
 import json
-import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
+import os
 from pathlib import Path
 import logging
 import argparse
 import sys
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, Iterator, List, Optional, Union
 from datetime import datetime
 
+from lazy_imports import lazy_module
+from profiling import stage
+from schema_unification import SchemaUnifier
+from sorted_output import DEFAULT_BLOOM_KEYS, DEFAULT_SORT_KEYS, ExternalSorter, OutputOptions
+from validation import OrderValidator
+
+# Loaded on first use so --help and argument errors start quickly
+pd = lazy_module('pandas')
+pa = lazy_module('pyarrow')
+pc = lazy_module('pyarrow.compute')
+pq = lazy_module('pyarrow.parquet')
+
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+INPUT_SUFFIXES = ('.json', '.ndjson', '.jsonl')
+
+# Envelope fields of change events (order_generator.py --cdc) -> item column names
+CHANGE_FIELDS = {'op': 'op', 'changeSeq': 'change_seq', 'changeTimestamp': 'change_timestamp'}
+
 
 def flatten_json(nested_json: Dict[str, Any], separator: str = '_') -> Dict[str, Any]:
     """
@@ -50,54 +67,346 @@ def flatten_json(nested_json: Dict[str, Any], separator: str = '_') -> Dict[str,
     return _flatten(nested_json)
 
 
-def normalize_items_to_dataframe(order_data: Dict[str, Any]) -> pd.DataFrame:
+def load_orders(json_file_path: str) -> List[Dict[str, Any]]:
+    """
+    Load order documents from a JSON file.
+    
+    Accepts a single order ({"order": {...}}), a batch as written by
+    order_generator.py ({"orders": [...]}), a JSON array of orders, or
+    newline-delimited JSON with one order per line.
+    
+    Args:
+        json_file_path: Path to the input JSON file
+    
+    Returns:
+        List of order documents, each shaped like {"order": {...}}
+    """
+    with stage('load', nbytes=os.path.getsize(json_file_path)):
+        with open(json_file_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+    
+    with stage('parse') as parse_stage:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError:
+            # Fall back to NDJSON; a genuinely malformed file still raises here
+            data = [json.loads(line) for line in text.splitlines() if line.strip()]
+        
+        if isinstance(data, dict) and isinstance(data.get('orders'), list):
+            data = data['orders']
+        elif not isinstance(data, list):
+            data = [data]
+        parse_stage.records += len(data)
+        parse_stage.bytes += len(text)
+    
+    return data
+
+
+def _as_order_list(order_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    return order_data if isinstance(order_data, list) else [order_data]
+
+
+def normalize_items_to_dataframe(order_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> pd.DataFrame:
     """
     Extract and normalize the items array into a separate DataFrame.
     
     Args:
-        order_data: The order JSON data
+        order_data: The order JSON data (a single order or a list of orders)
     
     Returns:
         DataFrame containing normalized items data
     """
-    items = order_data.get('order', {}).get('items', [])
+    return pd.DataFrame(order_item_rows(order_data))
+
+
+def order_item_rows(order_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Flatten every item of every order into a row tagged with its order id and date."""
     normalized_items = []
     
-    for item in items:
-        flattened_item = flatten_json(item)
-        # Add order-level information to each item
-        flattened_item['order_id'] = order_data.get('order', {}).get('orderId')
-        flattened_item['order_date'] = order_data.get('order', {}).get('orderDate')
-        normalized_items.append(flattened_item)
+    for order in _as_order_list(order_data):
+        for item in order.get('order', {}).get('items', []):
+            flattened_item = flatten_json(item)
+            # Add order-level information to each item
+            flattened_item['order_id'] = order.get('order', {}).get('orderId')
+            flattened_item['order_date'] = order.get('order', {}).get('orderDate')
+            for field, column in CHANGE_FIELDS.items():
+                if field in order:
+                    flattened_item[column] = order[field]
+            normalized_items.append(flattened_item)
     
-    return pd.DataFrame(normalized_items)
+    return normalized_items
 
 
-def create_order_summary_dataframe(order_data: Dict[str, Any]) -> pd.DataFrame:
+def create_order_summary_dataframe(order_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> pd.DataFrame:
     """
     Create a DataFrame for the main order summary (excluding items array).
     
     Args:
-        order_data: The order JSON data
+        order_data: The order JSON data (a single order or a list of orders)
     
     Returns:
         DataFrame containing order summary data
     """
-    # Create a copy of order data without the items array
-    order_summary = order_data.copy()
-    if 'order' in order_summary and 'items' in order_summary['order']:
-        # Keep just the count of items instead of the full array
-        order_summary['order']['items_count'] = len(order_summary['order']['items'])
-        del order_summary['order']['items']
+    return pd.DataFrame(order_summary_rows(order_data))
+
+
+def order_summary_rows(order_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Flatten each order without its items array (replaced by items_count)."""
+    rows = []
+    for order in _as_order_list(order_data):
+        # Shallow-copy the two levels we change so the caller's items survive
+        order_summary = dict(order)
+        if 'order' in order_summary and 'items' in order_summary['order']:
+            order_summary['order'] = dict(order_summary['order'])
+            # Keep just the count of items instead of the full array
+            order_summary['order']['items_count'] = len(order_summary['order'].pop('items'))
+        rows.append(flatten_json(order_summary))
+    
+    return rows
+
+
+def create_flattened_dataframe(order_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> pd.DataFrame:
+    """
+    Create a DataFrame with one fully flattened row per order.
+    
+    Args:
+        order_data: The order JSON data (a single order or a list of orders)
+    
+    Returns:
+        DataFrame with index-suffixed columns for every list element
+    """
+    return pd.DataFrame([flatten_json(order) for order in _as_order_list(order_data)])
+
+
+def nested_order_schema(change_events: bool = False) -> pa.Schema:
+    """
+    Declared schema of the nested layout, matching order_generator.py orders.
+    
+    Every batch is built against it, so optional objects (cardDetails, discount,
+    shipping) are null instead of missing and no batch infers its own types.
+    Item specifications differ per category, so they are a map<string, string>
+    rather than a struct whose fields would depend on the categories in a batch.
     
-    flattened_order = flatten_json(order_summary)
-    return pd.DataFrame([flattened_order])
+    Args:
+        change_events: Add the op/changeSeq/changeTimestamp columns of change events
+    
+    Returns:
+        Arrow schema; timestamps are ISO strings here and typed after conversion
+    """
+    string, double, int64 = pa.string(), pa.float64(), pa.int64()
+    address = pa.struct([('street', string), ('apartment', string), ('city', string), ('state', string),
+                         ('zipCode', string), ('country', string)])
+    customer = pa.struct([
+        ('customerId', string),
+        ('personalInfo', pa.struct([('firstName', string), ('lastName', string), ('email', string),
+                                    ('phone', string)])),
+        ('addresses', pa.struct([('billing', address), ('shipping', address)])),
+        ('preferences', pa.struct([('emailNotifications', pa.bool_()), ('smsAlerts', pa.bool_()),
+                                   ('loyaltyMember', pa.bool_()), ('loyaltyTier', string)])),
+    ])
+    item = pa.struct([
+        ('itemId', string),
+        ('productInfo', pa.struct([('sku', string), ('name', string), ('category', string),
+                                   ('subcategory', string), ('brand', string)])),
+        ('pricing', pa.struct([
+            ('unitPrice', double), ('quantity', int64),
+            ('discount', pa.struct([('type', string), ('value', double), ('amount', double), ('reason', string)])),
+            ('subtotal', double),
+        ])),
+        ('specifications', pa.map_(string, string)),
+    ])
+    payment = pa.struct([
+        ('paymentId', string), ('method', string), ('status', string), ('processedAt', string),
+        ('transactionDetails', pa.struct([
+            ('subtotal', double),
+            ('taxes', pa.struct([('salesTax', double), ('stateTax', double), ('localTax', double),
+                                 ('totalTax', double)])),
+            ('shipping', pa.struct([('method', string), ('cost', double), ('estimatedDelivery', string),
+                                    ('carrier', string), ('trackingNumber', string)])),
+            ('fees', pa.struct([('processingFee', double), ('handlingFee', double), ('totalFees', double)])),
+            ('discounts', pa.struct([('itemDiscounts', double), ('shippingDiscount', double),
+                                     ('promoCode', string), ('totalDiscounts', double)])),
+            ('finalTotal', double),
+        ])),
+        ('receipt', pa.struct([('receiptNumber', string), ('downloadUrl', string), ('emailSent', pa.bool_()),
+                               ('printRequested', pa.bool_())])),
+        # Only card payments carry card details; other methods leave the struct null
+        ('cardDetails', pa.struct([('type', string), ('lastFourDigits', int64), ('expiryMonth', int64),
+                                   ('expiryYear', int64), ('cardholderName', string),
+                                   ('billingAddress', address)])),
+    ])
+    package = pa.struct([
+        ('packageId', string), ('items', pa.list_(string)),
+        ('dimensions', pa.struct([('length', int64), ('width', int64), ('height', int64), ('unit', string)])),
+        ('weight', pa.struct([('value', double), ('unit', string)])),
+    ])
+    fulfillment = pa.struct([
+        ('warehouseId', string), ('fulfillmentStatus', string),
+        ('packaging', pa.struct([('packageCount', int64), ('packages', pa.list_(package))])),
+        ('shipping', pa.struct([
+            ('shippedDate', string), ('estimatedDelivery', string), ('carrier', string), ('service', string),
+            ('tracking', pa.struct([('trackingNumber', string), ('trackingUrl', string), ('lastUpdate', string),
+                                    ('currentStatus', string)])),
+        ])),
+    ])
+    metadata = pa.struct([
+        ('source', string),
+        ('deviceInfo', pa.struct([('userAgent', string), ('ipAddress', string), ('sessionId', string)])),
+        ('timestamps', pa.struct([('created', string), ('updated', string), ('completed', string)])),
+        ('notes', pa.struct([('customerNotes', string), ('internalNotes', string),
+                             ('specialInstructions', string)])),
+    ])
+    fields = [
+        ('orderId', string), ('orderNumber', string), ('orderDate', string), ('status', string),
+        ('totalAmount', double), ('currency', string), ('customer', customer), ('items', pa.list_(item)),
+        ('payment', payment), ('fulfillment', fulfillment), ('metadata', metadata),
+    ]
+    if change_events:
+        fields += [('op', string), ('changeSeq', int64), ('changeTimestamp', string)]
+    return pa.schema(fields)
+
+
+def _specifications_map(item: Any) -> Any:
+    if not isinstance(item, dict) or not isinstance(item.get('specifications'), dict):
+        return item
+    # Map values share one type, so numbers (pages, compartments) become strings
+    specifications = {key: value if isinstance(value, str) or value is None else json.dumps(value)
+                      for key, value in item['specifications'].items()}
+    return {**item, 'specifications': specifications}
+
+
+def create_nested_table(order_data: Union[Dict[str, Any], List[Dict[str, Any]]]) -> pa.Table:
+    """
+    Create an Arrow table with one row per order that keeps the JSON nesting.
+    
+    Objects become struct columns and arrays become list<struct> columns, and
+    every batch is built against nested_order_schema(), so all batches of a
+    run share one schema no matter how many items, which categories or which
+    payment methods they contain. Fields outside that schema are dropped
+    here; the flattened outputs keep them. The result loads into a Redshift
+    SUPER column or can be queried directly by Spectrum.
+    
+    Args:
+        order_data: The order JSON data (a single order or a list of orders)
+    
+    Returns:
+        Arrow table with top-level order fields as columns
+    """
+    rows = []
+    change_events = False
+    for order in _as_order_list(order_data):
+        row = dict(order.get('order', order))
+        if isinstance(row.get('items'), list):
+            row['items'] = [_specifications_map(item) for item in row['items']]
+        # Change events keep their op/changeSeq/changeTimestamp next to the order fields
+        for field in CHANGE_FIELDS:
+            if field in order:
+                row[field] = order[field]
+                change_events = True
+        rows.append(row)
+    # Top-level timestamps get a real type; nested ones stay ISO strings for SUPER
+    return rows_to_table(rows, nested_order_schema(change_events))
+
+
+def rows_to_table(rows: List[Dict[str, Any]], schema: Optional[pa.Schema] = None) -> pa.Table:
+    """
+    Build an Arrow table from row dictionaries without going through pandas.
+    
+    Column names are the union of keys over all rows unless a schema is
+    given, and string columns whose name looks like a date or time are
+    converted to UTC timestamps.
+    
+    Args:
+        rows: Row dictionaries (may have differing keys)
+        schema: Schema to build the rows against instead of inferring one
+    
+    Returns:
+        Arrow table, one row per dictionary
+    """
+    if not rows:
+        return pa.table({}) if schema is None else _convert_timestamp_columns(schema.empty_table())
+    with stage('arrow_conversion', records=len(rows)):
+        array = pa.array(rows, type=pa.struct(schema) if schema is not None else None)
+        table = pa.Table.from_batches([pa.RecordBatch.from_struct_array(array)])
+    
+    with stage('type_inference', records=len(rows)):
+        return _convert_timestamp_columns(table)
+
+
+def _convert_timestamp_columns(table: pa.Table) -> pa.Table:
+    for index, field in enumerate(table.schema):
+        if pa.types.is_string(field.type) and any(k in field.name.lower() for k in ['date', 'time', 'timestamp']):
+            try:
+                converted = pc.cast(pc.replace_substring(table.column(index), 'Z', '+00:00'),
+                                    pa.timestamp('us', tz='UTC'))
+                table = table.set_column(index, field.name, converted)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                pass  # Keep as string if conversion fails
+    
+    return table
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert object columns to datetime or numeric types where the data allows.
+    
+    Args:
+        df: DataFrame to optimize in place
+    
+    Returns:
+        The same DataFrame, for chaining
+    """
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            try:
+                # Try to convert to datetime if it looks like a timestamp
+                if any(keyword in col.lower() for keyword in ['date', 'time', 'timestamp']):
+                    if df[col].notna().any():
+                        df[col] = pd.to_datetime(df[col], errors='ignore')
+                # Try to convert to numeric if possible
+                elif df[col].notna().any():
+                    numeric_converted = pd.to_numeric(df[col], errors='ignore')
+                    if not numeric_converted.equals(df[col]):
+                        df[col] = numeric_converted
+            except Exception:
+                pass  # Keep as string if conversion fails
+    return df
+
+
+def _write_table(table: pa.Table, path: Path, compression: str,
+                 output_options: Optional[OutputOptions] = None) -> None:
+    writer_kwargs = {}
+    if output_options is not None:
+        # The whole table is already in memory on this path, so it is sorted in place
+        with stage('sort', records=table.num_rows):
+            table = output_options.sort_table(table)
+        writer_kwargs = output_options.writer_kwargs(table.schema, table.num_rows)
+    with stage('write', records=table.num_rows) as write_stage:
+        pq.write_table(table, path, compression=compression, **writer_kwargs)
+        write_stage.bytes += path.stat().st_size
+
+
+def _write_dataframe(df: pd.DataFrame, path: Path, compression: str,
+                     output_options: Optional[OutputOptions] = None) -> None:
+    # Same result as df.to_parquet(index=False), split so conversion and write are timed apart
+    with stage('arrow_conversion', records=len(df)):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+    _write_table(table, path, compression, output_options)
+
+
+def _build_dataframe(rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    with stage('type_inference', records=len(rows)):
+        return optimize_dtypes(pd.DataFrame(rows))
 
 
 def convert_json_to_parquet(
     json_file_path: str,
     output_dir: str = None,
-    compression: str = 'snappy'
+    compression: str = 'snappy',
+    layout: str = 'flattened',
+    on_file_written: Optional[Callable[[str], Any]] = None,
+    validator: Optional[OrderValidator] = None,
+    output_options: Optional[OutputOptions] = None
 ) -> Dict[str, str]:
     """
     Convert JSON file to Parquet format with proper schema optimization.
@@ -106,6 +415,10 @@ def convert_json_to_parquet(
         json_file_path: Path to the input JSON file
         output_dir: Directory to save Parquet files (defaults to same directory as JSON)
         compression: Compression algorithm to use ('snappy', 'gzip', 'brotli', 'lz4')
+        layout: 'flattened' for index-suffixed columns, 'nested' for struct/list columns
+        on_file_written: Called with each file path as soon as it is complete (e.g. S3UploadSink.submit)
+        validator: Checks business invariants and quarantines failing orders before anything is written
+        output_options: Sort keys, page indexes and Bloom filters for the written files
     
     Returns:
         Dictionary with paths to created Parquet files
@@ -113,8 +426,11 @@ def convert_json_to_parquet(
     try:
         # Load JSON data
         logger.info(f"Loading JSON file: {json_file_path}")
-        with open(json_file_path, 'r', encoding='utf-8') as f:
-            order_data = json.load(f)
+        orders = load_orders(json_file_path)
+        logger.info(f"Loaded {len(orders)} order(s)")
+        
+        if validator is not None:
+            orders = validator.validate(orders)
         
         # Set output directory
         if output_dir is None:
@@ -126,80 +442,60 @@ def convert_json_to_parquet(
         
         created_files = {}
         
+        if layout == 'nested':
+            logger.info("Creating nested orders table...")
+            nested_table = create_nested_table(orders)
+            
+            nested_parquet_path = output_dir / 'order_nested.parquet'
+            logger.info(f"Saving nested orders to: {nested_parquet_path}")
+            _write_table(nested_table, nested_parquet_path, compression, output_options)
+            created_files['order_nested'] = str(nested_parquet_path)
+            if on_file_written:
+                on_file_written(str(nested_parquet_path))
+            
+            logger.info("Conversion completed successfully!")
+            return created_files
+        
         # 1. Create order summary Parquet file
         logger.info("Creating order summary DataFrame...")
-        order_df = create_order_summary_dataframe(order_data)
-        
-        # Optimize data types
-        for col in order_df.columns:
-            if order_df[col].dtype == 'object':
-                try:
-                    # Try to convert to datetime if it looks like a timestamp
-                    if any(keyword in col.lower() for keyword in ['date', 'time', 'timestamp']):
-                        if order_df[col].notna().any():
-                            order_df[col] = pd.to_datetime(order_df[col], errors='ignore')
-                    # Try to convert to numeric if possible
-                    elif order_df[col].notna().any():
-                        numeric_converted = pd.to_numeric(order_df[col], errors='ignore')
-                        if not numeric_converted.equals(order_df[col]):
-                            order_df[col] = numeric_converted
-                except Exception:
-                    pass  # Keep as string if conversion fails
+        with stage('flatten', records=len(orders)):
+            summary_rows = order_summary_rows(orders)
+        order_df = _build_dataframe(summary_rows)
         
         order_parquet_path = output_dir / 'order_summary.parquet'
         logger.info(f"Saving order summary to: {order_parquet_path}")
-        order_df.to_parquet(order_parquet_path, compression=compression, index=False)
+        _write_dataframe(order_df, order_parquet_path, compression, output_options)
         created_files['order_summary'] = str(order_parquet_path)
+        if on_file_written:
+            on_file_written(str(order_parquet_path))
         
         # 2. Create items Parquet file
         logger.info("Creating items DataFrame...")
-        items_df = normalize_items_to_dataframe(order_data)
-        
-        if not items_df.empty:
-            # Optimize data types for items
-            for col in items_df.columns:
-                if items_df[col].dtype == 'object':
-                    try:
-                        # Convert timestamps
-                        if any(keyword in col.lower() for keyword in ['date', 'time', 'timestamp']):
-                            if items_df[col].notna().any():
-                                items_df[col] = pd.to_datetime(items_df[col], errors='ignore')
-                        # Convert numeric columns
-                        elif items_df[col].notna().any():
-                            numeric_converted = pd.to_numeric(items_df[col], errors='ignore')
-                            if not numeric_converted.equals(items_df[col]):
-                                items_df[col] = numeric_converted
-                    except Exception:
-                        pass
+        with stage('flatten', records=len(orders)):
+            item_rows = order_item_rows(orders)
+        
+        if item_rows:
+            items_df = _build_dataframe(item_rows)
             
             items_parquet_path = output_dir / 'order_items.parquet'
             logger.info(f"Saving items to: {items_parquet_path}")
-            items_df.to_parquet(items_parquet_path, compression=compression, index=False)
+            _write_dataframe(items_df, items_parquet_path, compression, output_options)
             created_files['order_items'] = str(items_parquet_path)
+            if on_file_written:
+                on_file_written(str(items_parquet_path))
         
         # 3. Create a single flattened Parquet file (alternative approach)
         logger.info("Creating flattened single-file version...")
-        flattened_data = flatten_json(order_data)
-        flattened_df = pd.DataFrame([flattened_data])
-        
-        # Optimize data types for flattened version
-        for col in flattened_df.columns:
-            if flattened_df[col].dtype == 'object':
-                try:
-                    if any(keyword in col.lower() for keyword in ['date', 'time', 'timestamp']):
-                        if flattened_df[col].notna().any():
-                            flattened_df[col] = pd.to_datetime(flattened_df[col], errors='ignore')
-                    elif flattened_df[col].notna().any():
-                        numeric_converted = pd.to_numeric(flattened_df[col], errors='ignore')
-                        if not numeric_converted.equals(flattened_df[col]):
-                            flattened_df[col] = numeric_converted
-                except Exception:
-                    pass
+        with stage('flatten', records=len(orders)):
+            flattened_rows = [flatten_json(order) for order in orders]
+        flattened_df = _build_dataframe(flattened_rows)
         
         flattened_parquet_path = output_dir / 'order_flattened.parquet'
         logger.info(f"Saving flattened version to: {flattened_parquet_path}")
-        flattened_df.to_parquet(flattened_parquet_path, compression=compression, index=False)
+        _write_dataframe(flattened_df, flattened_parquet_path, compression, output_options)
         created_files['order_flattened'] = str(flattened_parquet_path)
+        if on_file_written:
+            on_file_written(str(flattened_parquet_path))
         
         logger.info("Conversion completed successfully!")
         return created_files
@@ -215,34 +511,446 @@ def convert_json_to_parquet(
         raise
 
 
-def get_parquet_info(parquet_file_path: str) -> None:
+def expand_input_paths(paths: List[str]) -> List[Path]:
+    """
+    Expand files and directories into a sorted list of JSON input files.
+    
+    Args:
+        paths: Files or directories given on the command line
+    
+    Returns:
+        Input files; directories contribute their *.json, *.ndjson and *.jsonl files
+    """
+    expanded = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            expanded.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in INPUT_SUFFIXES))
+        else:
+            expanded.append(path)
+    return expanded
+
+
+def iter_order_batches(input_paths: List[Path], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Yield lists of at most batch_size orders, reading one input file at a time."""
+    batch = []
+    for path in input_paths:
+        for order in load_orders(str(path)):
+            batch.append(order)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def build_output_tables(orders: List[Dict[str, Any]], layout: str = 'flattened') -> Dict[str, pa.Table]:
+    """
+    Build the Arrow tables for one batch of orders.
+    
+    Args:
+        orders: Batch of order documents
+        layout: 'flattened' or 'nested'
+    
+    Returns:
+        Tables keyed by output name (order_summary, order_items, order_flattened or order_nested)
+    """
+    if layout == 'nested':
+        return {'order_nested': create_nested_table(orders)}
+    
+    with stage('flatten', records=len(orders)):
+        rows = {
+            'order_summary': order_summary_rows(orders),
+            'order_items': order_item_rows(orders),
+            'order_flattened': [flatten_json(order) for order in orders],
+        }
+    return {name: rows_to_table(table_rows) for name, table_rows in rows.items() if table_rows}
+
+
+class UnifiedPartWriter:
+    """
+    Write batches of drifting schema for one output into consistent part files.
+    
+    Each batch is conformed to the running superset schema. When a batch
+    widens the superset (or a part reaches max_rows_per_file) the current part
+    is closed and a new one is started, so every part file is self-consistent
+    and later parts are supersets of earlier ones.
+    
+    When output_options has sort keys present in this output, batches go to
+    an ExternalSorter instead and are written in key order on close(), all
+    with the final superset schema.
+    
+    close() finishes the current part; the writer (and its schema) can keep
+    being written to afterwards, which starts a new part.
+    """
+    
+    def __init__(self, output_dir: Path, name: str, compression: str,
+                 max_rows_per_file: int, schema: Optional[pa.Schema] = None,
+                 on_part_closed: Optional[Callable[[str], Any]] = None,
+                 output_options: Optional[OutputOptions] = None,
+                 part_name: str = 'part-{index:05d}.parquet'):
+        self.output_dir = output_dir / name
+        self.name = name
+        self.compression = compression
+        self.max_rows_per_file = max_rows_per_file
+        self.on_part_closed = on_part_closed
+        self.output_options = output_options
+        self.part_name = part_name
+        self.unifier = SchemaUnifier(schema)
+        self.paths = []
+        self._writer = None
+        self._rows_in_part = 0
+        self._sorter = None
+    
+    def write(self, table: pa.Table) -> None:
+        changed = self.unifier.observe(table.schema)
+        if self._sorter is None and self.output_options is not None \
+                and self.output_options.sort_columns(self.unifier.schema):
+            self._sorter = ExternalSorter(self.output_options, self._conform_table)
+        if self._sorter is not None:
+            with stage('sort', records=table.num_rows):
+                self._sorter.add(table)
+            return
+        
+        if self._writer is not None and (changed or self._rows_in_part >= self.max_rows_per_file):
+            self._close_part()
+        if self._writer is None:
+            self._open_part(table.num_rows)
+        
+        with stage('write', records=table.num_rows):
+            for batch in table.to_batches():
+                self._writer.write_batch(self.unifier.conform(batch))
+        self._rows_in_part += table.num_rows
+    
+    def close(self) -> List[str]:
+        if self._sorter is not None:
+            self._write_sorted()
+        self._close_part()
+        return self.paths
+    
+    @property
+    def open_bytes(self) -> int:
+        """Size of the unfinished part: Parquet bytes written so far, or Arrow bytes waiting to be sorted."""
+        if self._sorter is not None:
+            return self._sorter.nbytes
+        if self._writer is not None:
+            return Path(self.paths[-1]).stat().st_size
+        return 0
+    
+    def _conform_table(self, table: pa.Table) -> pa.Table:
+        return pa.Table.from_batches([self.unifier.conform(b) for b in table.to_batches()], schema=self.unifier.schema)
+    
+    def _write_sorted(self) -> None:
+        # Merge rounds can be small; coalesce them so row groups stay about chunk_rows long
+        row_group_rows = min(self._sorter.chunk_rows, max(self._sorter.num_rows, 1))
+        tables = self._sorter.sorted_tables()
+        pending, pending_rows = [], 0
+        while True:
+            with stage('sort'):
+                table = next(tables, None)
+            if table is not None:
+                pending.append(table)
+                pending_rows += table.num_rows
+            if pending and (table is None or pending_rows >= row_group_rows):
+                self._write_row_group(pa.concat_tables(pending), row_group_rows)
+                pending, pending_rows = [], 0
+            if table is None:
+                break
+        self._sorter = None
+    
+    def _write_row_group(self, table: pa.Table, row_group_rows: int) -> None:
+        if self._writer is not None and self._rows_in_part >= self.max_rows_per_file:
+            self._close_part()
+        if self._writer is None:
+            self._open_part(row_group_rows)
+        with stage('write', records=table.num_rows):
+            self._writer.write_table(table, row_group_size=max(table.num_rows, 1))
+        self._rows_in_part += table.num_rows
+    
+    def _open_part(self, rows_per_row_group: int) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / self.part_name.format(index=len(self.paths))
+        writer_kwargs = {}
+        if self.output_options is not None:
+            writer_kwargs = self.output_options.writer_kwargs(self.unifier.schema, rows_per_row_group)
+        self._writer = pq.ParquetWriter(path, self.unifier.schema, compression=self.compression, **writer_kwargs)
+        self._rows_in_part = 0
+        self.paths.append(str(path))
+    
+    def _close_part(self) -> None:
+        if self._writer is not None:
+            with stage('write') as write_stage:
+                self._writer.close()
+                write_stage.bytes += Path(self.paths[-1]).stat().st_size
+            self._writer = None
+            if self.on_part_closed:
+                self.on_part_closed(self.paths[-1])
+
+
+def scan_output_schemas(input_paths: List[Path], layout: str, batch_size: int,
+                        validator: Optional[OrderValidator] = None) -> Dict[str, pa.Schema]:
+    """
+    First pass: compute the unified schema of every output without keeping any data.
+    
+    Args:
+        input_paths: JSON input files
+        layout: 'flattened' or 'nested'
+        batch_size: Orders per record batch
+        validator: Skip orders this validator rejects, so they cannot widen the schema
+    
+    Returns:
+        Superset schema per output name
+    """
+    unifiers = {}
+    for orders in iter_order_batches(input_paths, batch_size):
+        if validator is not None:
+            orders = validator.validate(orders)
+        for name, table in build_output_tables(orders, layout).items():
+            unifiers.setdefault(name, SchemaUnifier()).observe(table.schema)
+    return {name: unifier.schema for name, unifier in unifiers.items()}
+
+
+def convert_json_stream(
+    input_paths: List[str],
+    output_dir: str,
+    compression: str = 'snappy',
+    layout: str = 'flattened',
+    batch_size: int = 1000,
+    max_rows_per_file: int = 1_000_000,
+    schema_pass: bool = True,
+    on_file_written: Optional[Callable[[str], Any]] = None,
+    validator: Optional[OrderValidator] = None,
+    output_options: Optional[OutputOptions] = None
+) -> Dict[str, str]:
+    """
+    Stream many JSON inputs into a few schema-consistent Parquet part files per output.
+    
+    Orders are converted in record batches straight to Arrow (no pandas
+    concat); each batch is conformed to the unified schema by casting and
+    filling null columns. With schema_pass, a first pass over the inputs
+    computes the final superset so that every part shares one schema;
+    without it, a new part is started whenever the schema widens.
+    
+    Args:
+        input_paths: JSON files or directories of JSON/NDJSON files
+        output_dir: Directory to write <output>/part-NNNNN.parquet into
+        compression: Compression algorithm to use
+        layout: 'flattened' or 'nested'
+        batch_size: Orders per record batch
+        max_rows_per_file: Rows after which a part file is rolled
+        schema_pass: Scan inputs for the unified schema before writing
+        on_file_written: Called with each part path as soon as it is closed (e.g. S3UploadSink.submit)
+        validator: Checks each batch and quarantines failing orders before they are written
+        output_options: Sort keys (sorted externally, spilling to disk), page indexes and Bloom filters
+    
+    Returns:
+        Dictionary with paths to created Parquet part files
+    """
+    paths = expand_input_paths(input_paths)
+    output_dir = Path(output_dir)
+    logger.info(f"Streaming {len(paths)} input file(s) in batches of {batch_size} orders")
+    
+    schemas = {}
+    if schema_pass:
+        logger.info("Scanning inputs for the unified output schemas...")
+        # A quarantine-less copy so the scan neither writes rejects nor marks ids as seen
+        scan_validator = OrderValidator(tolerance=validator.tolerance) if validator is not None else None
+        schemas = scan_output_schemas(paths, layout, batch_size, scan_validator)
+    
+    writers = {}
+    orders_seen = 0
+    for orders in iter_order_batches(paths, batch_size):
+        orders_seen += len(orders)
+        if validator is not None:
+            orders = validator.validate(orders)
+            if not orders:
+                continue
+        for name, table in build_output_tables(orders, layout).items():
+            if name not in writers:
+                writers[name] = UnifiedPartWriter(output_dir, name, compression, max_rows_per_file,
+                                                  schemas.get(name), on_file_written, output_options)
+            writers[name].write(table)
+        logger.debug(f"Converted {orders_seen} orders")
+    
+    created_files = {}
+    for name, writer in writers.items():
+        for index, path in enumerate(writer.close()):
+            created_files[f"{name}_part_{index:05d}"] = path
+    
+    logger.info(f"Streamed {orders_seen} orders into {len(created_files)} part file(s)")
+    return created_files
+
+
+def collect_parquet_stats(parquet_file_path: str) -> Dict[str, Any]:
+    """
+    Collect layout statistics for a Parquet file from its footer metadata only.
+    
+    Args:
+        parquet_file_path: Path to the Parquet file
+    
+    Returns:
+        Dictionary with file, row group and per-column statistics
+    """
+    parquet_file = pq.ParquetFile(parquet_file_path)
+    metadata = parquet_file.metadata
+    
+    row_groups = []
+    columns = {}
+    for rg_index in range(metadata.num_row_groups):
+        rg = metadata.row_group(rg_index)
+        rg_columns = {}
+        for col_index in range(rg.num_columns):
+            chunk = rg.column(col_index)
+            stats = chunk.statistics if chunk.is_stats_set else None
+            chunk_info = {
+                'compression': chunk.compression,
+                'encodings': list(chunk.encodings),
+                'compressed_bytes': chunk.total_compressed_size,
+                'uncompressed_bytes': chunk.total_uncompressed_size,
+                'null_count': stats.null_count if stats is not None and stats.has_null_count else None,
+                'min': stats.min if stats is not None and stats.has_min_max else None,
+                'max': stats.max if stats is not None and stats.has_min_max else None,
+                'page_index': chunk.has_column_index and chunk.has_offset_index,
+                'bloom_filter_bytes': chunk.bloom_filter_length or 0,
+            }
+            rg_columns[chunk.path_in_schema] = chunk_info
+            
+            # Aggregate the column across row groups
+            col = columns.setdefault(chunk.path_in_schema, {
+                'physical_type': chunk.physical_type,
+                'compression': chunk.compression,
+                'encodings': [],
+                'compressed_bytes': 0,
+                'uncompressed_bytes': 0,
+                'null_count': 0,
+                'min': None,
+                'max': None,
+                'page_index': True,
+                'bloom_filter_bytes': 0,
+            })
+            col['encodings'] = sorted(set(col['encodings']) | set(chunk.encodings))
+            col['compressed_bytes'] += chunk.total_compressed_size
+            col['uncompressed_bytes'] += chunk.total_uncompressed_size
+            col['page_index'] = col['page_index'] and chunk_info['page_index']
+            col['bloom_filter_bytes'] += chunk_info['bloom_filter_bytes']
+            if chunk_info['null_count'] is None or col['null_count'] is None:
+                col['null_count'] = None
+            else:
+                col['null_count'] += chunk_info['null_count']
+            if chunk_info['min'] is not None:
+                try:
+                    col['min'] = chunk_info['min'] if col['min'] is None else min(col['min'], chunk_info['min'])
+                    col['max'] = chunk_info['max'] if col['max'] is None else max(col['max'], chunk_info['max'])
+                except TypeError:
+                    pass  # Mixed statistic types; keep what we have
+        
+        row_groups.append({
+            'index': rg_index,
+            'num_rows': rg.num_rows,
+            'compressed_bytes': sum(c['compressed_bytes'] for c in rg_columns.values()),
+            'uncompressed_bytes': rg.total_byte_size,
+            'sorting_columns': [metadata.schema.column(c.column_index).path for c in rg.sorting_columns],
+            'columns': rg_columns,
+        })
+    
+    compressed = sum(rg['compressed_bytes'] for rg in row_groups)
+    uncompressed = sum(rg['uncompressed_bytes'] for rg in row_groups)
+    return {
+        'path': str(parquet_file_path),
+        'file_bytes': Path(parquet_file_path).stat().st_size,
+        'num_rows': metadata.num_rows,
+        'num_columns': metadata.num_columns,
+        'num_row_groups': metadata.num_row_groups,
+        'created_by': metadata.created_by,
+        'compressed_bytes': compressed,
+        'uncompressed_bytes': uncompressed,
+        'compression_ratio': round(uncompressed / compressed, 3) if compressed else None,
+        'row_groups': row_groups,
+        'columns': columns,
+    }
+
+
+def get_parquet_info(parquet_file_path: str, show: bool = True) -> Dict[str, Any]:
     """
     Display information about the created Parquet file.
     
+    Only the footer metadata and the first rows of the first row group are read,
+    so inspecting multi-GB outputs stays cheap.
+    
     Args:
         parquet_file_path: Path to the Parquet file
+        show: Print the report (set False to only collect statistics)
+    
+    Returns:
+        Layout statistics as returned by collect_parquet_stats (empty on error)
     """
     try:
-        # Read parquet file metadata
+        stats = collect_parquet_stats(parquet_file_path)
+        if not show:
+            return stats
+        
         parquet_file = pq.ParquetFile(parquet_file_path)
         
         print(f"\n=== Parquet File Info: {Path(parquet_file_path).name} ===")
         print(f"Schema:")
-        print(parquet_file.schema)
+        print(parquet_file.schema_arrow)
         print(f"\nMetadata:")
-        print(f"  - Number of rows: {parquet_file.metadata.num_rows}")
-        print(f"  - Number of columns: {parquet_file.metadata.num_columns}")
-        print(f"  - File size: {Path(parquet_file_path).stat().st_size:,} bytes")
+        print(f"  - Number of rows: {stats['num_rows']}")
+        print(f"  - Number of columns: {stats['num_columns']}")
+        print(f"  - Number of row groups: {stats['num_row_groups']}")
+        print(f"  - File size: {stats['file_bytes']:,} bytes")
+        print(f"  - Compressed / uncompressed: {stats['compressed_bytes']:,} / {stats['uncompressed_bytes']:,} bytes"
+              f" (ratio {stats['compression_ratio']})")
         
-        # Read and display sample data
-        df = pd.read_parquet(parquet_file_path)
+        sorted_by = stats['row_groups'][0]['sorting_columns'] if stats['row_groups'] else []
+        if sorted_by:
+            print(f"  - Sorted by: {', '.join(sorted_by)}")
+        indexed = [name for name, col in stats['columns'].items() if col['page_index']]
+        if indexed:
+            print(f"  - Page index: {len(indexed)} of {stats['num_columns']} columns")
+        
+        print(f"\nRow groups:")
+        for rg in stats['row_groups']:
+            print(f"  - #{rg['index']}: {rg['num_rows']:,} rows, "
+                  f"{rg['compressed_bytes']:,} compressed / {rg['uncompressed_bytes']:,} uncompressed bytes")
+        
+        print(f"\nColumns:")
+        for name, col in stats['columns'].items():
+            print(f"  - {name}: {col['physical_type']} {col['compression']} [{', '.join(col['encodings'])}] "
+                  f"{col['compressed_bytes']:,}/{col['uncompressed_bytes']:,} bytes, "
+                  f"nulls={col['null_count']}, min={col['min']!r}, max={col['max']!r}"
+                  + (f", bloom={col['bloom_filter_bytes']:,} bytes" if col['bloom_filter_bytes'] else ""))
+        
+        # Sample rows come from the first batch of the first row group only
+        first_batch = next(parquet_file.iter_batches(batch_size=3), None)
         print(f"\nSample data (first 3 rows):")
-        print(df.head(3).to_string())
-        print(f"\nData types:")
-        print(df.dtypes.to_string())
+        if first_batch is not None:
+            print(first_batch.to_pandas().to_string())
+        
+        return stats
         
     except Exception as e:
         logger.error(f"Error reading Parquet file info: {e}")
+        return {}
+
+
+def write_stats_json(stats_path: str, source: str, file_stats: Dict[str, Dict[str, Any]]) -> None:
+    """
+    Write layout statistics for the created files to a JSON report.
+    
+    Args:
+        stats_path: Path of the JSON report to write
+        source: Input file the outputs were converted from
+        file_stats: Statistics per output file type
+    """
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'source': source,
+        'files': file_stats,
+    }
+    Path(stats_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(stats_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    logger.info(f"Layout statistics written to: {stats_path}")
 
 
 def parse_arguments():
@@ -256,12 +964,71 @@ Examples:
   python json_to_parquet.py data.json --output my_output_dir
   python json_to_parquet.py large_file.json --compression gzip
   python json_to_parquet.py nested_data.json --output parquet_files --compression brotli
+  python json_to_parquet.py order.json --no-info --stats-json layout_stats.json
+  python json_to_parquet.py generated_orders.json --layout nested
+  python json_to_parquet.py batch_orders/ --output parquet_files --batch-size 5000
+  python json_to_parquet.py a.json b.ndjson --stream --single-pass
+  python json_to_parquet.py batch_orders/ --upload-s3 s3://my-bucket/staging/ --upload-concurrency 8
+  python json_to_parquet.py generated_orders.json --profile --profile-pstats convert.pstats
+  python json_to_parquet.py batch_orders/ --validate --quarantine rejected/orders.ndjson
+  python json_to_parquet.py batch_orders/ --sort-by orderId --page-index --bloom-filter
+  python json_to_parquet.py batch_orders/ --sort-by orderDate,orderId --sort-memory-mb 512 --spill-dir /mnt/tmp
+  python json_to_parquet.py --watch incoming/ --output parquet_files --roll-seconds 15 --roll-mb 64
+  python json_to_parquet.py batch_orders/ --redshift-ddl redshift_tables.sql --column-profile column_profile.json
         """
     )
     
     parser.add_argument(
         'json_file',
-        help='Path to the JSON file to convert'
+        nargs='*',
+        help='Path to the JSON file to convert (several files or directories switch to streaming mode)'
+    )
+    
+    parser.add_argument(
+        '--watch',
+        metavar='DIR',
+        help='Run as a service: convert JSON/NDJSON files as they arrive in DIR into rolling part files'
+    )
+    
+    parser.add_argument(
+        '--roll-mb',
+        type=float,
+        default=128,
+        help='With --watch, publish the open parts once one reaches this size in MiB (default: 128)'
+    )
+    
+    parser.add_argument(
+        '--roll-seconds',
+        type=float,
+        default=30,
+        help='With --watch, publish the open parts at least this often (default: 30)'
+    )
+    
+    parser.add_argument(
+        '--poll',
+        action='store_true',
+        help='With --watch, list the directory periodically instead of using inotify'
+    )
+    
+    parser.add_argument(
+        '--poll-interval',
+        type=float,
+        default=1.0,
+        help='Seconds between directory listings when polling (default: 1.0)'
+    )
+    
+    parser.add_argument(
+        '--settle-seconds',
+        type=float,
+        default=1.0,
+        help='When polling, only pick up files unmodified for this long (default: 1.0)'
+    )
+    
+    parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        metavar='SECONDS',
+        help='With --watch, stop after this long without new files (default: run until interrupted)'
     )
     
     parser.add_argument(
@@ -277,6 +1044,152 @@ Examples:
         help='Compression algorithm to use (default: snappy)'
     )
     
+    parser.add_argument(
+        '--layout',
+        choices=['flattened', 'nested'],
+        default='flattened',
+        help='flattened: summary/items/flattened files with index-suffixed columns; '
+             'nested: one orders file with struct/list columns for Redshift SUPER or Spectrum (default: flattened)'
+    )
+    
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        help='Stream inputs through Arrow record batches into unified part files (implied by several inputs)'
+    )
+    
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=1000,
+        help='Orders per record batch in streaming mode (default: 1000)'
+    )
+    
+    parser.add_argument(
+        '--max-rows-per-file',
+        type=int,
+        default=1_000_000,
+        help='Rows after which a streaming part file is rolled (default: 1000000)'
+    )
+    
+    parser.add_argument(
+        '--single-pass',
+        action='store_true',
+        help='Skip the schema scan in streaming mode; a new part is started whenever the schema widens'
+    )
+    
+    parser.add_argument(
+        '--upload-s3',
+        metavar='S3_URI',
+        help='Upload each finished file to this s3://bucket/prefix while conversion continues'
+    )
+    
+    parser.add_argument(
+        '--upload-part-size',
+        type=int,
+        default=8,
+        help='Multipart upload part size in MiB, minimum 5 (default: 8)'
+    )
+    
+    parser.add_argument(
+        '--upload-concurrency',
+        type=int,
+        default=4,
+        help='Parts uploaded in parallel (default: 4)'
+    )
+    
+    parser.add_argument(
+        '--s3-endpoint-url',
+        help='Custom S3 endpoint, e.g. http://localhost:9000 for MinIO or a moto server'
+    )
+    
+    parser.add_argument(
+        '--sort-by',
+        metavar='KEYS',
+        nargs='?',
+        const=','.join(DEFAULT_SORT_KEYS),
+        help=f'Sort each output by these comma-separated keys, spilling to disk if needed '
+             f'(default when given without a value: {",".join(DEFAULT_SORT_KEYS)})'
+    )
+    
+    parser.add_argument(
+        '--sort-memory-mb',
+        type=int,
+        default=256,
+        help='Memory to buffer per output before spilling a sorted run (default: 256)'
+    )
+    
+    parser.add_argument(
+        '--spill-dir',
+        help='Directory for sorted runs spilled to disk (default: system temp directory)'
+    )
+    
+    parser.add_argument(
+        '--page-index',
+        action='store_true',
+        help='Write column and offset page indexes so readers can skip pages'
+    )
+    
+    parser.add_argument(
+        '--bloom-filter',
+        metavar='KEYS',
+        nargs='?',
+        const=','.join(DEFAULT_BLOOM_KEYS),
+        help=f'Write Bloom filters for these comma-separated keys '
+             f'(default when given without a value: {",".join(DEFAULT_BLOOM_KEYS)})'
+    )
+    
+    parser.add_argument(
+        '--bloom-fpp',
+        type=float,
+        default=0.05,
+        help='Bloom filter false-positive probability (default: 0.05)'
+    )
+    
+    parser.add_argument(
+        '--validate',
+        action='store_true',
+        help='Check business invariants before writing and quarantine orders that fail'
+    )
+    
+    parser.add_argument(
+        '--quarantine',
+        metavar='PATH',
+        help='NDJSON file for orders failing --validate (default: quarantine.ndjson in the output directory); '
+             'appended to with --watch'
+    )
+    
+    parser.add_argument(
+        '--tolerance',
+        type=float,
+        default=0.05,
+        help='Largest difference allowed between money amounts in --validate checks (default: 0.05)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Time each stage and report throughput and peak RSS growth as JSON'
+    )
+    
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='Also trace allocations with tracemalloc (implies --profile; makes stage times much slower)'
+    )
+    
+    parser.add_argument(
+        '--profile-json',
+        metavar='PATH',
+        help='Write the --profile summary to this file instead of stdout'
+    )
+    
+    parser.add_argument(
+        '--profile-pstats',
+        metavar='PATH',
+        help='With --profile, also record the run with cProfile and dump pstats here'
+    )
+    
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -289,7 +1202,30 @@ Examples:
         help='Skip displaying file information after conversion'
     )
     
-    return parser.parse_args()
+    parser.add_argument(
+        '--stats-json',
+        metavar='PATH',
+        help='Write row group, encoding and column statistics of the outputs to a JSON file'
+    )
+    
+    parser.add_argument(
+        '--redshift-ddl',
+        metavar='PATH',
+        help='Profile the outputs and write Redshift CREATE TABLE statements with encodings and dist/sort keys'
+    )
+    
+    parser.add_argument(
+        '--column-profile',
+        metavar='PATH',
+        help='With --redshift-ddl, also write the column profiles (distinct counts, nulls, min/max) as JSON'
+    )
+    
+    args = parser.parse_args()
+    if bool(args.json_file) == bool(args.watch):
+        parser.error('give either JSON files to convert or --watch DIR')
+    if args.column_profile and not args.redshift_ddl:
+        parser.error('--column-profile requires --redshift-ddl')
+    return args
 
 
 def main():
@@ -301,37 +1237,120 @@ def main():
     log_level = logging.DEBUG if args.verbose else logging.INFO
     logging.getLogger().setLevel(log_level)
     
-    json_file_path = args.json_file
+    args.profile = args.profile or args.profile_memory
+    if args.profile:
+        import profiling
+        profiler = profiling.enable(trace_memory=args.profile_memory, pstats_path=args.profile_pstats)
+    
+    json_file_path = args.watch or ', '.join(args.json_file)
     output_directory = args.output
     compression = args.compression
+    streaming = args.stream or len(args.json_file) > 1 or any(Path(p).is_dir() for p in args.json_file)
     
-    # Validate JSON file path
-    json_path = Path(json_file_path)
-    if not json_path.exists():
-        logger.error(f"JSON file not found: {json_file_path}")
-        sys.exit(1)
-    
-    if not json_path.is_file():
-        logger.error(f"Path is not a file: {json_file_path}")
+    if args.watch and not Path(args.watch).is_dir():
+        logger.error(f"Watch directory not found: {args.watch}")
         sys.exit(1)
     
-    if json_path.suffix.lower() != '.json':
-        logger.warning(f"File doesn't have .json extension: {json_file_path}")
-        response = input("Continue anyway? (y/N): ")
-        if response.lower() != 'y':
-            sys.exit(0)
+    # Validate JSON file paths
+    for input_path in args.json_file:
+        json_path = Path(input_path)
+        if not json_path.exists():
+            logger.error(f"JSON file not found: {input_path}")
+            sys.exit(1)
+        
+        if json_path.is_dir():
+            if not streaming:
+                logger.error(f"Path is not a file: {input_path}")
+                sys.exit(1)
+            continue
+        
+        if json_path.suffix.lower() not in INPUT_SUFFIXES:
+            logger.warning(f"File doesn't have .json extension: {input_path}")
+            response = input("Continue anyway? (y/N): ")
+            if response.lower() != 'y':
+                sys.exit(0)
     
+    upload_sink = None
     try:
         # Convert JSON to Parquet
         logger.info(f"Converting {json_file_path} to Parquet format...")
         logger.info(f"Output directory: {output_directory}")
         logger.info(f"Compression: {compression}")
         
-        created_files = convert_json_to_parquet(
-            json_file_path=json_file_path,
-            output_dir=output_directory,
-            compression=compression
-        )
+        if args.upload_s3:
+            from s3_upload import S3UploadSink
+            upload_sink = S3UploadSink(
+                args.upload_s3,
+                base_dir=output_directory,
+                part_size=args.upload_part_size * 1024 * 1024,
+                concurrency=args.upload_concurrency,
+                endpoint_url=args.s3_endpoint_url
+            )
+        on_file_written = upload_sink.submit if upload_sink else None
+        
+        output_options = None
+        if args.sort_by or args.page_index or args.bloom_filter:
+            output_options = OutputOptions(
+                sort_keys=[k.strip() for k in (args.sort_by or '').split(',') if k.strip()],
+                bloom_keys=[k.strip() for k in (args.bloom_filter or '').split(',') if k.strip()],
+                bloom_fpp=args.bloom_fpp,
+                page_index=args.page_index,
+                sort_memory_mb=args.sort_memory_mb,
+                spill_dir=args.spill_dir
+            )
+        
+        validator = None
+        if args.validate:
+            quarantine_path = args.quarantine or str(Path(output_directory) / 'quarantine.ndjson')
+            # A watch service is restarted over the same output, so earlier rejections are kept
+            validator = OrderValidator(quarantine_path, tolerance=args.tolerance, append=bool(args.watch))
+        
+        if args.watch:
+            from watch_mode import WatchConverter
+            watch_converter = WatchConverter(
+                watch_dir=args.watch,
+                output_dir=output_directory,
+                compression=compression,
+                layout=args.layout,
+                batch_size=args.batch_size,
+                max_rows_per_file=args.max_rows_per_file,
+                roll_mb=args.roll_mb,
+                roll_seconds=args.roll_seconds,
+                poll_interval=args.poll_interval,
+                settle_seconds=args.settle_seconds,
+                use_inotify=not args.poll,
+                validator=validator,
+                output_options=output_options,
+                on_file_written=on_file_written
+            )
+            watch_report = watch_converter.run(idle_timeout=args.idle_timeout)
+            created_files = {Path(p).relative_to(output_directory).as_posix(): p for p in watch_report['parts']}
+        elif streaming:
+            created_files = convert_json_stream(
+                input_paths=args.json_file,
+                output_dir=output_directory,
+                compression=compression,
+                layout=args.layout,
+                batch_size=args.batch_size,
+                max_rows_per_file=args.max_rows_per_file,
+                schema_pass=not args.single_pass,
+                on_file_written=on_file_written,
+                validator=validator,
+                output_options=output_options
+            )
+        else:
+            created_files = convert_json_to_parquet(
+                json_file_path=args.json_file[0],
+                output_dir=output_directory,
+                compression=compression,
+                layout=args.layout,
+                on_file_written=on_file_written,
+                validator=validator,
+                output_options=output_options
+            )
+        
+        validation = validator.close() if validator else None
+        uploads = upload_sink.close() if upload_sink else []
         
         print("\n" + "="*60)
         print("CONVERSION SUMMARY")
@@ -339,15 +1358,55 @@ def main():
         print(f"📄 Source file: {json_file_path}")
         print(f"📁 Output directory: {output_directory}")
         print(f"🗜️  Compression: {compression}")
+        print(f"🧱 Layout: {args.layout}")
         
-        for file_type, file_path in created_files.items():
+        if args.watch:
+            print(f"👀 Watched: {watch_report['files']} file(s), {watch_report['orders']} order(s), "
+                  f"{watch_report['checkpoints']} checkpoint(s)")
+            if watch_report['failed_files']:
+                print(f"⚠️  Unreadable input file(s): {watch_report['failed_files']}")
+        
+        file_stats = {}
+        # A long watch run can publish thousands of parts, so those are only counted
+        for file_type, file_path in ({} if args.watch else created_files).items():
             print(f"\n✅ {file_type.replace('_', ' ').title()}: {file_path}")
-            if not args.no_info:
-                get_parquet_info(file_path)
+            if not args.no_info or args.stats_json:
+                with stage('inspection', nbytes=Path(file_path).stat().st_size):
+                    file_stats[file_type] = get_parquet_info(file_path, show=not args.no_info)
+        
+        if args.stats_json:
+            write_stats_json(args.stats_json, json_file_path, file_stats)
+        
+        if args.redshift_ddl:
+            from column_profile import profile_files, write_profile_json, write_redshift_ddl
+            with stage('column_profile', nbytes=sum(Path(p).stat().st_size for p in created_files.values())):
+                table_profiles = profile_files(created_files.values(), output_directory)
+            write_redshift_ddl(args.redshift_ddl, table_profiles)
+            if args.column_profile:
+                write_profile_json(args.column_profile, table_profiles)
+            print(f"\n🧮 Redshift DDL for {len(table_profiles)} table(s): {args.redshift_ddl}")
+        
+        if validation:
+            print(f"\n🔎 Validated {validation['checked']} order(s), quarantined {validation['quarantined']}")
+            for check, count in sorted(validation['violations'].items()):
+                print(f"   - {check}: {count}")
+            if validation['quarantine_file']:
+                print(f"   Quarantine file: {validation['quarantine_file']}")
+        
+        if uploads:
+            uploaded_bytes = sum(u['bytes'] for u in uploads)
+            print(f"\n☁️  Uploaded {len(uploads)} file(s), {uploaded_bytes:,} bytes to {args.upload_s3}")
         
         print(f"\n🎉 Successfully converted JSON to Parquet format!")
         print(f"� Generated {len(created_files)} Parquet file(s)")
         
+        if args.profile:
+            profiler.finish(
+                args.profile_json,
+                outputs=len(created_files),
+                output_bytes=sum(Path(p).stat().st_size for p in created_files.values())
+            )
+        
     except KeyboardInterrupt:
         logger.info("Conversion interrupted by user")
         sys.exit(130)
@@ -357,6 +1416,10 @@ def main():
             import traceback
             traceback.print_exc()
         sys.exit(1)
+    finally:
+        if upload_sink is not None:
+            # No-op after close(); otherwise stops the pools and open multipart uploads
+            upload_sink.abort()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+"""
+Lazy Imports
+Defers heavy third-party imports (pandas, pyarrow, numpy) until a code path
+actually touches them, so `--help`, argument errors and runs that never need
+a library do not pay for loading it. `pa = lazy_module('pyarrow')` behaves
+like `import pyarrow as pa`; the real import happens on first attribute
+access. Modules using it add `from __future__ import annotations` so type
+hints such as `pa.Table` are not evaluated at definition time.
+"""
+
+import importlib
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that imports it on first attribute access."""
+
+    def __getattr__(self, attr: str):
+        module = importlib.import_module(self.__name__)
+        # Copy the real namespace so later lookups never reach __getattr__ again
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+
+def lazy_module(name: str) -> types.ModuleType:
+    """
+    Return a module that is imported on first use.
+
+    Args:
+        name: Fully qualified module name, e.g. 'pyarrow.parquet'
+
+    Returns:
+        The real module if it is already loaded, otherwise a LazyModule proxy
+    """
+    return sys.modules.get(name) or LazyModule(name)
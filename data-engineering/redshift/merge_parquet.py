@@ -0,0 +1,446 @@
+"""
+Parquet Merge (UPSERT)
+Applies a delta produced by json_to_parquet.py to a base Parquet dataset
+locally, instead of the guide's staging-table DELETE + INSERT in Redshift.
+
+For every table in the delta, rows are deduplicated to the latest image per
+key (highest changeSeq for change streams, otherwise the last one read).
+Base files whose row-group min/max statistics cannot contain any delta key
+are skipped without being read. The key columns of the remaining files are
+hash-joined against the delta keys, and only the files that really hold
+replaced keys are rewritten: their surviving rows, deduplicated the same way
+across all rewritten files, plus the delta rows that replace them. Keys found
+nowhere in the base are written as new files. The result is swapped in
+through compact_parquet's manifest, so readers see the old or the new
+dataset, never a mix, and the warehouse can reload it with a plain COPY or a
+partition swap.
+"""
+
+import argparse
+import bisect
+import logging
+import re
+import shutil
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from compact_parquet import (DEFAULT_TABLE_PATTERN, STAGING_PREFIX, CompactedWriter, commit_swap,
+                             finish_pending, new_swap_id, scan_files)
+from schema_unification import SchemaUnifier
+from sorted_output import resolve_column
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Logical merge keys per json_to_parquet output; resolve_column finds each output's spelling
+DEFAULT_KEYS = {
+    'order_summary': ('orderId',),
+    'order_flattened': ('orderId',),
+    'order_nested': ('orderId',),
+    'order_items': ('order_id', 'itemId'),
+}
+ORDER_KEY = 'changeSeq'
+ROW_INDEX = '__merge_row'
+SOURCE_FILE = '__merge_file'
+SOURCE_ROW = '__merge_source_row'
+
+
+def _resolve_keys(schema: pa.Schema, keys: Sequence[str], table: str) -> List[str]:
+    columns = [resolve_column(schema.names, key) for key in keys]
+    missing = [key for key, column in zip(keys, columns) if column is None]
+    if missing:
+        raise ValueError(f"{table} has no column for merge key(s): {', '.join(missing)}")
+    return columns
+
+
+def _with_row_index(table: pa.Table, columns: List[str]) -> pa.Table:
+    return table.select(columns).append_column(ROW_INDEX, pa.array(np.arange(table.num_rows, dtype=np.int64)))
+
+
+def _join_rows(table: pa.Table, keys: pa.Table, columns: List[str], join_type: str) -> pa.Array:
+    """
+    Positions of the rows of table that have (semi) or lack (anti) a key in keys, in table order.
+
+    Only the key columns take part in the hash join, so payload columns of any
+    type (lists, structs) are fine and rows are taken back in their original order.
+    """
+    joined = _with_row_index(table, columns).join(keys, keys=columns, join_type=join_type, use_threads=True)
+    return joined.column(ROW_INDEX).combine_chunks().sort()
+
+
+def latest_per_key(table: pa.Table, columns: List[str], order_column: Optional[str] = None) -> pa.Table:
+    """
+    Keep one row per key: the one with the highest order_column, or the last one.
+
+    Args:
+        table: Rows in the order they were read
+        columns: Key columns
+        order_column: Column ordering the images of one key (e.g. changeSeq)
+
+    Returns:
+        Deduplicated rows, in their original relative order
+    """
+    if order_column is not None:
+        # Arrow's sort is stable, so equal sequence numbers keep read order
+        # Rows without a sequence number (files predating it) count as the oldest
+        table = table.sort_by([(order_column, 'ascending', 'at_start')])
+    last = _with_row_index(table, columns).group_by(columns, use_threads=False).aggregate([(ROW_INDEX, 'max')])
+    return table.take(last.column(f"{ROW_INDEX}_max").combine_chunks().sort())
+
+
+def may_contain(metadata: pq.FileMetaData, column: str, values: List[Any]) -> bool:
+    """
+    Whether any row group's min/max statistics for column admit one of the sorted values.
+
+    Files without usable statistics are assumed to contain them.
+    """
+    index = next((i for i in range(metadata.num_columns) if metadata.schema.column(i).path == column), None)
+    if index is None:
+        return True
+    for i in range(metadata.num_row_groups):
+        stats = metadata.row_group(i).column(index).statistics
+        if stats is None or not stats.has_min_max:
+            return True
+        try:
+            position = bisect.bisect_left(values, stats.min)
+            if position < len(values) and values[position] <= stats.max:
+                return True
+        except TypeError:
+            return True
+    return False
+
+
+def read_columns(path: Path, names: List[str], schema: pa.Schema) -> pa.Table:
+    """Read some columns of a file as typed in schema, with nulls for columns the file lacks."""
+    present = set(pq.read_schema(path).names)
+    table = pq.read_table(path, columns=[name for name in names if name in present])
+    return pa.table({
+        name: table.column(name).cast(schema.field(name).type) if name in present
+        else pa.nulls(table.num_rows, schema.field(name).type)
+        for name in names
+    })
+
+
+def read_delta(files: List[Dict[str, Any]], unifier: SchemaUnifier) -> pa.Table:
+    """Read a table's delta files into one table conformed to the unified schema."""
+    for info in files:
+        unifier.observe(info['schema'].remove_metadata())
+    tables = []
+    for info in files:
+        batches = [unifier.conform(batch) for batch in pq.ParquetFile(info['path']).iter_batches()]
+        tables.append(pa.Table.from_batches(batches, schema=unifier.schema))
+    return pa.concat_tables(tables) if tables else unifier.schema.empty_table()
+
+
+def merge_table(
+    table: str,
+    base_files: List[Dict[str, Any]],
+    delta_files: List[Dict[str, Any]],
+    keys: Sequence[str],
+    base_root: Path,
+    staging_dir: Path,
+    merge_id: str,
+    compression: str,
+    target_bytes: int,
+    row_group_bytes: int,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Merge one table's delta into its base files.
+
+    Args:
+        table: Table name (subdirectory or cleaned file stem)
+        base_files: Live base files of the table (from scan_files)
+        delta_files: Delta files of the table
+        keys: Logical merge keys
+        base_root: Base dataset root
+        staging_dir: Where to write the new files
+        merge_id: Id used in the new file names
+        compression: Compression algorithm for the new files
+        target_bytes: Approximate size of each new file
+        row_group_bytes: In-memory Arrow size of each written row group
+        dry_run: Only report which files the statistics cannot rule out
+
+    Returns:
+        Summary with row and file counts plus 'moves' and 'replaced' for the swap
+
+    Raises:
+        RuntimeError: If the merged row count does not add up
+    """
+    unifier = SchemaUnifier()
+    for info in base_files:
+        unifier.observe(info['schema'].remove_metadata())
+    delta = read_delta(delta_files, unifier)
+    schema = unifier.schema
+    columns = _resolve_keys(schema, keys, table)
+    order_column = resolve_column(schema.names, ORDER_KEY)
+
+    delta_rows = delta.num_rows
+    delta = latest_per_key(delta, columns, order_column)
+    delta_keys = delta.select(columns)
+    # Leading key values, sorted, for pruning by row-group statistics
+    probe = sorted(v for v in delta.column(columns[0]).unique().to_pylist() if v is not None)
+
+    candidates = [info for info in base_files if may_contain(pq.read_metadata(info['path']), columns[0], probe)]
+    summary = {
+        'table': table,
+        'keys': columns,
+        'delta_rows': delta_rows,
+        'delta_keys': delta.num_rows,
+        'base_files': len(base_files),
+        'pruned_files': len(base_files) - len(candidates),
+        'moves': [],
+        'replaced': [],
+    }
+    if dry_run:
+        summary['candidate_files'] = len(candidates)
+        return summary
+
+    if base_files:
+        table_dir = base_files[0]['path'].parent
+    else:
+        # A new table takes the delta's layout: its own subdirectory or top-level files
+        table_dir = base_root / table if delta_files[0]['in_subdirectory'] else base_root
+    base_name = 'part' if table_dir != base_root else table.replace('/', '_')
+    prefix = f"{base_name}-c{merge_id}"
+
+    # Only key columns are read to find the files to rewrite and the rows each of them keeps
+    key_names = columns + ([order_column] if order_column is not None and order_column not in columns else [])
+    rewrites, survivors = [], []
+    replaced_rows = 0
+    for info in candidates:
+        keys_only = read_columns(info['path'], key_names, schema)
+        kept = _join_rows(keys_only, delta_keys, columns, 'left anti')
+        if len(kept) == keys_only.num_rows:
+            continue  # The statistics admitted the file but none of its keys changed
+        replaced_rows += keys_only.num_rows - len(kept)
+        survivors.append(keys_only.take(kept)
+                         .append_column(SOURCE_FILE, pa.array(np.full(len(kept), len(rewrites), dtype=np.int64)))
+                         .append_column(SOURCE_ROW, kept))
+        rewrites.append(info)
+
+    # A base built straight from a change stream holds several images per key; keep the latest
+    files = rows = np.empty(0, dtype=np.int64)
+    duplicate_rows = 0
+    if survivors:
+        surviving = pa.concat_tables(survivors)
+        kept = latest_per_key(surviving, columns, order_column).select([SOURCE_FILE, SOURCE_ROW])
+        kept = kept.sort_by([(SOURCE_FILE, 'ascending'), (SOURCE_ROW, 'ascending')])
+        files, rows = kept.column(SOURCE_FILE).to_numpy(), kept.column(SOURCE_ROW).to_numpy()
+        duplicate_rows = surviving.num_rows - kept.num_rows
+
+    written: List[Path] = []
+    remaining = delta
+    rows_out = 0
+    for number, info in enumerate(rewrites):
+        base = pa.Table.from_batches(
+            [unifier.conform(batch) for batch in pq.ParquetFile(info['path']).iter_batches()], schema=schema
+        )
+        start, stop = np.searchsorted(files, [number, number + 1])
+        # Rows replacing this file's keys go into its rewrite; keys already placed are not repeated
+        matched = _join_rows(remaining, base.select(columns), columns, 'left semi')
+        rewritten = pa.concat_tables([base.take(pa.array(rows[start:stop])), remaining.take(matched)])
+        remaining = remaining.take(_join_rows(remaining, base.select(columns), columns, 'left anti'))
+
+        writer = CompactedWriter(staging_dir, prefix, schema, compression, target_bytes, row_group_bytes,
+                                 start_index=len(written))
+        for batch in rewritten.to_batches():
+            writer.write(batch)
+        written.extend(writer.close())
+        rows_out += writer.rows
+        summary['replaced'].append(info['path'].relative_to(base_root).as_posix())
+
+    if remaining.num_rows:
+        writer = CompactedWriter(staging_dir, prefix, schema, compression, target_bytes, row_group_bytes,
+                                 start_index=len(written))
+        for batch in remaining.to_batches():
+            writer.write(batch)
+        written.extend(writer.close())
+        rows_out += writer.rows
+
+    expected = sum(info['rows'] for info in rewrites) - replaced_rows - duplicate_rows + delta.num_rows
+    if rows_out != expected:
+        raise RuntimeError(f"Merge of {table} wrote {rows_out} rows, expected {expected}")
+
+    summary.update({
+        'rewritten_files': len(summary['replaced']),
+        'updated_rows': replaced_rows,
+        'duplicate_rows': duplicate_rows,
+        'inserted_rows': remaining.num_rows,
+        'files_out': len(written),
+        'bytes_out': sum(p.stat().st_size for p in written),
+    })
+    summary['moves'] = [(p.relative_to(base_root).as_posix(), (table_dir / p.name).relative_to(base_root).as_posix())
+                        for p in written]
+    return summary
+
+
+def merge_datasets(
+    base_root: str,
+    delta_root: str,
+    keys: Optional[Dict[str, Sequence[str]]] = None,
+    target_mb: int = 128,
+    row_group_mb: int = 64,
+    compression: str = 'snappy',
+    table_pattern: str = DEFAULT_TABLE_PATTERN,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """
+    Upsert a delta dataset into a base dataset.
+
+    Args:
+        base_root: Base dataset root (created if missing)
+        delta_root: Delta produced by json_to_parquet.py (files or per-output subdirectories)
+        keys: Logical merge keys per table (default: DEFAULT_KEYS)
+        target_mb: Approximate size of each new file
+        row_group_mb: In-memory Arrow size of each written row group
+        compression: Compression algorithm for the new files
+        table_pattern: Regex with a 'table' group mapping a top-level file stem to its table
+        dry_run: Only report which base files would be read
+
+    Returns:
+        Summary with one entry per merged table
+    """
+    base_path = Path(base_root)
+    delta_path = Path(delta_root)
+    pattern = re.compile(table_pattern)
+    keys = {**DEFAULT_KEYS, **(keys or {})}
+    merge_id = new_swap_id()
+
+    base_path.mkdir(parents=True, exist_ok=True)
+    if not dry_run:
+        finish_pending(base_path)
+
+    base_tables = scan_files(base_path, pattern)
+    delta_tables = scan_files(delta_path, pattern)
+    summary = {'base': str(base_path), 'delta': str(delta_path), 'merge_id': merge_id,
+               'dry_run': dry_run, 'tables': []}
+
+    staging_root = base_path / f"{STAGING_PREFIX}{merge_id}"
+    moves, replaced = [], []
+    try:
+        for index, (table, delta_files) in enumerate(sorted(delta_tables.items())):
+            if table not in keys:
+                logger.warning(f"Skipping {table}: no merge key configured (use --key {table}=COLUMNS)")
+                continue
+            for info in delta_files:
+                info['in_subdirectory'] = info['path'].parent != delta_path
+            logger.info(f"Merging {len(delta_files)} delta file(s) into {table}")
+            result = merge_table(table, base_tables.get(table, []), delta_files, keys[table], base_path,
+                                 staging_root / str(index), merge_id, compression,
+                                 target_mb * 1024 * 1024, int(row_group_mb * 1024 * 1024), dry_run)
+            moves.extend(result.pop('moves'))
+            replaced.extend(result.pop('replaced'))
+            summary['tables'].append(result)
+    except Exception:
+        shutil.rmtree(staging_root, ignore_errors=True)
+        raise
+
+    if dry_run or not moves:
+        shutil.rmtree(staging_root, ignore_errors=True)
+        return summary
+
+    manifest = commit_swap(base_path, merge_id, moves, replaced, last_merge={
+        'id': merge_id,
+        'delta': str(delta_path),
+        'tables': summary['tables'],
+        'created': [final for _, final in moves],
+        'replaced': replaced,
+    })
+    logger.info(f"Merge {merge_id} committed (manifest version {manifest['version']})")
+    return summary
+
+
+def parse_key(value: str) -> Tuple[str, List[str]]:
+    """Parse 'table=col1,col2' into ('table', ['col1', 'col2'])."""
+    table, _, columns = value.partition('=')
+    if not table or not columns:
+        raise argparse.ArgumentTypeError(f"expected TABLE=COLUMNS, got {value!r}")
+    return table, [c.strip() for c in columns.split(',') if c.strip()]
+
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Upsert a json_to_parquet.py delta into a base Parquet dataset, rewriting only affected files.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python merge_parquet.py warehouse/ parquet_output/ --dry-run
+  python merge_parquet.py warehouse/ parquet_output/ --target-mb 128
+  python merge_parquet.py warehouse/ changes/ --key order_items=order_id,itemId
+        """
+    )
+
+    parser.add_argument('base', help='Base dataset root (created if missing)')
+    parser.add_argument('delta', help='Delta dataset written by json_to_parquet.py')
+    parser.add_argument('--key', type=parse_key, action='append', default=[], metavar='TABLE=COLUMNS',
+                        help='Merge key(s) of a table; repeatable (default: orderId, and order_id,itemId for items)')
+    parser.add_argument('--target-mb', type=int, default=128, help='Target size of new files in MiB (default: 128)')
+    parser.add_argument('--row-group-mb', type=float, default=64,
+                        help='Arrow in-memory size of each written row group in MiB (default: 64)')
+    parser.add_argument('-c', '--compression', choices=['snappy', 'gzip', 'brotli', 'lz4', 'zstd'],
+                        default='snappy', help='Compression algorithm to use (default: snappy)')
+    parser.add_argument('--table-pattern', default=DEFAULT_TABLE_PATTERN,
+                        help='Regex with a (?P<table>...) group mapping top-level file stems to table names')
+    parser.add_argument('--dry-run', action='store_true', help='Show which base files would be read without writing')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Enable verbose logging')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main execution function."""
+    args = parse_arguments()
+    if args.verbose:
+        logging.getLogger().setLevel(logging.DEBUG)
+
+    if not Path(args.delta).is_dir():
+        logger.error(f"Delta directory not found: {args.delta}")
+        sys.exit(1)
+
+    try:
+        summary = merge_datasets(
+            args.base,
+            args.delta,
+            keys=dict(args.key),
+            target_mb=args.target_mb,
+            row_group_mb=args.row_group_mb,
+            compression=args.compression,
+            table_pattern=args.table_pattern,
+            dry_run=args.dry_run
+        )
+    except Exception as e:
+        logger.error(f"Merge failed: {e}")
+        if args.verbose:
+            import traceback
+            traceback.print_exc()
+        sys.exit(1)
+
+    print("\n" + "="*60)
+    print("MERGE PLAN" if args.dry_run else "MERGE SUMMARY")
+    print("="*60)
+    print(f"📁 Base: {summary['base']}")
+    print(f"🔀 Delta: {summary['delta']}")
+    for table in summary['tables']:
+        print(f"\n  {table['table']} (key: {', '.join(table['keys'])})")
+        print(f"    Delta: {table['delta_rows']:,} row(s), {table['delta_keys']:,} distinct key(s)")
+        print(f"    Base files: {table['base_files']}, skipped by statistics: {table['pruned_files']}")
+        if args.dry_run:
+            print(f"    Files to read: {table['candidate_files']}")
+        else:
+            print(f"    Rewritten: {table['rewritten_files']} file(s), {table['updated_rows']:,} row(s) replaced, "
+                  f"{table['inserted_rows']:,} inserted, {table['duplicate_rows']:,} older duplicate(s) dropped")
+            print(f"    Written: {table['files_out']} file(s), {table['bytes_out']:,} bytes")
+    if not summary['tables']:
+        print("  Nothing to merge")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,18 +9,34 @@ import random
 import argparse
 import sys
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional
 from pathlib import Path
 import logging
 import uuid
-from faker import Faker
+from collections import Counter
+
+from profiling import stage
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Initialize Faker for realistic data generation
-fake = Faker()
+
+class _LazyFaker:
+    """Creates the shared Faker instance, and loads its providers, on first use."""
+
+    def __init__(self):
+        self._faker = None
+
+    def __getattr__(self, name: str) -> Any:
+        if self._faker is None:
+            from faker import Faker
+            self._faker = Faker()
+        return getattr(self._faker, name)
+
+
+# Faker for realistic data generation; importing it is deferred until a value is generated
+fake = _LazyFaker()
 
 
 class OrderGenerator:
@@ -472,6 +488,247 @@ class OrderGenerator:
         }
 
 
+class ChangeStreamGenerator:
+    """
+    Generate a change-data stream of order inserts, updates and cancellations.
+    
+    A pool of open orders is kept; each event either inserts a new order or
+    changes a pooled one: the status moves one step along its lifecycle, the
+    payment status changes, or shipment tracking advances. Orders that are not
+    shipped yet are occasionally cancelled. Completed and cancelled orders
+    leave the pool.
+    
+    Every event carries the full order image under "order" plus "op"
+    (insert, update or cancel), a stream-wide "changeSeq" and the
+    "changeTimestamp", so consumers keep the image with the highest changeSeq
+    per orderId. Images are copied on write, so emitted events never change.
+    """
+    
+    STATUS_FLOW = ["pending", "confirmed", "processing", "shipped", "delivered", "completed"]
+    FULFILLMENT_FOR_STATUS = {
+        "pending": "pending", "confirmed": "pending", "processing": "processing",
+        "shipped": "shipped", "delivered": "delivered", "completed": "delivered",
+    }
+    TRACKING_FLOW = ["Processing", "In Transit", "Out for Delivery", "Delivered"]
+    CANCELLABLE = ("pending", "confirmed", "processing")
+    
+    def __init__(self, generator: OrderGenerator, update_ratio: float = 0.6, cancel_ratio: float = 0.03,
+                 pool_size: int = 10000, min_items: int = 1, max_items: int = 5):
+        """
+        Args:
+            generator: Builds the order images for inserts
+            update_ratio: Share of events that update a pooled order
+            cancel_ratio: Share of events that cancel a pooled order
+            pool_size: Open orders kept for updates; a random one is dropped when full
+            min_items: Minimum items per inserted order
+            max_items: Maximum items per inserted order
+        """
+        if update_ratio < 0 or cancel_ratio < 0 or update_ratio + cancel_ratio > 1:
+            raise ValueError("update and cancel ratios must be non-negative and sum to at most 1")
+        self.generator = generator
+        self.update_ratio = update_ratio
+        self.cancel_ratio = cancel_ratio
+        self.pool_size = pool_size
+        self.min_items = min_items
+        self.max_items = max_items
+        self.counts = Counter()
+        self._pool: List[Dict[str, Any]] = []
+        self._order_ids = set()
+        self._seq = 0
+        self._clock = datetime.now()
+    
+    def next_event(self) -> Dict[str, Any]:
+        """Return the next change event."""
+        self._seq += 1
+        self._clock += timedelta(milliseconds=random.randint(1, 2000))
+        roll = random.random()
+        if self._pool and roll < self.cancel_ratio:
+            index = random.randrange(len(self._pool))
+            if self._pool[index]["status"] in self.CANCELLABLE:
+                return self._event("cancel", self._cancel(index))
+            return self._event("update", self._update(index))
+        if self._pool and roll < self.cancel_ratio + self.update_ratio:
+            return self._event("update", self._update(random.randrange(len(self._pool))))
+        return self._event("insert", self._insert())
+    
+    def events(self, count: int) -> List[Dict[str, Any]]:
+        """Return the next count change events."""
+        return [self.next_event() for _ in range(count)]
+    
+    def _stamp(self) -> str:
+        return self._clock.isoformat() + 'Z'
+    
+    def _event(self, op: str, order: Dict[str, Any]) -> Dict[str, Any]:
+        self.counts[op] += 1
+        return {"op": op, "changeSeq": self._seq, "changeTimestamp": self._stamp(), "order": order}
+    
+    def _insert(self) -> Dict[str, Any]:
+        order = self.generator.generate_order(self.min_items, self.max_items)["order"]
+        # Random ids collide over long streams; the sequence number keeps them unique
+        if order["orderId"] in self._order_ids:
+            order["orderId"] = f"{order['orderId']}-{self._seq}"
+        self._order_ids.add(order["orderId"])
+        
+        stamp = self._stamp()
+        order["status"] = "pending"
+        order["payment"]["status"] = random.choices(["completed", "pending"], weights=[7, 3])[0]
+        order["fulfillment"]["fulfillmentStatus"] = "pending"
+        order["fulfillment"]["shipping"]["tracking"]["currentStatus"] = "Processing"
+        order["metadata"]["timestamps"] = {"created": stamp, "updated": stamp, "completed": None}
+        
+        if len(self._pool) >= self.pool_size:
+            self._retire(random.randrange(len(self._pool)))
+        self._pool.append(order)
+        return order
+    
+    def _revise(self, index: int) -> Dict[str, Any]:
+        """Replace a pooled order by a copy whose changeable sections are copies too."""
+        order = dict(self._pool[index])
+        order["payment"] = dict(order["payment"])
+        fulfillment = order["fulfillment"] = dict(order["fulfillment"])
+        shipping = fulfillment["shipping"] = dict(fulfillment["shipping"])
+        shipping["tracking"] = dict(shipping["tracking"])
+        metadata = order["metadata"] = dict(order["metadata"])
+        metadata["timestamps"] = dict(metadata["timestamps"])
+        metadata["timestamps"]["updated"] = self._stamp()
+        self._pool[index] = order
+        return order
+    
+    def _retire(self, index: int) -> None:
+        # Swap-remove keeps retiring O(1); pool order does not matter
+        last = self._pool.pop()
+        if index < len(self._pool):
+            self._pool[index] = last
+    
+    def _update(self, index: int) -> Dict[str, Any]:
+        order = self._revise(index)
+        payment_status = order["payment"]["status"]
+        tracking = order["fulfillment"]["shipping"]["tracking"]
+        
+        changes = []
+        if order["status"] == "pending" or payment_status == "completed":
+            changes.append(self._advance_status)
+        if payment_status in ("pending", "failed"):
+            changes.append(self._change_payment)
+        if order["status"] == "shipped" and tracking["currentStatus"] in self.TRACKING_FLOW[:2]:
+            changes.append(self._advance_tracking)
+        random.choice(changes)(order)
+        
+        if order["status"] == "completed":
+            self._retire(index)
+        return order
+    
+    def _advance_status(self, order: Dict[str, Any]) -> None:
+        stamp = self._stamp()
+        status = self.STATUS_FLOW[self.STATUS_FLOW.index(order["status"]) + 1]
+        order["status"] = status
+        order["fulfillment"]["fulfillmentStatus"] = self.FULFILLMENT_FOR_STATUS[status]
+        tracking = order["fulfillment"]["shipping"]["tracking"]
+        if status == "shipped":
+            order["fulfillment"]["shipping"]["shippedDate"] = stamp
+            tracking.update(currentStatus="In Transit", lastUpdate=stamp)
+        elif status == "delivered":
+            tracking.update(currentStatus="Delivered", lastUpdate=stamp)
+        elif status == "completed":
+            order["metadata"]["timestamps"]["completed"] = stamp
+    
+    def _change_payment(self, order: Dict[str, Any]) -> None:
+        payment = order["payment"]
+        if payment["status"] == "pending":
+            payment["status"] = random.choices(["completed", "failed"], weights=[85, 15])[0]
+        else:
+            # A failed payment is retried successfully
+            payment["status"] = "completed"
+        payment["processedAt"] = self._stamp()
+    
+    def _advance_tracking(self, order: Dict[str, Any]) -> None:
+        tracking = order["fulfillment"]["shipping"]["tracking"]
+        tracking["currentStatus"] = self.TRACKING_FLOW[self.TRACKING_FLOW.index(tracking["currentStatus"]) + 1]
+        tracking["lastUpdate"] = self._stamp()
+    
+    def _cancel(self, index: int) -> Dict[str, Any]:
+        order = self._revise(index)
+        order["status"] = "cancelled"
+        order["fulfillment"]["fulfillmentStatus"] = "cancelled"
+        payment = order["payment"]
+        if payment["status"] == "completed":
+            payment["status"] = "refunded"
+        elif payment["status"] == "pending":
+            payment["status"] = "voided"
+        order["metadata"]["timestamps"]["completed"] = self._stamp()
+        self._retire(index)
+        return order
+
+
+def generate_orders(generator: OrderGenerator, count: int, min_items: int, max_items: int) -> List[Dict[str, Any]]:
+    """Generate a list of orders as one profiled stage."""
+    with stage('generate', records=count):
+        return [generator.generate_order(min_items, max_items) for _ in range(count)]
+
+
+def write_json(data: Any, path: Path, pretty: bool = False, records: int = 1) -> None:
+    """
+    Serialize data to JSON and write it, timing both steps separately.
+    
+    Args:
+        data: JSON-serialisable object
+        path: Output file path
+        pretty: Indent the output
+        records: Number of orders contained, for throughput reporting
+    """
+    with stage('serialize', records=records) as serialize_stage:
+        text = json.dumps(data, indent=2 if pretty else None, ensure_ascii=False)
+        serialize_stage.bytes += len(text)
+    with stage('write', records=records) as write_stage:
+        with open(path, 'w', encoding='utf-8') as f:
+            write_stage.bytes += f.write(text)
+
+
+def _event_chunks(stream: ChangeStreamGenerator, count: int, chunk_size: int) -> Iterator[List[Dict[str, Any]]]:
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        with stage('generate', records=size):
+            events = stream.events(size)
+        yield events
+
+
+def write_change_stream(stream: ChangeStreamGenerator, count: int, path: Path,
+                        output_format: str = 'ndjson', chunk_size: int = 10000) -> List[str]:
+    """
+    Generate count change events and write them as NDJSON or Parquet, chunk by chunk.
+    
+    Args:
+        stream: Change stream to draw events from
+        count: Number of events
+        path: NDJSON file, or directory for the Parquet outputs
+        output_format: 'ndjson' (one event per line) or 'parquet' (json_to_parquet's
+            flattened outputs, each row carrying op, changeSeq and changeTimestamp)
+        chunk_size: Events generated and written at a time
+    
+    Returns:
+        Paths of the files written
+    """
+    if output_format == 'parquet':
+        # Only Parquet output needs pyarrow, so the converter is imported here
+        from json_to_parquet import UnifiedPartWriter, build_output_tables
+        writers = {}
+        for events in _event_chunks(stream, count, chunk_size):
+            for name, table in build_output_tables(events).items():
+                if name not in writers:
+                    writers[name] = UnifiedPartWriter(path, name, 'snappy', max_rows_per_file=10_000_000)
+                writers[name].write(table)
+        return [p for writer in writers.values() for p in writer.close()]
+    
+    with open(path, 'w', encoding='utf-8') as f:
+        for events in _event_chunks(stream, count, chunk_size):
+            with stage('serialize', records=len(events)) as serialize_stage:
+                text = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+                serialize_stage.bytes += len(text)
+            with stage('write', records=len(events)) as write_stage:
+                write_stage.bytes += f.write(text)
+    return [str(path)]
+
+
 def parse_arguments():
     """Parse command-line arguments."""
     parser = argparse.ArgumentParser(
@@ -483,6 +740,10 @@ Examples:
   python order_generator.py --count 5 --output orders --min-items 2 --max-items 8
   python order_generator.py --count 1 --output sample_order.json --detailed
   python order_generator.py --batch 100 --output-dir batch_orders
+  python order_generator.py --count 10000 --profile --profile-json profile.json
+  python order_generator.py --count 1000 --profile-memory --profile-json profile_memory.json
+  python order_generator.py --cdc --count 100000 --update-ratio 0.7 --output test_output/changes.ndjson
+  python order_generator.py --cdc --count 100000 --cdc-format parquet --output test_output/changes
         """
     )
     
@@ -495,8 +756,8 @@ Examples:
     
     parser.add_argument(
         '--output',
-        default='test_output/generated_orders.json',
-        help='Output file name (default: test_output/generated_orders.json)'
+        help='Output file name (default: test_output/generated_orders.json, '
+             'or test_output/order_changes[.ndjson] with --cdc)'
     )
     
     parser.add_argument(
@@ -542,6 +803,64 @@ Examples:
         help='Random seed for reproducible generation'
     )
     
+    parser.add_argument(
+        '--cdc',
+        action='store_true',
+        help='Generate a change-data stream of inserts, updates and cancellations; --count is the number of events'
+    )
+    
+    parser.add_argument(
+        '--update-ratio',
+        type=float,
+        default=0.6,
+        help='With --cdc, share of events that update an earlier order (default: 0.6)'
+    )
+    
+    parser.add_argument(
+        '--cancel-ratio',
+        type=float,
+        default=0.03,
+        help='With --cdc, share of events that cancel an order not yet shipped (default: 0.03)'
+    )
+    
+    parser.add_argument(
+        '--pool-size',
+        type=int,
+        default=10000,
+        help='With --cdc, open orders kept around for updates (default: 10000)'
+    )
+    
+    parser.add_argument(
+        '--cdc-format',
+        choices=['ndjson', 'parquet'],
+        default='ndjson',
+        help='With --cdc, write one NDJSON file or a directory of flattened Parquet outputs (default: ndjson)'
+    )
+    
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help='Time each stage and report throughput and peak RSS growth as JSON'
+    )
+    
+    parser.add_argument(
+        '--profile-memory',
+        action='store_true',
+        help='Also trace allocations with tracemalloc (implies --profile; makes stage times much slower)'
+    )
+    
+    parser.add_argument(
+        '--profile-json',
+        metavar='PATH',
+        help='Write the --profile summary to this file instead of stdout'
+    )
+    
+    parser.add_argument(
+        '--profile-pstats',
+        metavar='PATH',
+        help='With --profile, also record the run with cProfile and dump pstats here'
+    )
+    
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
@@ -559,6 +878,11 @@ def main():
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
+    args.profile = args.profile or args.profile_memory
+    if args.profile:
+        import profiling
+        profiler = profiling.enable(trace_memory=args.profile_memory, pstats_path=args.profile_pstats)
+    
     # Set random seed for reproducibility
     if args.seed:
         random.seed(args.seed)
@@ -568,6 +892,26 @@ def main():
     try:
         generator = OrderGenerator()
         
+        if args.cdc:
+            stream = ChangeStreamGenerator(generator, args.update_ratio, args.cancel_ratio,
+                                           args.pool_size, args.min_items, args.max_items)
+            default_output = 'test_output/order_changes' + ('.ndjson' if args.cdc_format == 'ndjson' else '')
+            output_path = Path(args.output or default_output)
+            (output_path if args.cdc_format == 'parquet' else output_path.parent).mkdir(parents=True, exist_ok=True)
+            
+            logger.info(f"Generating {args.count} change event(s)...")
+            written = write_change_stream(stream, args.count, output_path, args.cdc_format)
+            
+            print(f"\n✅ Generated {args.count} change event(s)")
+            for op in ('insert', 'update', 'cancel'):
+                print(f"   {op}: {stream.counts[op]}")
+            print(f"📄 Output: {output_path} ({len(written)} file(s), "
+                  f"{sum(Path(p).stat().st_size for p in written):,} bytes)")
+            
+            if args.profile:
+                profiler.finish(args.profile_json, events=args.count)
+            return
+        
         logger.info(f"Generating {args.count} order(s)...")
         logger.info(f"Items per order: {args.min_items} - {args.max_items}")
         
@@ -578,16 +922,12 @@ def main():
             
             generated_files = []
             for i in range(args.count):
-                order = generator.generate_order(args.min_items, args.max_items)
+                order = generate_orders(generator, 1, args.min_items, args.max_items)[0]
                 
                 filename = f"order_{i+1:04d}_{order['order']['orderNumber']}.json"
                 file_path = output_dir / filename
                 
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    if args.pretty:
-                        json.dump(order, f, indent=2, ensure_ascii=False)
-                    else:
-                        json.dump(order, f, ensure_ascii=False)
+                write_json(order, file_path, args.pretty)
                 
                 generated_files.append(str(file_path))
                 
@@ -604,26 +944,14 @@ def main():
             
         else:
             # Generate single file with all orders
-            if args.count == 1:
-                # Single order
-                order = generator.generate_order(args.min_items, args.max_items)
-                orders_data = order
-            else:
-                # Multiple orders in array
-                orders = []
-                for i in range(args.count):
-                    order = generator.generate_order(args.min_items, args.max_items)
-                    orders.append(order)
-                orders_data = {"orders": orders}
+            orders = generate_orders(generator, args.count, args.min_items, args.max_items)
+            # A single order is written bare, several as {"orders": [...]}
+            orders_data = orders[0] if args.count == 1 else {"orders": orders}
             
             # Write to file
-            output_path = Path(args.output)
+            output_path = Path(args.output or 'test_output/generated_orders.json')
             output_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(output_path, 'w', encoding='utf-8') as f:
-                if args.pretty:
-                    json.dump(orders_data, f, indent=2, ensure_ascii=False)
-                else:
-                    json.dump(orders_data, f, ensure_ascii=False)
+            write_json(orders_data, output_path, args.pretty, records=args.count)
             
             print(f"\n✅ Generated {args.count} order(s)")
             print(f"📄 Output file: {output_path}")
@@ -649,6 +977,9 @@ def main():
         
         logger.info("Order generation completed successfully!")
         
+        if args.profile:
+            profiler.finish(args.profile_json, orders=args.count)
+        
     except KeyboardInterrupt:
         logger.info("Generation interrupted by user")
         sys.exit(130)
@@ -0,0 +1,217 @@
+"""
+Stage Profiler
+Per-stage timing and memory instrumentation shared by json_to_parquet.py and
+order_generator.py. Code marks its stages with `with stage('flatten') as s:`;
+while profiling is disabled (the default) that costs one attribute check.
+When enabled, each stage reports wall time, records and bytes processed,
+throughput and how far it raised the process's peak RSS. Memory tracing
+(tracemalloc peak and top allocators) is a separate opt-in because it slows
+every allocation several-fold; its snapshot cost is kept out of stage times,
+but timings taken with it on are not comparable to plain runs. The run can
+optionally be recorded with cProfile. The summary is plain JSON so CI can
+compare runs.
+"""
+
+import cProfile
+import json
+import logging
+import os
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far, in MiB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024, 1)
+
+
+class StageStats:
+    """Accumulated figures for one named stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.records = 0
+        self.bytes = 0
+        self.rss_peak_growth_mb = 0.0
+        self.process_rss_peak_mb = None
+        self.tracemalloc_peak_mb = 0.0
+        self.top_allocators: List[Dict[str, Any]] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        result = {
+            'calls': self.calls,
+            'seconds': round(self.seconds, 4),
+            'records': self.records,
+            'bytes': self.bytes,
+            'records_per_second': round(self.records / self.seconds, 1) if self.seconds and self.records else None,
+            'mb_per_second': round(self.bytes / 1048576 / self.seconds, 2) if self.seconds and self.bytes else None,
+            # How far this stage raised the process high-water mark, and that mark after its last call
+            'rss_peak_growth_mb': round(self.rss_peak_growth_mb, 1),
+            'process_rss_peak_mb': self.process_rss_peak_mb,
+        }
+        if self.top_allocators:
+            result['tracemalloc_peak_mb'] = round(self.tracemalloc_peak_mb, 2)
+            result['top_allocators'] = self.top_allocators
+        return result
+
+
+# Absorbs counter updates while profiling is disabled
+_DISCARDED = StageStats('disabled')
+
+
+class StageProfiler:
+    """Collects StageStats for a run; see the module docstring."""
+
+    def __init__(self, enabled: bool = False, trace_memory: bool = False,
+                 top_n: int = 5, pstats_path: Optional[str] = None):
+        self.enabled = enabled
+        self.trace_memory = trace_memory and enabled
+        self.top_n = top_n
+        self.pstats_path = pstats_path
+        self.stages: Dict[str, StageStats] = {}
+        self._started = None
+        self._cprofile = None
+        # Seconds spent taking snapshots, subtracted from every stage open meanwhile
+        self._overhead = 0.0
+
+    def start(self) -> None:
+        if not self.enabled:
+            return
+        if self.trace_memory:
+            tracemalloc.start()
+        if self.pstats_path:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str, records: int = 0, nbytes: int = 0) -> Iterator[StageStats]:
+        """
+        Time a block of work as part of the named stage.
+
+        Yields the StageStats so callers can add the records/bytes they
+        processed once they know them (a throwaway object while disabled).
+        """
+        if not self.enabled:
+            yield _DISCARDED
+            return
+
+        stats = self.stages.setdefault(name, StageStats(name))
+        # Allocation snapshots are costly, so only the first call of a stage is diffed
+        snapshot = self.trace_memory and stats.calls == 0
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        before = self._snapshot() if snapshot else None
+        rss_before = peak_rss_mb()
+
+        overhead = self._overhead
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            stats.seconds += time.perf_counter() - started - (self._overhead - overhead)
+            stats.calls += 1
+            stats.records += records
+            stats.bytes += nbytes
+            stats.process_rss_peak_mb = peak_rss_mb()
+            if rss_before is not None:
+                stats.rss_peak_growth_mb += stats.process_rss_peak_mb - rss_before
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1] / 1048576
+                stats.tracemalloc_peak_mb = max(stats.tracemalloc_peak_mb, peak)
+            if snapshot:
+                diff = self._snapshot().compare_to(before, 'lineno')
+                stats.top_allocators = [
+                    {'location': str(d.traceback[0]), 'size_kb': round(d.size_diff / 1024, 1), 'count': d.count_diff}
+                    for d in diff[:self.top_n]
+                ]
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        started = time.perf_counter()
+        snapshot = tracemalloc.take_snapshot()
+        self._overhead += time.perf_counter() - started
+        return snapshot
+
+    def summary(self, **extra: Any) -> Dict[str, Any]:
+        """Return the run summary as a JSON-serialisable dictionary."""
+        total = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            'generated_at': datetime.now().isoformat(),
+            'script': Path(sys.argv[0]).name,
+            'argv': sys.argv[1:],
+            'python': sys.version.split()[0],
+            'pid': os.getpid(),
+            'total_seconds': round(total, 4),
+            'rss_peak_mb': peak_rss_mb(),
+            **extra,
+            'stages': {name: stats.to_dict() for name, stats in self.stages.items()},
+        }
+
+    def finish(self, json_path: Optional[str] = None, **extra: Any) -> Dict[str, Any]:
+        """
+        Stop profiling and report.
+
+        Args:
+            json_path: Write the summary here; print it to stdout if not set
+            extra: Additional top-level fields (e.g. overall record counts)
+
+        Returns:
+            The summary dictionary
+        """
+        if not self.enabled:
+            return {}
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(self.pstats_path)
+            logger.info(f"cProfile stats written to: {self.pstats_path}")
+        summary = self.summary(**extra)
+        if self.trace_memory:
+            tracemalloc.stop()
+
+        text = json.dumps(summary, indent=2, default=str)
+        if json_path:
+            Path(json_path).parent.mkdir(parents=True, exist_ok=True)
+            Path(json_path).write_text(text)
+            logger.info(f"Profile summary written to: {json_path}")
+        else:
+            print(text)
+        return summary
+
+
+# Process-wide profiler; disabled until a CLI calls enable()
+_profiler = StageProfiler()
+
+
+def enable(trace_memory: bool = False, top_n: int = 5, pstats_path: Optional[str] = None) -> StageProfiler:
+    """Turn profiling on for the rest of the process and return the profiler."""
+    global _profiler
+    _profiler = StageProfiler(enabled=True, trace_memory=trace_memory, top_n=top_n, pstats_path=pstats_path)
+    _profiler.start()
+    return _profiler
+
+
+def get_profiler() -> StageProfiler:
+    return _profiler
+
+
+def stage(name: str, records: int = 0, nbytes: int = 0):
+    """Context manager timing a block as part of the named stage on the active profiler."""
+    return _profiler.stage(name, records, nbytes)
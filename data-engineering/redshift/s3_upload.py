@@ -0,0 +1,262 @@
+"""
+S3 Upload Sink
+Uploads finished Parquet files to S3 in the background while conversion
+continues. Large files go through a thread-pooled multipart upload. Every
+request carries a Content-MD5 and a CRC32 checksum, which S3 verifies on
+receipt, and the CRC32 that S3 stores is compared with the local one. S3's
+native checksums work on every encryption mode, whereas ETags are only MD5s
+for unencrypted and SSE-S3 objects. A failed or mismatched part is retried on
+its own; an object whose final checksum does not match is deleted and
+uploaded again. When the conversion feeding the sink fails, abort() drops the
+queued files and aborts the multipart uploads in flight. A custom endpoint
+URL allows testing against moto or MinIO.
+"""
+
+import base64
+import hashlib
+import logging
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import BotoCoreError, ClientError
+
+logger = logging.getLogger(__name__)
+
+MIN_PART_SIZE = 5 * 1024 * 1024  # S3 minimum for all parts but the last
+
+
+class ChecksumMismatchError(IOError):
+    """Raised when S3 reports a different checksum than the bytes sent."""
+
+
+class UploadAbortedError(RuntimeError):
+    """Raised inside an upload that abort() stopped."""
+
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode('ascii')
+
+
+def _crc32(data: bytes) -> bytes:
+    return zlib.crc32(data).to_bytes(4, 'big')
+
+
+def _composite_crc32_matches(reported: Optional[str], part_checksums: List[bytes]) -> bool:
+    """
+    Compare the checksum of a multipart object with its parts.
+
+    S3 reports the CRC32 of the concatenated part CRC32s as '<base64>-<parts>';
+    some S3-compatible stores leave off the part count.
+    """
+    if not reported:
+        return False
+    checksum, _, count = reported.partition('-')
+    return checksum == _b64(_crc32(b''.join(part_checksums))) and count in ('', str(len(part_checksums)))
+
+
+def parse_s3_uri(uri: str) -> Tuple[str, str]:
+    """Split s3://bucket/prefix into (bucket, prefix) with the prefix ending in '/' if set."""
+    if not uri.startswith('s3://'):
+        raise ValueError(f"Not an S3 URI: {uri}")
+    bucket, _, prefix = uri[5:].partition('/')
+    if prefix and not prefix.endswith('/'):
+        prefix += '/'
+    return bucket, prefix
+
+
+class S3UploadSink:
+    """
+    Background uploader for output files.
+
+    submit() returns immediately; files upload on a small file pool while
+    their parts share a bounded part pool, so memory stays around
+    concurrency x part_size.
+    """
+
+    def __init__(
+        self,
+        s3_uri: str,
+        base_dir: Optional[str] = None,
+        part_size: int = 8 * 1024 * 1024,
+        concurrency: int = 4,
+        endpoint_url: Optional[str] = None,
+        max_retries: int = 3
+    ):
+        """
+        Args:
+            s3_uri: Destination as s3://bucket/prefix
+            base_dir: Local directory that keys are made relative to (file name only if unset)
+            part_size: Multipart part size in bytes (at least 5 MiB)
+            concurrency: Parts uploaded in parallel
+            endpoint_url: Custom S3 endpoint, e.g. http://localhost:9000 for MinIO
+            max_retries: Attempts per part, single-request upload and whole multipart upload
+        """
+        self.bucket, self.prefix = parse_s3_uri(s3_uri)
+        self.base_dir = Path(base_dir) if base_dir else None
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.max_retries = max_retries
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            config=Config(max_pool_connections=concurrency + 2, retries={'mode': 'standard'})
+        )
+        self._file_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix='s3-file')
+        self._part_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='s3-part')
+        self._futures: List[Future] = []
+        self._aborted = threading.Event()
+        self._closed = False
+
+    def key_for(self, local_path: str) -> str:
+        path = Path(local_path)
+        if self.base_dir is not None:
+            try:
+                return self.prefix + path.resolve().relative_to(self.base_dir.resolve()).as_posix()
+            except ValueError:
+                pass
+        return self.prefix + path.name
+
+    def submit(self, local_path: str, key: Optional[str] = None) -> Future:
+        """Queue a finished file for upload and return without waiting."""
+        key = key or self.key_for(local_path)
+        logger.info(f"Queued upload: {local_path} -> s3://{self.bucket}/{key}")
+        future = self._file_pool.submit(self._upload_file, str(local_path), key)
+        self._futures.append(future)
+        return future
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        Wait for all queued uploads.
+
+        Returns:
+            One result dictionary per uploaded file
+
+        Raises:
+            The first upload error, after every upload has finished
+        """
+        results, errors = [], []
+        for future in self._futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                errors.append(e)
+        self._file_pool.shutdown()
+        self._part_pool.shutdown()
+        self._closed = True
+        if errors:
+            raise errors[0]
+        return results
+
+    def abort(self) -> None:
+        """
+        Stop after a failed conversion: drop queued files and abort multipart uploads in flight.
+
+        Single-request uploads already running still finish. Does nothing once
+        close() has returned, so it is safe to call from a finally block.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._aborted.set()
+        # Cancelled parts fail their upload, which then aborts its multipart upload
+        self._part_pool.shutdown(wait=False, cancel_futures=True)
+        self._file_pool.shutdown(wait=True, cancel_futures=True)
+        self._part_pool.shutdown(wait=True)
+        logger.warning(f"Aborted uploads to s3://{self.bucket}/{self.prefix}")
+
+    def _retry(self, description: str, fn, *args):
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return fn(*args)
+            except (ClientError, BotoCoreError, ChecksumMismatchError) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = 0.5 * (2 ** (attempt - 1))
+                logger.warning(f"{description} failed (attempt {attempt}/{self.max_retries}): {e}; "
+                               f"retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def _upload_file(self, local_path: str, key: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        size = Path(local_path).stat().st_size
+
+        if size <= self.part_size:
+            with open(local_path, 'rb') as f:
+                body = f.read()
+            self._retry(f"Upload of {key}", self._put_single, key, body)
+            parts = 1
+        else:
+            parts = self._retry(f"Multipart upload of {key}", self._upload_multipart, local_path, key, size)
+
+        elapsed = time.perf_counter() - started
+        logger.info(f"Uploaded s3://{self.bucket}/{key} ({size:,} bytes, {parts} part(s)) in {elapsed:.2f}s")
+        return {'path': local_path, 'key': key, 'bytes': size, 'parts': parts, 'seconds': round(elapsed, 3)}
+
+    def _put_single(self, key: str, body: bytes) -> None:
+        checksum = _b64(_crc32(body))
+        response = self.client.put_object(
+            Bucket=self.bucket, Key=key, Body=body,
+            ContentMD5=_b64(hashlib.md5(body).digest()),
+            ChecksumAlgorithm='CRC32', ChecksumCRC32=checksum
+        )
+        if response.get('ChecksumCRC32') != checksum:
+            raise ChecksumMismatchError(f"CRC32 mismatch for {key}")
+
+    def _upload_multipart(self, local_path: str, key: str, size: int) -> int:
+        upload_id = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, ChecksumAlgorithm='CRC32'
+        )['UploadId']
+        ranges = [(number, offset, min(self.part_size, size - offset))
+                  for number, offset in enumerate(range(0, size, self.part_size), start=1)]
+        try:
+            futures = [
+                self._part_pool.submit(self._retry, f"Part {number} of {key}",
+                                       self._upload_part, local_path, key, upload_id, number, offset, length)
+                for number, offset, length in ranges
+            ]
+            parts = [future.result() for future in futures]
+            if self._aborted.is_set():
+                raise UploadAbortedError(f"Upload of {key} aborted")
+            response = self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id,
+                MultipartUpload={'Parts': [{'PartNumber': n, 'ETag': etag, 'ChecksumCRC32': _b64(crc)}
+                                           for n, etag, crc in parts]}
+            )
+        except Exception:
+            # Only an upload that never completed can (and must) be aborted
+            try:
+                self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+            except (ClientError, BotoCoreError) as e:
+                logger.warning(f"Could not abort multipart upload of {key}: {e}")
+            raise
+
+        reported = response.get('ChecksumCRC32') or self.client.head_object(
+            Bucket=self.bucket, Key=key, ChecksumMode='ENABLED'
+        ).get('ChecksumCRC32')
+        if not _composite_crc32_matches(reported, [crc for _, _, crc in parts]):
+            # The object exists now; remove it so a retry, or the failure, leaves nothing bad behind
+            self.client.delete_object(Bucket=self.bucket, Key=key)
+            raise ChecksumMismatchError(f"Multipart CRC32 mismatch for {key}")
+        return len(parts)
+
+    def _upload_part(self, local_path: str, key: str, upload_id: str,
+                     number: int, offset: int, length: int) -> Tuple[int, str, bytes]:
+        if self._aborted.is_set():
+            raise UploadAbortedError(f"Upload of {key} aborted")
+        with open(local_path, 'rb') as f:
+            f.seek(offset)
+            body = f.read(length)
+        crc = _crc32(body)
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=number, Body=body,
+            ContentMD5=_b64(hashlib.md5(body).digest()),
+            ChecksumAlgorithm='CRC32', ChecksumCRC32=_b64(crc)
+        )
+        if response.get('ChecksumCRC32') != _b64(crc):
+            raise ChecksumMismatchError(f"CRC32 mismatch for part {number} of {key}")
+        return number, response['ETag'], crc
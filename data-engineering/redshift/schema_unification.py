@@ -0,0 +1,157 @@
+"""
+Streaming Schema Unification
+Keeps a running superset Arrow schema across record batches whose columns
+drift (index-suffixed list columns, optional keys such as cardDetails or
+category-specific specifications) and conforms each batch to it by casting
+and filling null arrays. Only the schema is held in memory, never the data.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+from lazy_imports import lazy_module
+
+pa = lazy_module('pyarrow')
+
+
+class SchemaConflictError(TypeError):
+    """Raised when two column types cannot be promoted to a common type."""
+
+
+def _rank(data_type: pa.DataType) -> int:
+    # Numeric promotion ladder: int -> float -> decimal
+    if pa.types.is_integer(data_type):
+        return 1
+    if pa.types.is_floating(data_type):
+        return 2
+    if pa.types.is_decimal(data_type):
+        return 3
+    return 0
+
+
+def unify_types(left: pa.DataType, right: pa.DataType, name: str = '') -> pa.DataType:
+    """
+    Return the narrowest type both inputs can be safely cast to.
+
+    Rules: null promotes to anything; integers widen to int64; int promotes
+    to float64 and float to decimal; struct fields and list elements are
+    unified recursively; any other scalar mix falls back to string.
+
+    Args:
+        left: Type seen so far
+        right: Type of the incoming column
+        name: Column path, used in error messages
+
+    Returns:
+        The unified type
+
+    Raises:
+        SchemaConflictError: If a nested type meets an incompatible type
+    """
+    if left.equals(right):
+        return left
+    if pa.types.is_null(left):
+        return right
+    if pa.types.is_null(right):
+        return left
+
+    if pa.types.is_struct(left) and pa.types.is_struct(right):
+        fields = {f.name: f.type for f in left}
+        for f in right:
+            fields[f.name] = unify_types(fields[f.name], f.type, f"{name}.{f.name}") if f.name in fields else f.type
+        return pa.struct([pa.field(n, t) for n, t in fields.items()])
+
+    if pa.types.is_list(left) and pa.types.is_list(right):
+        return pa.list_(unify_types(left.value_type, right.value_type, f"{name}[]"))
+
+    if pa.types.is_nested(left) or pa.types.is_nested(right):
+        raise SchemaConflictError(f"Cannot unify column '{name}': {left} vs {right}")
+
+    left_rank, right_rank = _rank(left), _rank(right)
+    if left_rank and right_rank:
+        top = max(left_rank, right_rank)
+        if top == 1:
+            return pa.int64()
+        if top == 2:
+            return pa.float64()
+        scale = max(getattr(t, 'scale', 0) for t in (left, right))
+        return pa.decimal128(38, max(scale, 9))
+
+    if pa.types.is_timestamp(left) and pa.types.is_timestamp(right):
+        return pa.timestamp('us', tz=left.tz or right.tz)
+
+    return pa.string()
+
+
+def unify_schemas(left: pa.Schema, right: pa.Schema) -> pa.Schema:
+    """Merge two schemas, keeping the column order of the first one."""
+    fields = {f.name: f.type for f in left}
+    for f in right:
+        fields[f.name] = unify_types(fields[f.name], f.type, f.name) if f.name in fields else f.type
+    return pa.schema([pa.field(n, t) for n, t in fields.items()])
+
+
+def conform_array(array: pa.Array, target: pa.DataType) -> pa.Array:
+    """
+    Cast an array to the target type, adding null children for missing struct fields.
+
+    Args:
+        array: Source array
+        target: Type produced by unify_types
+
+    Returns:
+        Array of the target type with the same length
+    """
+    if array.type.equals(target):
+        return array
+    if pa.types.is_null(array.type):
+        return pa.nulls(len(array), target)
+
+    if pa.types.is_struct(target):
+        children = []
+        for field in target:
+            index = array.type.get_field_index(field.name)
+            if index >= 0:
+                children.append(conform_array(array.field(index), field.type))
+            else:
+                children.append(pa.nulls(len(array), field.type))
+        mask = array.is_null() if array.null_count else None
+        return pa.StructArray.from_arrays(children, fields=list(target), mask=mask)
+
+    if pa.types.is_list(target):
+        values = conform_array(array.values, target.value_type)
+        mask = array.is_null() if array.null_count else None
+        return pa.ListArray.from_arrays(array.offsets, values, type=target, mask=mask)
+
+    return array.cast(target)
+
+
+class SchemaUnifier:
+    """Running superset schema that record batches are conformed to."""
+
+    def __init__(self, schema: Optional[pa.Schema] = None):
+        self.schema = schema if schema is not None else pa.schema([])
+
+    def observe(self, schema: pa.Schema) -> bool:
+        """
+        Fold a new schema into the superset.
+
+        Returns:
+            True if the superset schema changed
+        """
+        unified = unify_schemas(self.schema, schema)
+        changed = not unified.equals(self.schema)
+        self.schema = unified
+        return changed
+
+    def conform(self, batch: pa.RecordBatch) -> pa.RecordBatch:
+        """Reorder, cast and null-fill a batch so it matches the superset schema."""
+        columns = []
+        for field in self.schema:
+            index = batch.schema.get_field_index(field.name)
+            if index >= 0:
+                columns.append(conform_array(batch.column(index), field.type))
+            else:
+                columns.append(pa.nulls(batch.num_rows, field.type))
+        return pa.RecordBatch.from_arrays(columns, schema=self.schema)
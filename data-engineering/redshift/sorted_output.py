@@ -0,0 +1,281 @@
+"""
+Sorted and Indexed Output
+Orders Parquet output by key columns and adds the footer structures that let
+readers skip data: sorting-column metadata, column/offset page indexes and
+Bloom filters on lookup keys. Sorting spills sorted runs to Arrow IPC files
+once a memory budget is exceeded and merges them at the end, so outputs
+larger than memory can still be written in key order.
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from lazy_imports import lazy_module
+
+pa = lazy_module('pyarrow')
+pc = lazy_module('pyarrow.compute')
+ipc = lazy_module('pyarrow.ipc')
+pq = lazy_module('pyarrow.parquet')
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SORT_KEYS = ('orderDate', 'orderId')
+DEFAULT_BLOOM_KEYS = ('orderId', 'customerId')
+MAX_BLOOM_NDV = 1_048_576
+
+
+def _snake_case(name: str) -> str:
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+def resolve_column(names: Sequence[str], key: str) -> Optional[str]:
+    """
+    Find the column that holds a logical key in one output's schema.
+
+    The same key is spelled differently per output (orderId, order_orderId,
+    order_id, customer.customerId), so an exact match wins, then the
+    snake_case spelling, then the shortest column path ending in the key.
+
+    Args:
+        names: Column paths of the output (dotted for nested fields)
+        key: Logical key name, e.g. 'orderId'
+
+    Returns:
+        The matching column path, or None if the output lacks the key
+    """
+    for candidate in (key, _snake_case(key)):
+        if candidate in names:
+            return candidate
+    suffixed = [n for n in names if n.endswith('_' + key) or n.endswith('.' + key)]
+    return min(suffixed, key=len) if suffixed else None
+
+
+def _leaf_paths(schema: pa.Schema) -> List[str]:
+    paths = []
+
+    def visit(prefix: str, data_type: pa.DataType) -> None:
+        if pa.types.is_struct(data_type):
+            for field in data_type:
+                visit(f"{prefix}.{field.name}", field.type)
+        else:
+            paths.append(prefix)
+
+    for field in schema:
+        visit(field.name, field.type)
+    return paths
+
+
+class OutputOptions:
+    """How output files are ordered and indexed."""
+
+    def __init__(
+        self,
+        sort_keys: Sequence[str] = (),
+        bloom_keys: Sequence[str] = (),
+        bloom_fpp: float = 0.05,
+        page_index: bool = False,
+        sort_memory_mb: int = 256,
+        spill_dir: Optional[str] = None
+    ):
+        """
+        Args:
+            sort_keys: Logical keys to sort each output by, in priority order
+            bloom_keys: Logical keys to write Bloom filters for
+            bloom_fpp: Bloom filter false-positive probability
+            page_index: Write column and offset page indexes
+            sort_memory_mb: Memory in MiB buffered before a sorted run is spilled
+            spill_dir: Directory for spilled runs (system temp directory if unset)
+        """
+        self.sort_keys = list(sort_keys)
+        self.bloom_keys = list(bloom_keys)
+        self.bloom_fpp = bloom_fpp
+        self.page_index = page_index
+        self.sort_memory_bytes = sort_memory_mb * 1024 * 1024
+        self.spill_dir = spill_dir
+
+    def sort_columns(self, schema: pa.Schema) -> List[str]:
+        """Top-level columns to sort this output by (keys it lacks are skipped)."""
+        columns = [resolve_column(schema.names, key) for key in self.sort_keys]
+        return [c for c in columns if c is not None]
+
+    def writer_kwargs(self, schema: pa.Schema, rows_per_row_group: int) -> Dict[str, Any]:
+        """
+        Extra pq.ParquetWriter / pq.write_table arguments for this output.
+
+        Args:
+            schema: Schema of the output
+            rows_per_row_group: Expected rows per row group, used as the Bloom filter NDV
+
+        Returns:
+            Keyword arguments (empty when no sorting or indexing is configured)
+        """
+        kwargs: Dict[str, Any] = {}
+        if self.page_index:
+            kwargs['write_page_index'] = True
+
+        sort_columns = self.sort_columns(schema)
+        if sort_columns:
+            kwargs['sorting_columns'] = pq.SortingColumn.from_ordering(
+                schema, [(c, 'ascending') for c in sort_columns], null_placement='at_end'
+            )
+
+        leaves = _leaf_paths(schema)
+        bloom_columns = [resolve_column(leaves, key) for key in self.bloom_keys]
+        ndv = max(1, min(rows_per_row_group, MAX_BLOOM_NDV))
+        bloom = {c: {'ndv': ndv, 'fpp': self.bloom_fpp} for c in bloom_columns if c is not None}
+        if bloom:
+            kwargs['bloom_filter_options'] = bloom
+        return kwargs
+
+    def sort_table(self, table: pa.Table) -> pa.Table:
+        """Sort a table that fits in memory by this output's sort columns."""
+        columns = self.sort_columns(table.schema)
+        if not columns:
+            return table
+        return table.sort_by([(c, 'ascending') for c in columns])
+
+
+def _key_order(value: Any) -> Tuple[bool, Any]:
+    # Nulls sort last, matching sort_by's default null placement
+    return (value is None, value)
+
+
+def _at_or_below(table: pa.Table, columns: List[str], bound: Tuple[Any, ...]) -> pa.Array:
+    """Mask of rows whose sort key is <= bound, with nulls ordered last."""
+    result = None
+    # Build the lexicographic comparison from the last key outwards
+    for column, value in reversed(list(zip(columns, bound))):
+        array = table.column(column)
+        if value is None:
+            less = pc.is_valid(array)
+            equal = pc.is_null(array)
+        else:
+            scalar = pa.scalar(value, type=array.type)
+            less = pc.fill_null(pc.less(array, scalar), False)
+            equal = pc.fill_null(pc.equal(array, scalar), False)
+        tail = equal if result is None else pc.and_(equal, result)
+        result = pc.or_(less, tail)
+    return result
+
+
+class _RunCursor:
+    """Reads one spilled run a chunk at a time."""
+
+    def __init__(self, path: Path, conform: Callable[[pa.Table], pa.Table]):
+        self._reader = ipc.open_file(path)
+        self._conform = conform
+        self._next = 0
+        self.current: Optional[pa.Table] = None
+        self.advance()
+
+    def advance(self) -> None:
+        self.current = None
+        while self.current is None and self._next < self._reader.num_record_batches:
+            batch = self._reader.get_batch(self._next)
+            self._next += 1
+            if batch.num_rows:
+                self.current = self._conform(pa.Table.from_batches([batch]))
+
+    def last_key(self, columns: List[str]) -> Tuple[Any, ...]:
+        return tuple(self.current.column(c)[-1].as_py() for c in columns)
+
+
+class ExternalSorter:
+    """
+    Sort an unbounded stream of tables by key columns with bounded memory.
+
+    Tables are buffered until the memory budget is reached, then sorted and
+    spilled as a run. sorted_tables() merges the runs: each round takes,
+    from every run, the rows up to the smallest "last key" among the runs'
+    current chunks, sorts that slice and emits it.
+    """
+
+    def __init__(self, options: OutputOptions, conform: Callable[[pa.Table], pa.Table],
+                 chunk_rows: int = 65536):
+        """
+        Args:
+            options: Sort keys, memory budget and spill directory
+            conform: Casts a table to the output's current superset schema
+            chunk_rows: Rows per spilled batch and per emitted table
+        """
+        self.options = options
+        self.conform = conform
+        self.chunk_rows = chunk_rows
+        self.num_rows = 0
+        self.nbytes = 0
+        self._buffer: List[pa.Table] = []
+        self._buffered_bytes = 0
+        self._runs: List[Path] = []
+        self._spill_dir: Optional[str] = None
+
+    def add(self, table: pa.Table) -> None:
+        self._buffer.append(table)
+        self._buffered_bytes += table.nbytes
+        self.nbytes += table.nbytes
+        self.num_rows += table.num_rows
+        if self._buffered_bytes >= self.options.sort_memory_bytes:
+            self._spill()
+
+    def _sorted_buffer(self) -> pa.Table:
+        table = pa.concat_tables([self.conform(t) for t in self._buffer])
+        self._buffer = []
+        self._buffered_bytes = 0
+        return self.options.sort_table(table)
+
+    def _spill(self) -> None:
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='sort-runs-', dir=self.options.spill_dir)
+        table = self._sorted_buffer()
+        path = Path(self._spill_dir) / f"run-{len(self._runs):05d}.arrow"
+        with ipc.new_file(path, table.schema) as writer:
+            for batch in table.to_batches(max_chunksize=self.chunk_rows):
+                writer.write_batch(batch)
+        self._runs.append(path)
+        logger.debug(f"Spilled sorted run of {table.num_rows} rows to {path}")
+
+    def sorted_tables(self) -> Iterator[pa.Table]:
+        """Yield the whole stream in key order, in tables of about chunk_rows rows."""
+        try:
+            if not self._runs:
+                if self._buffer:
+                    table = self._sorted_buffer()
+                    for offset in range(0, table.num_rows, self.chunk_rows):
+                        yield table.slice(offset, self.chunk_rows)
+                return
+
+            if self._buffer:
+                self._spill()
+            logger.info(f"Merging {len(self._runs)} sorted run(s) of {self.num_rows} rows")
+            cursors = [_RunCursor(path, self.conform) for path in self._runs]
+            while True:
+                active = [c for c in cursors if c.current is not None]
+                if not active:
+                    break
+                columns = self.options.sort_columns(active[0].current.schema)
+                bound = min((c.last_key(columns) for c in active),
+                            key=lambda key: tuple(map(_key_order, key)))
+
+                pieces = []
+                for cursor in active:
+                    # Each chunk is sorted, so the rows at or below the bound are a prefix
+                    taken = pc.sum(_at_or_below(cursor.current, columns, bound)).as_py() or 0
+                    if taken:
+                        pieces.append(cursor.current.slice(0, taken))
+                    if taken == cursor.current.num_rows:
+                        cursor.advance()
+                    else:
+                        cursor.current = cursor.current.slice(taken)
+                yield self.options.sort_table(pa.concat_tables(pieces))
+        finally:
+            self.cleanup()
+
+    def cleanup(self) -> None:
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
@@ -0,0 +1,289 @@
+"""
+Pre-load Validation
+Checks business invariants on each batch of orders with pyarrow.compute
+before anything is written, so a bad batch is caught during conversion
+instead of after a Redshift COPY + UPSERT. Only the fields the checks need
+are projected into Arrow; orders that break an invariant are left out of the
+Parquet output and written to an NDJSON quarantine file with their reasons.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from lazy_imports import lazy_module
+from profiling import stage
+
+np = lazy_module('numpy')
+pa = lazy_module('pyarrow')
+pc = lazy_module('pyarrow.compute')
+
+logger = logging.getLogger(__name__)
+
+# Enumerations produced by order_generator.OrderGenerator and its change stream
+ORDER_STATUSES = ["pending", "confirmed", "processing", "shipped", "delivered", "completed", "cancelled"]
+PAYMENT_STATUSES = ["pending", "completed", "failed", "refunded", "voided"]
+FULFILLMENT_STATUSES = ["pending", "processing", "packed", "shipped", "delivered", "cancelled"]
+
+_TRANSACTION = ('payment', 'transactionDetails')
+
+# Projected column -> (path inside the order, numeric)
+ORDER_FIELDS = {
+    'orderId': (('orderId',), False),
+    'customerId': (('customer', 'customerId'), False),
+    'status': (('status',), False),
+    'payment_status': (('payment', 'status'), False),
+    'fulfillment_status': (('fulfillment', 'fulfillmentStatus'), False),
+    'totalAmount': (('totalAmount',), True),
+    'subtotal': (_TRANSACTION + ('subtotal',), True),
+    'salesTax': (_TRANSACTION + ('taxes', 'salesTax'), True),
+    'stateTax': (_TRANSACTION + ('taxes', 'stateTax'), True),
+    'localTax': (_TRANSACTION + ('taxes', 'localTax'), True),
+    'totalTax': (_TRANSACTION + ('taxes', 'totalTax'), True),
+    'shippingCost': (_TRANSACTION + ('shipping', 'cost'), True),
+    'totalFees': (_TRANSACTION + ('fees', 'totalFees'), True),
+    'shippingDiscount': (_TRANSACTION + ('discounts', 'shippingDiscount'), True),
+    'finalTotal': (_TRANSACTION + ('finalTotal',), True),
+}
+
+ITEM_FIELDS = {
+    'itemId': (('itemId',), False),
+    'unitPrice': (('pricing', 'unitPrice'), True),
+    'quantity': (('pricing', 'quantity'), True),
+    'discountAmount': (('pricing', 'discount', 'amount'), True),
+    'subtotal': (('pricing', 'subtotal'), True),
+}
+
+
+def _dig(obj: Any, path: Tuple[str, ...]) -> Any:
+    for key in path:
+        if not isinstance(obj, dict):
+            return None
+        obj = obj.get(key)
+    return obj
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        # NaN fails every tolerance comparison, so the row is reported
+        return float('nan')
+
+
+def _column(values: List[Any], numeric: bool) -> pa.Array:
+    if numeric:
+        try:
+            return pa.array(values, pa.float64())
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.array([_as_float(v) for v in values], pa.float64())
+    try:
+        return pa.array(values, pa.string())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.array([None if v is None else str(v) for v in values], pa.string())
+
+
+def project_orders(orders: List[Dict[str, Any]]) -> Tuple[pa.RecordBatch, pa.RecordBatch]:
+    """
+    Project the fields the checks need into an order batch and an item batch.
+
+    Args:
+        orders: Orders as loaded from JSON (wrapped in {"order": ...} or bare)
+
+    Returns:
+        (orders batch, items batch); items carry the index of their order
+    """
+    bodies = [order.get('order', order) for order in orders]
+    order_batch = pa.RecordBatch.from_pydict({
+        name: _column([_dig(body, path) for body in bodies], numeric)
+        for name, (path, numeric) in ORDER_FIELDS.items()
+    })
+
+    owners, items = [], []
+    for index, body in enumerate(bodies):
+        for item in body.get('items') or []:
+            owners.append(index)
+            items.append(item)
+    item_columns = {'order_index': pa.array(owners, pa.int64())}
+    item_columns.update({
+        name: _column([_dig(item, path) for item in items], numeric)
+        for name, (path, numeric) in ITEM_FIELDS.items()
+    })
+    return order_batch, pa.RecordBatch.from_pydict(item_columns)
+
+
+def _mismatch(actual: pa.Array, expected: pa.Array, tolerance: float) -> pa.Array:
+    # Null inputs are not judged here; NaN (non-numeric input) always mismatches
+    within = pc.less_equal(pc.abs(pc.subtract(actual, expected)), tolerance)
+    return pc.fill_null(pc.invert(within), False)
+
+
+def _missing(column: pa.Array) -> pa.Array:
+    return pc.or_kleene(pc.is_null(column), pc.equal(column, ''))
+
+
+def _not_in(column: pa.Array, allowed: List[str]) -> pa.Array:
+    # Optional sections may be absent; only values that are present are checked
+    return pc.and_(pc.is_valid(column), pc.invert(pc.is_in(column, value_set=pa.array(allowed))))
+
+
+class OrderValidator:
+    """
+    Validates batches of orders and quarantines the ones that fail.
+
+    Order ids are remembered across batches so uniqueness holds for the
+    whole run; the first occurrence of an id is kept. Change events carry
+    many images of one order, so for them the id is unique per changeSeq.
+    """
+
+    def __init__(self, quarantine_path: Optional[str] = None, tolerance: float = 0.05, append: bool = False):
+        """
+        Args:
+            quarantine_path: NDJSON file for rejected orders (created on first rejection)
+            tolerance: Absolute difference allowed when comparing money amounts
+            append: Add to an existing quarantine file instead of replacing it (long-running services)
+        """
+        self.quarantine_path = Path(quarantine_path) if quarantine_path else None
+        self.tolerance = tolerance
+        self.append = append
+        self.checked = 0
+        self.quarantined = 0
+        self.violations = Counter()
+        self._seen_ids = set()
+        self._quarantine = None
+
+    def order_checks(self, batch: pa.RecordBatch) -> Dict[str, pa.Array]:
+        """Boolean violation masks over the order batch, one per check."""
+        tol = self.tolerance
+        col = batch.column
+        tax_sum = pc.add(pc.add(col('salesTax'), col('stateTax')), col('localTax'))
+        expected_final = pc.subtract(
+            pc.add(pc.add(pc.add(col('subtotal'), col('totalTax')), col('shippingCost')), col('totalFees')),
+            pc.fill_null(col('shippingDiscount'), 0.0)
+        )
+        return {
+            'missing_order_id': _missing(col('orderId')),
+            'missing_customer_id': _missing(col('customerId')),
+            'invalid_status': _not_in(col('status'), ORDER_STATUSES),
+            'invalid_payment_status': _not_in(col('payment_status'), PAYMENT_STATUSES),
+            'invalid_fulfillment_status': _not_in(col('fulfillment_status'), FULFILLMENT_STATUSES),
+            'total_tax_mismatch': _mismatch(col('totalTax'), tax_sum, tol),
+            'final_total_mismatch': _mismatch(col('finalTotal'), expected_final, tol),
+            'total_amount_mismatch': _mismatch(col('totalAmount'), col('finalTotal'), tol),
+        }
+
+    def item_checks(self, items: pa.RecordBatch) -> Dict[str, pa.Array]:
+        """Boolean violation masks over the item batch, one per check."""
+        col = items.column
+        expected = pc.subtract(pc.multiply(col('unitPrice'), col('quantity')),
+                               pc.fill_null(col('discountAmount'), 0.0))
+        return {
+            'missing_item_id': _missing(col('itemId')),
+            'item_subtotal_mismatch': _mismatch(col('subtotal'), expected, self.tolerance),
+        }
+
+    def items_total_check(self, batch: pa.RecordBatch, items: pa.RecordBatch) -> pa.Array:
+        """Violation mask for orders whose payment subtotal differs from the sum of item subtotals."""
+        sums = np.zeros(batch.num_rows)
+        if items.num_rows:
+            grouped = pa.table(items).group_by('order_index').aggregate([('subtotal', 'sum')])
+            sums[grouped['order_index'].to_numpy()] = grouped['subtotal_sum'].to_numpy(zero_copy_only=False)
+        return _mismatch(batch.column('subtotal'), pa.array(sums), self.tolerance)
+
+    def check(self, orders: List[Dict[str, Any]]) -> Dict[int, List[str]]:
+        """
+        Run every check on a batch of orders.
+
+        Args:
+            orders: Orders in the batch
+
+        Returns:
+            Mapping of order index to the names of the checks it failed
+        """
+        batch, items = project_orders(orders)
+        reasons: Dict[int, List[str]] = {}
+
+        masks = self.order_checks(batch)
+        masks['items_subtotal_mismatch'] = self.items_total_check(batch, items)
+        for name, mask in masks.items():
+            for index in pc.indices_nonzero(mask).to_pylist():
+                reasons.setdefault(index, []).append(name)
+
+        owners = items.column('order_index')
+        for name, mask in self.item_checks(items).items():
+            for index in pc.unique(pc.filter(owners, mask)).to_pylist():
+                reasons.setdefault(index, []).append(name)
+
+        # Uniqueness has to span batches, so it uses a set rather than a per-batch kernel
+        for index, order_id in enumerate(batch.column('orderId').to_pylist()):
+            if order_id is None:
+                continue
+            change_seq = orders[index].get('changeSeq')
+            key = order_id if change_seq is None else (order_id, change_seq)
+            if key in self._seen_ids:
+                reasons.setdefault(index, []).append('duplicate_order_id')
+            else:
+                self._seen_ids.add(key)
+
+        return reasons
+
+    def validate(self, orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Check a batch, quarantine the failing orders and return the rest.
+
+        Args:
+            orders: Orders in the batch
+
+        Returns:
+            Orders that passed every check, in their original order
+        """
+        with stage('validation', records=len(orders)):
+            reasons = self.check(orders)
+            self.checked += len(orders)
+            if not reasons:
+                return orders
+
+            for index in sorted(reasons):
+                self.violations.update(reasons[index])
+                self._write_quarantine(orders[index], reasons[index])
+            self.quarantined += len(reasons)
+            return [order for index, order in enumerate(orders) if index not in reasons]
+
+    def _write_quarantine(self, order: Dict[str, Any], reasons: List[str]) -> None:
+        if self.quarantine_path is None:
+            return
+        if self._quarantine is None:
+            self.quarantine_path.parent.mkdir(parents=True, exist_ok=True)
+            self._quarantine = open(self.quarantine_path, 'a' if self.append else 'w', encoding='utf-8')
+        self._quarantine.write(json.dumps({'violations': reasons, 'order': order}, ensure_ascii=False) + '\n')
+
+    def flush(self) -> None:
+        """Make the rejections written so far durable, e.g. before their inputs are marked processed."""
+        if self._quarantine is not None:
+            self._quarantine.flush()
+            os.fsync(self._quarantine.fileno())
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Close the quarantine file.
+
+        Returns:
+            Summary with checked/quarantined counts and violations per check
+        """
+        if self._quarantine is not None:
+            self._quarantine.close()
+            self._quarantine = None
+            logger.warning(f"Quarantined {self.quarantined} order(s) to: {self.quarantine_path}")
+        return {
+            'checked': self.checked,
+            'quarantined': self.quarantined,
+            'violations': dict(self.violations),
+            'quarantine_file': str(self.quarantine_path) if self.quarantined and self.quarantine_path else None,
+        }
@@ -0,0 +1,418 @@
+"""
+Watch Mode
+Continuous micro-batch conversion behind `json_to_parquet.py --watch DIR`.
+New JSON/NDJSON files are picked up through inotify when the optional
+inotify_simple package is available (polling otherwise), buffered into
+batches and appended to Parquet writers that stay open, so the interpreter,
+the unified schemas and the writers are reused instead of being rebuilt per
+file. Output is rolled when a part reaches a size or a window reaches an age.
+
+Parts are written under hidden in-progress names and published together at
+each checkpoint; only then are their inputs recorded as processed in a state
+file next to the output. A crash therefore neither loses nor duplicates
+input: unpublished parts are removed on restart and their inputs converted
+again.
+
+With --validate, rejected orders are appended to the quarantine file, which
+is synced before each checkpoint, so restarts never truncate rejections of
+windows already marked processed. Inputs converted again after a crash may
+add their rejections a second time. The set of order ids used for duplicate
+detection lives in memory only: after a restart, an id seen before the
+restart is not recognised as a duplicate.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from json_to_parquet import INPUT_SUFFIXES, UnifiedPartWriter, build_output_tables, load_orders
+from sorted_output import OutputOptions
+from validation import OrderValidator
+
+try:
+    import inotify_simple
+except ImportError:  # optional, Linux only
+    inotify_simple = None
+
+logger = logging.getLogger(__name__)
+
+STATE_NAME = '_watch_state.json'
+IN_PROGRESS_PREFIX = '.inprogress-'
+
+
+def list_inputs(directory: Path) -> List[Path]:
+    """Input files in a directory; hidden and underscore-prefixed names are still being written."""
+    return sorted(p for p in directory.iterdir()
+                  if p.suffix.lower() in INPUT_SUFFIXES and not p.name.startswith(('.', '_')) and p.is_file())
+
+
+def settled(paths: List[Path], settle_seconds: float) -> List[Path]:
+    """The paths that still exist and have not been modified for settle_seconds."""
+    now = time.time()
+    ready = []
+    for path in paths:
+        try:
+            if now - path.stat().st_mtime >= settle_seconds:
+                ready.append(path)
+        except FileNotFoundError:
+            continue
+    return ready
+
+
+def _signature(path: Path) -> Optional[List[int]]:
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class PollingWatcher:
+    """Lists the directory every interval; a file is ready once it has settled."""
+
+    def __init__(self, directory: Path, interval: float = 1.0, settle_seconds: float = 1.0):
+        self.directory = directory
+        self.interval = interval
+        self.settle_seconds = settle_seconds
+
+    def ready_files(self, timeout: float) -> List[Path]:
+        time.sleep(max(0.0, min(timeout, self.interval)))
+        return settled(list_inputs(self.directory), self.settle_seconds)
+
+    def close(self) -> None:
+        pass
+
+
+class InotifyWatcher:
+    """Reports files as soon as they are closed after writing or moved into the directory."""
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._inotify = inotify_simple.INotify()
+        flags = inotify_simple.flags
+        self._inotify.add_watch(str(directory), flags.CLOSE_WRITE | flags.MOVED_TO)
+
+    def ready_files(self, timeout: float) -> List[Path]:
+        events = self._inotify.read(timeout=int(timeout * 1000))
+        paths = {self.directory / event.name for event in events if event.name}
+        return sorted(p for p in paths if p.suffix.lower() in INPUT_SUFFIXES and not p.name.startswith(('.', '_')))
+
+    def close(self) -> None:
+        self._inotify.close()
+
+
+class WatchConverter:
+    """
+    Converts files arriving in a directory into rolling Parquet parts.
+
+    Orders from new files are buffered until batch_size is reached and then
+    written to one UnifiedPartWriter per output. A checkpoint closes every
+    open part and publishes them together once the largest part reaches
+    roll_mb or the window is roll_seconds old (checked between files), and on
+    shutdown. With sort keys, each published part is sorted on its own.
+    """
+
+    def __init__(
+        self,
+        watch_dir: str,
+        output_dir: str,
+        compression: str = 'snappy',
+        layout: str = 'flattened',
+        batch_size: int = 1000,
+        max_rows_per_file: int = 1_000_000,
+        roll_mb: float = 128,
+        roll_seconds: float = 30.0,
+        poll_interval: float = 1.0,
+        settle_seconds: float = 1.0,
+        use_inotify: bool = True,
+        validator: Optional[OrderValidator] = None,
+        output_options: Optional[OutputOptions] = None,
+        on_file_written: Optional[Callable[[str], Any]] = None
+    ):
+        """
+        Args:
+            watch_dir: Directory to watch for *.json, *.ndjson and *.jsonl files
+            output_dir: Directory to write <output>/part-<window>-NNNNN.parquet into
+            compression: Compression algorithm to use
+            layout: 'flattened' or 'nested'
+            batch_size: Orders per record batch
+            max_rows_per_file: Rows after which a part is rolled within a window
+            roll_mb: Part size that triggers a checkpoint
+            roll_seconds: Window age that triggers a checkpoint
+            poll_interval: Seconds between directory listings when polling
+            settle_seconds: Polling only picks up files unmodified for this long
+            use_inotify: Use inotify when inotify_simple is installed
+            validator: Checks each batch and quarantines failing orders before they are written
+            output_options: Sort keys, page indexes and Bloom filters
+            on_file_written: Called with each part path once it is published (e.g. S3UploadSink.submit)
+        """
+        self.watch_dir = Path(watch_dir)
+        self.output_dir = Path(output_dir)
+        self.compression = compression
+        self.layout = layout
+        self.batch_size = batch_size
+        self.max_rows_per_file = max_rows_per_file
+        self.roll_bytes = roll_mb * 1024 * 1024
+        self.roll_seconds = roll_seconds
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.use_inotify = use_inotify
+        self.validator = validator
+        self.output_options = output_options
+        self.on_file_written = on_file_written
+
+        self.writers: Dict[str, UnifiedPartWriter] = {}
+        self.state = self._read_state()
+        self.published: List[str] = []
+        self.files_ingested = 0
+        self.orders_ingested = 0
+        self.checkpoints = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._window_files: Dict[str, List[int]] = {}
+        self._window_orders = 0
+        self._window_started: Optional[float] = None
+        self._window_id = ''
+        self._warned = set()
+        self._stopping = False
+
+    def _read_state(self) -> Dict[str, Any]:
+        path = self.output_dir / STATE_NAME
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {'version': 1, 'processed': {}, 'failed': {}, 'pending': None}
+
+    def _write_state(self) -> None:
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.state['updated_at'] = datetime.now().isoformat()
+        tmp = self.output_dir / f"{STATE_NAME}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.output_dir / STATE_NAME)
+
+    def recover(self) -> None:
+        """Finish publishing an interrupted checkpoint and drop parts of an unfinished window."""
+        pending = self.state.get('pending')
+        if pending:
+            for staged, final in pending['moves']:
+                if (self.output_dir / staged).exists():
+                    os.replace(self.output_dir / staged, self.output_dir / final)
+            self.state['processed'].update(pending['processed'])
+            self.state['pending'] = None
+            self._write_state()
+            logger.info(f"Finished publishing {len(pending['moves'])} part(s) of an interrupted checkpoint")
+
+        if self.output_dir.exists():
+            for leftover in self.output_dir.rglob(f"{IN_PROGRESS_PREFIX}*"):
+                leftover.unlink()
+                logger.warning(f"Removed unpublished part of an interrupted run: {leftover}")
+
+    def _make_watcher(self):
+        if self.use_inotify and inotify_simple is not None:
+            try:
+                watcher = InotifyWatcher(self.watch_dir)
+                logger.info(f"Watching {self.watch_dir} with inotify")
+                return watcher
+            except OSError as e:
+                logger.warning(f"inotify unavailable ({e}); polling instead")
+        elif self.use_inotify:
+            logger.info("inotify_simple is not installed; polling instead")
+        logger.info(f"Polling {self.watch_dir} every {self.poll_interval}s")
+        return PollingWatcher(self.watch_dir, self.poll_interval, self.settle_seconds)
+
+    def stop(self, *_: Any) -> None:
+        """Ask run() to publish the current window and return (also the SIGTERM handler)."""
+        self._stopping = True
+
+    def run(self, idle_timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Convert files as they arrive until stopped (SIGTERM, Ctrl+C or stop()).
+
+        Args:
+            idle_timeout: Also stop after this many seconds without new files
+
+        Returns:
+            Summary with files, orders, checkpoints and published part paths
+        """
+        self.recover()
+        watcher = self._make_watcher()
+        previous_handler = None
+        if threading.current_thread() is threading.main_thread():
+            previous_handler = signal.signal(signal.SIGTERM, self.stop)
+
+        try:
+            # Files that arrived while no watcher was running; inotify may have missed
+            # their writes, so the ones still settling are re-checked until they settle
+            backlog = self._new_files(list_inputs(self.watch_dir))
+            last_activity = time.monotonic()
+            while not self._stopping:
+                ready = settled(backlog, self.settle_seconds)
+                backlog = [p for p in backlog if p not in ready and p.exists()]
+                if not ready:
+                    ready = watcher.ready_files(self._wait_seconds())
+                ready = self._new_files(ready)
+                if ready:
+                    self._ingest(ready)
+                    last_activity = time.monotonic()
+                if self._window_due():
+                    self.checkpoint()
+                elif idle_timeout is not None and time.monotonic() - last_activity >= idle_timeout:
+                    logger.info(f"No new files for {idle_timeout}s, stopping")
+                    break
+        except KeyboardInterrupt:
+            logger.info("Watch interrupted by user")
+        finally:
+            watcher.close()
+            if previous_handler is not None:
+                signal.signal(signal.SIGTERM, previous_handler)
+
+        self.checkpoint()
+        return self.summary()
+
+    def _wait_seconds(self) -> float:
+        wait = self.poll_interval
+        if self._window_started is not None:
+            remaining = self.roll_seconds - (time.monotonic() - self._window_started)
+            wait = min(wait, remaining)
+        return max(wait, 0.05)
+
+    def _new_files(self, paths: List[Path]) -> List[Path]:
+        new = []
+        for path in paths:
+            name = path.name
+            if name in self._window_files:
+                continue
+            processed = self.state['processed'].get(name)
+            if processed is None:
+                # New, or rejected earlier and rewritten since
+                if self.state['failed'].get(name) != _signature(path):
+                    new.append(path)
+            elif processed != _signature(path) and name not in self._warned:
+                # Inputs are treated as immutable; converting a rewritten file again could duplicate rows
+                self._warned.add(name)
+                logger.warning(f"Ignoring {name}: it changed after it was converted")
+        return new
+
+    def _ingest(self, paths: List[Path]) -> None:
+        for path in paths:
+            signature = _signature(path)
+            if signature is None:
+                continue
+            try:
+                orders = load_orders(str(path))
+            except (OSError, ValueError) as e:
+                logger.error(f"Skipping unreadable input {path.name}: {e}")
+                self.state['failed'][path.name] = signature
+                self._write_state()
+                continue
+
+            if self._window_started is None:
+                self._window_started = time.monotonic()
+                self._window_id = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%f')
+            self._window_files[path.name] = signature
+            self._window_orders += len(orders)
+            self._buffer.extend(orders)
+            if len(self._buffer) >= self.batch_size:
+                full = len(self._buffer) - len(self._buffer) % self.batch_size
+                for start in range(0, full, self.batch_size):
+                    self._write(self._buffer[start:start + self.batch_size])
+                del self._buffer[:full]
+            logger.debug(f"Ingested {path.name}: {len(orders)} order(s)")
+
+            # Checkpoints fall between files, so an input is never split across windows
+            if self._window_due():
+                self.checkpoint()
+
+    def _write(self, orders: List[Dict[str, Any]]) -> None:
+        if self.validator is not None:
+            orders = self.validator.validate(orders)
+        for name, table in build_output_tables(orders, self.layout).items():
+            if name not in self.writers:
+                self.writers[name] = UnifiedPartWriter(self.output_dir, name, self.compression,
+                                                       self.max_rows_per_file, output_options=self.output_options)
+            writer = self.writers[name]
+            writer.part_name = f"{IN_PROGRESS_PREFIX}{self._window_id}-{{index:05d}}.parquet"
+            writer.write(table)
+
+    def _window_due(self) -> bool:
+        if self._window_started is None:
+            return False
+        if time.monotonic() - self._window_started >= self.roll_seconds:
+            return True
+        return max((w.open_bytes for w in self.writers.values()), default=0) >= self.roll_bytes
+
+    def checkpoint(self) -> List[str]:
+        """
+        Close the open parts, publish them and record their inputs as processed.
+
+        Returns:
+            Paths of the parts published by this checkpoint
+        """
+        if not self._window_files:
+            return []
+        if self._buffer:
+            self._write(self._buffer)
+            self._buffer = []
+
+        moves = []
+        for writer in self.writers.values():
+            for path in map(Path, writer.close()):
+                final = path.with_name('part-' + path.name[len(IN_PROGRESS_PREFIX):])
+                moves.append([path.relative_to(self.output_dir).as_posix(),
+                              final.relative_to(self.output_dir).as_posix()])
+            writer.paths = []
+
+        if self.validator is not None:
+            self.validator.flush()
+
+        # Journal the renames first so a crash half-way through can be completed by recover()
+        self.state['pending'] = {'moves': moves, 'processed': self._window_files}
+        self._write_state()
+        for staged, final in moves:
+            os.replace(self.output_dir / staged, self.output_dir / final)
+        self.state['processed'].update(self._window_files)
+        self.state['pending'] = None
+        self._prune_state()
+        self._write_state()
+
+        published = [str(self.output_dir / final) for _, final in moves]
+        if self.on_file_written:
+            for path in published:
+                self.on_file_written(path)
+
+        age = time.monotonic() - self._window_started
+        logger.info(f"Checkpoint {self._window_id}: {len(self._window_files)} file(s), "
+                    f"{self._window_orders} order(s) -> {len(published)} part(s) after {age:.1f}s")
+        self.published.extend(published)
+        self.files_ingested += len(self._window_files)
+        self.orders_ingested += self._window_orders
+        self.checkpoints += 1
+        self._window_files = {}
+        self._window_orders = 0
+        self._window_started = None
+        return published
+
+    def _prune_state(self) -> None:
+        # Forget inputs that have been removed, so the state stays as small as the directory
+        present = {p.name for p in list_inputs(self.watch_dir)}
+        for key in ('processed', 'failed'):
+            self.state[key] = {name: sig for name, sig in self.state[key].items() if name in present}
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'files': self.files_ingested,
+            'failed_files': len(self.state['failed']),
+            'orders': self.orders_ingested,
+            'checkpoints': self.checkpoints,
+            'parts': list(self.published),
+        }
@@ -1,38 +1,151 @@
-import boto3
+import time
+_INIT_STARTED = time.perf_counter()
 
-def lambda_handler(event, context):
-    region = 'ap-south-1' 
-    ec2 = boto3.client('ec2', region_name=region)
+import os
+import random
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from cleanup_metrics import RegionClients, log, measure_cold_start, start_run
+
+# Instances in these states can't (or no longer need to) have protection removed
+ACTIVE_STATES = ['pending', 'running', 'stopping', 'stopped']
+
+DEFAULT_REGION = 'ap-south-1'
+
+MAX_WORKERS = int(os.getenv('MAX_WORKERS', '16'))
+REGION_WORKERS = int(os.getenv('REGION_WORKERS', '8'))
+MAX_ATTEMPTS = int(os.getenv('MAX_ATTEMPTS', '8'))
+BASE_DELAY = 0.2   # seconds
+MAX_DELAY = 10.0   # seconds
+
+# Adaptive mode rate-limits the shared client once EC2 starts throttling
+EC2_CONFIG = Config(
+    retries={'max_attempts': 3, 'mode': 'adaptive'},
+    max_pool_connections=MAX_WORKERS,
+    tcp_keepalive=True
+)
+
+
+def resolve_regions(event):
+    # Regions come from the event, then the REGIONS env var, else DEFAULT_REGION only.
+    # Every enabled region is targeted only when asked for explicitly with "all".
+    regions = (event or {}).get('regions') or os.getenv('REGIONS', '')
+    if isinstance(regions, str):
+        regions = [r.strip() for r in regions.split(',') if r.strip()]
+    if [r.lower() for r in regions] == ['all']:
+        ec2 = _clients.get(os.getenv('AWS_REGION', DEFAULT_REGION))
+        return sorted(r['RegionName'] for r in ec2.describe_regions()['Regions'])
+    return regions or [DEFAULT_REGION]
 
+
+_clients = RegionClients('ec2', EC2_CONFIG)
+
+
+def call_with_backoff(fn, **kwargs):
+    # Retry EC2 throttling with exponential backoff and full jitter
+    for attempt in range(MAX_ATTEMPTS):
+        try:
+            return fn(**kwargs)
+        except ClientError as e:
+            code = e.response.get('Error', {}).get('Code')
+            if code not in ('RequestLimitExceeded', 'Throttling') or attempt == MAX_ATTEMPTS - 1:
+                raise
+            time.sleep(random.uniform(0, min(MAX_DELAY, BASE_DELAY * (2 ** attempt))))
+
+
+def list_active_instances(ec2):
+    # Let EC2 drop terminated/shutting-down instances server side
     paginator = ec2.get_paginator('describe_instances')
-    all_instance_ids = []
-    for page in paginator.paginate():
+    instance_ids = []
+    for page in paginator.paginate(
+        Filters=[{'Name': 'instance-state-name', 'Values': ACTIVE_STATES}],
+        PaginationConfig={'PageSize': 1000}
+    ):
         for reservation in page['Reservations']:
             for instance in reservation['Instances']:
-                all_instance_ids.append(instance['InstanceId'])
+                instance_ids.append(instance['InstanceId'])
+    return instance_ids
 
-    results = []
 
-    for instance_id in all_instance_ids:
+def disable_protection(ec2, instance_id):
+    try:
         # Get the current disableApiTermination attribute
-        attr = ec2.describe_instance_attribute(
+        attr = call_with_backoff(
+            ec2.describe_instance_attribute,
             InstanceId=instance_id,
             Attribute='disableApiTermination'
         )
-        val = attr['DisableApiTermination']['Value']
-        if val:
-            # Disable termination protection
-            ec2.modify_instance_attribute(
-                InstanceId=instance_id,
-                DisableApiTermination={'Value': False}
-            )
-            msg = f"Disabled termination protection for instance {instance_id}"
-        else:
-            msg = f"Termination protection already off for {instance_id}"
-        print(msg)
-        results.append(msg)
+        if not attr['DisableApiTermination']['Value']:
+            return 'already_off', f"Termination protection already off for {instance_id}"
+
+        # Disable termination protection
+        call_with_backoff(
+            ec2.modify_instance_attribute,
+            InstanceId=instance_id,
+            DisableApiTermination={'Value': False}
+        )
+        return 'disabled', f"Disabled termination protection for instance {instance_id}"
+    except ClientError as e:
+        return 'failed', f"Failed to process {instance_id}: {e}"
+
+
+def process_region(ec2, region, metrics):
+    started = time.perf_counter()
+    instance_ids = list_active_instances(ec2)
+    listed = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        outcomes = list(pool.map(lambda i: disable_protection(ec2, i), instance_ids))
+    finished = time.perf_counter()
+
+    counts = {'disabled': 0, 'already_off': 0, 'failed': 0}
+    for status, msg in outcomes:
+        counts[status] += 1
+        log(f"[{region}] {msg}")
+    metrics.add(region, instances=len(instance_ids), **counts)
+
+    summary = {
+        "region": region,
+        "instances": len(instance_ids),
+        **counts,
+        "throttles": metrics.regions.get(region, {}).get('throttles', 0),
+        "list_seconds": round(listed - started, 3),
+        "modify_seconds": round(finished - listed, 3),
+        "total_seconds": round(finished - started, 3)
+    }
+    return [msg for _, msg in outcomes], summary
 
+
+@measure_cold_start(_INIT_STARTED)
+def lambda_handler(event, context):
+    metrics = start_run('DisableTerminationProtection')
+    regions = resolve_regions(event)
+
+    with ThreadPoolExecutor(max_workers=min(REGION_WORKERS, len(regions)) or 1) as pool:
+        per_region = list(pool.map(lambda r: process_region(_clients.get(r), r, metrics), regions))
+
+    results = []
+    regions_summary = []
+    for details, summary in per_region:
+        results.extend(details)
+        regions_summary.append(summary)
+
+    totals = metrics.emit([
+        ('Instances', 'Count', metrics.totals.get('instances', 0)),
+        ('ProtectionDisabled', 'Count', metrics.totals.get('disabled', 0)),
+        ('Failures', 'Count', metrics.totals.get('failed', 0)),
+    ])
     return {
-        "message": f"Processed {len(all_instance_ids)} EC2 instances.",
-        "details": results
-    }
\ No newline at end of file
+        "message": f"Processed {totals.get('instances', 0)} EC2 instances across {len(regions)} region(s).",
+        "details": results,
+        "summary": {
+            "regions": regions_summary,
+            "workers": MAX_WORKERS,
+            "api_calls": totals.get('api_calls', 0),
+            "throttles": totals.get('throttles', 0),
+            "latency_ms": totals['latency_ms'],
+            "total_seconds": totals['duration_seconds']
+        }
+    }
+
@@ -1,10 +1,91 @@
-import boto3
+import time
+_INIT_STARTED = time.perf_counter()
+
 import os
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from cleanup_metrics import RegionClients, log, measure_cold_start, start_run
 
-def lambda_handler(event, context):
-    s3 = boto3.resource('s3')
-    client = boto3.client('s3')
+REGION_WORKERS = int(os.getenv('REGION_WORKERS', '8'))
+
+# Reused across warm invocations: pooled keep-alive connections, adaptive retries
+S3_CONFIG = Config(
+    retries={'max_attempts': 5, 'mode': 'adaptive'},
+    max_pool_connections=int(os.getenv('MAX_POOL_CONNECTIONS', '32')),
+    tcp_keepalive=True
+)
+
+
+_clients = RegionClients('s3', S3_CONFIG)
+
+
+def resolve_regions(event):
+    # Optional region filter from the event or the REGIONS env var (empty = all)
+    regions = (event or {}).get('regions') or os.getenv('REGIONS', '')
+    if isinstance(regions, str):
+        regions = [r.strip() for r in regions.split(',') if r.strip()]
+    return set(regions)
+
+
+def bucket_region(client, bucket_name):
+    # Buckets in us-east-1 report no LocationConstraint; 'EU' is the legacy eu-west-1 alias
+    location = client.get_bucket_location(Bucket=bucket_name).get('LocationConstraint')
+    if not location:
+        return 'us-east-1'
+    if location == 'EU':
+        return 'eu-west-1'
+    return location
+
+
+def empty_bucket(client, bucket_name):
+    # Check if bucket versioning is enabled
+    versioning = client.get_bucket_versioning(Bucket=bucket_name)
+    is_versioned = versioning.get("Status") == "Enabled"
+    deleted = 0
+    reclaimed = 0
+
+    if is_versioned:
+        log(f"Bucket {bucket_name} is versioned. Deleting all versions and delete markers.")
+        # Delete all versions (including delete markers)
+        paginator = client.get_paginator('list_object_versions')
+        for page in paginator.paginate(Bucket=bucket_name):
+            versions = page.get('Versions', []) + page.get('DeleteMarkers', [])
+            for obj in versions:
+                client.delete_object(
+                    Bucket=bucket_name,
+                    Key=obj['Key'],
+                    VersionId=obj['VersionId']
+                )
+                deleted += 1
+                reclaimed += obj.get('Size', 0)  # delete markers have no size
+    else:
+        log(f"Bucket {bucket_name} is not versioned. Deleting all objects.")
+        paginator = client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name):
+            for obj in page.get('Contents', []):
+                client.delete_object(Bucket=bucket_name, Key=obj['Key'])
+                deleted += 1
+                reclaimed += obj['Size']
+
+    return deleted, reclaimed
+
+
+def process_region(client, region, bucket_names, metrics):
     results = []
+    for bucket_name in bucket_names:
+        deleted, reclaimed = empty_bucket(client, bucket_name)
+        metrics.add(region, bucket_name, buckets_emptied=1, objects_deleted=deleted, bytes_reclaimed=reclaimed)
+        msg = f"Emptied bucket: {bucket_name} [{region}] ({deleted} objects/versions deleted)"
+        log(msg)
+        results.append(msg)
+    return results
+
+
+@measure_cold_start(_INIT_STARTED)
+def lambda_handler(event, context):
+    metrics = start_run('clean_buckets')
+    s3 = _clients.get(os.getenv('AWS_REGION', 'us-east-1'))
+    regions = resolve_regions(event)
 
     # Get and normalize the env variable ONCE at the top
     excluded = os.getenv('EXCLUDED_BUCKET_NAME')
@@ -13,48 +94,39 @@ def lambda_handler(event, context):
     else:
         excluded = ""  # fallback -- never matches but don't crash
 
-    for bucket in s3.buckets.all():
-        bucket_name = bucket.name
+    # Group buckets by their home region so every call goes straight to it
+    by_region = {}
+    for bucket in s3.list_buckets()['Buckets']:
+        bucket_name = bucket['Name']
         # Normalize bucket_name for comparison
         bucket_name_norm = bucket_name.strip().lower()
-        print(f"Processing bucket: {bucket_name}")
-        print(f"Exclude '{excluded}'")
-        print(f"repr(bucket_name)={repr(bucket_name)}, repr(excluded)={repr(excluded)}")
+        log(f"Processing bucket: {bucket_name}")
 
         # Skip the excluded bucket
         if bucket_name_norm == excluded:
-            print(f"Skipping bucket: {bucket_name} (excluded)")
+            log(f"Skipping bucket: {bucket_name} (excluded)")
             continue
-    
-
-        # Check if bucket versioning is enabled
-        versioning = client.get_bucket_versioning(Bucket=bucket_name)
-        is_versioned = versioning.get("Status") == "Enabled"
-        deleted = 0
-
-        if is_versioned:
-            print(f"Bucket {bucket_name} is versioned. Deleting all versions and delete markers.")
-            # Delete all versions (including delete markers)
-            paginator = client.get_paginator('list_object_versions')
-            for page in paginator.paginate(Bucket=bucket_name):
-                versions = page.get('Versions', []) + page.get('DeleteMarkers', [])
-                for obj in versions:
-                    client.delete_object(
-                        Bucket=bucket_name,
-                        Key=obj['Key'],
-                        VersionId=obj['VersionId']
-                    )
-                    deleted += 1
-        else:
-            print(f"Bucket {bucket_name} is not versioned. Deleting all objects.")
-            paginator = client.get_paginator('list_objects_v2')
-            for page in paginator.paginate(Bucket=bucket_name):
-                for obj in page.get('Contents', []):
-                    client.delete_object(Bucket=bucket_name, Key=obj['Key'])
-                    deleted += 1
-
-        msg = f"Emptied bucket: {bucket_name} ({deleted} objects/versions deleted)"
-        print(msg)
-        results.append(msg)
 
-    return {"results": results}
\ No newline at end of file
+        region = bucket_region(s3, bucket_name)
+        if regions and region not in regions:
+            log(f"Skipping bucket: {bucket_name} (region {region} not selected)")
+            continue
+        by_region.setdefault(region, []).append(bucket_name)
+
+    results = []
+    if by_region:
+        with ThreadPoolExecutor(max_workers=min(REGION_WORKERS, len(by_region))) as pool:
+            futures = [
+                pool.submit(process_region, _clients.get(region), region, names, metrics)
+                for region, names in sorted(by_region.items())
+            ]
+            for future in futures:
+                results.extend(future.result())
+
+    summary = metrics.emit([
+        ('BucketsEmptied', 'Count', metrics.totals.get('buckets_emptied', 0)),
+        ('ObjectsDeleted', 'Count', metrics.totals.get('objects_deleted', 0)),
+        ('BytesReclaimed', 'Bytes', metrics.totals.get('bytes_reclaimed', 0)),
+    ])
+    return {"results": results, "summary": summary}
+
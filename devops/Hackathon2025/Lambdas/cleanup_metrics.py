@@ -0,0 +1,225 @@
+"""
+Run metrics for the cleanup Lambdas.
+
+Counts API calls, retries, throttles and call latency through botocore event
+hooks, collects per-region/per-bucket counters reported by the handlers, and
+emits one CloudWatch Embedded Metric Format (EMF) line at the end of the run.
+Also holds the pieces both handlers share: cached per-region clients and
+cold-start timing. Package this file next to the handler module.
+"""
+
+import functools
+import json
+import os
+import threading
+import time
+
+import boto3
+
+NAMESPACE = os.getenv('METRICS_NAMESPACE', 'Hackathon2025/Cleanup')
+THROTTLE_CODES = {'Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'SlowDown', 'TooManyRequestsException'}
+
+# Per-object/per-instance log lines are off unless VERBOSE is set
+VERBOSE = os.getenv('VERBOSE', '').strip().lower() in ('1', 'true', 'yes')
+
+_current = None
+
+
+def log(msg):
+    if VERBOSE:
+        print(msg)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class RunMetrics:
+    """Thread-safe counters for one handler invocation."""
+
+    def __init__(self, function_name):
+        self.function_name = function_name
+        self.started = time.perf_counter()
+        self.totals = {}
+        self.regions = {}
+        self.buckets = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+
+    def add(self, region=None, bucket=None, **counts):
+        with self._lock:
+            targets = [self.totals]
+            if region:
+                targets.append(self.regions.setdefault(region, {}))
+            if bucket:
+                targets.append(self.buckets.setdefault(bucket, {}))
+            for target in targets:
+                for name, value in counts.items():
+                    target[name] = target.get(name, 0) + value
+
+    def record_call(self, region, bucket, seconds, retries, failed):
+        self.add(region, bucket, api_calls=1, retries=retries, errors=1 if failed else 0)
+        with self._lock:
+            self._latencies.setdefault(region, []).append(seconds * 1000.0)
+
+    def latency(self, region=None):
+        with self._lock:
+            if region:
+                values = list(self._latencies.get(region, []))
+            else:
+                values = [v for vs in self._latencies.values() for v in vs]
+        return {f"p{p}": round(percentile(values, p), 2) for p in (50, 90, 99)}
+
+    def summary(self):
+        regions = {}
+        for region, counts in sorted(self.regions.items()):
+            regions[region] = {**counts, 'latency_ms': self.latency(region)}
+        return {
+            **self.totals,
+            'latency_ms': self.latency(),
+            'duration_seconds': round(time.perf_counter() - self.started, 3),
+            'regions': regions,
+            'buckets': dict(sorted(self.buckets.items()))
+        }
+
+    def emit(self, extra=None):
+        """Print the run's aggregates as a single EMF line and return the full summary dict (with buckets)."""
+        summary = self.summary()
+        latency = summary['latency_ms']
+        values = {
+            'ApiCalls': ('Count', summary.get('api_calls', 0)),
+            'ApiErrors': ('Count', summary.get('errors', 0)),
+            'Retries': ('Count', summary.get('retries', 0)),
+            'Throttles': ('Count', summary.get('throttles', 0)),
+            'LatencyP50': ('Milliseconds', latency['p50']),
+            'LatencyP90': ('Milliseconds', latency['p90']),
+            'LatencyP99': ('Milliseconds', latency['p99']),
+            'Duration': ('Seconds', summary['duration_seconds']),
+        }
+        for name, unit, value in (extra or []):
+            values[name] = (unit, value)
+
+        document = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': NAMESPACE,
+                    'Dimensions': [['FunctionName']],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (unit, _) in values.items()]
+                }]
+            },
+            'FunctionName': self.function_name,
+            **{name: value for name, (_, value) in values.items()},
+            # Bounded by the region count; the per-bucket breakdown is unbounded and could push the
+            # line past CloudWatch Logs' 256 KB event limit, so it is only returned in the summary
+            'Regions': summary['regions']
+        }
+        print(json.dumps(document, default=str))
+        return summary
+
+
+class RegionClients:
+    """Lazily created, instrumented client per region, shared by threads and warm invocations."""
+
+    def __init__(self, service, config=None):
+        self.service = service
+        self.config = config
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def get(self, region):
+        with self._lock:
+            if region not in self._clients:
+                self._clients[region] = instrument(
+                    boto3.client(self.service, region_name=region, config=self.config)
+                )
+            return self._clients[region]
+
+
+def measure_cold_start(init_started):
+    """
+    Log module init time next to handler time so cold vs warm starts show up in CloudWatch.
+
+    Apply as @measure_cold_start(_INIT_STARTED), where _INIT_STARTED is taken on
+    the handler module's first line; init ends when the decorator is applied.
+    """
+    init_seconds = time.perf_counter() - init_started
+
+    def decorator(handler):
+        state = {'cold': True}
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            started = time.perf_counter()
+            try:
+                return handler(event, context)
+            finally:
+                print(
+                    f"Timing: cold_start={state['cold']} "
+                    f"init_seconds={init_seconds if state['cold'] else 0:.3f} "
+                    f"handler_seconds={time.perf_counter() - started:.3f}"
+                )
+                state['cold'] = False
+
+        return wrapper
+
+    return decorator
+
+
+def start_run(function_name):
+    """Begin collecting metrics for a new invocation."""
+    global _current
+    _current = RunMetrics(function_name)
+    return _current
+
+
+def _before_call(region, params, context, **kwargs):
+    context['metrics_started'] = time.perf_counter()
+    context['metrics_bucket'] = params.get('Bucket')
+
+
+def _after_call(region, parsed, context, **kwargs):
+    if _current is None or 'metrics_started' not in context:
+        return
+    metadata = parsed.get('ResponseMetadata', {})
+    _current.record_call(
+        region, context.get('metrics_bucket'),
+        time.perf_counter() - context['metrics_started'],
+        metadata.get('RetryAttempts', 0),
+        'Error' in parsed
+    )
+
+
+def _after_call_error(region, context, **kwargs):
+    if _current is None or 'metrics_started' not in context:
+        return
+    _current.record_call(
+        region, context.get('metrics_bucket'),
+        time.perf_counter() - context['metrics_started'], 0, True
+    )
+
+
+def _needs_retry(region, response=None, request_dict=None, **kwargs):
+    # Fires after every attempt, so throttles absorbed by botocore retries are counted too
+    if _current is None or response is None:
+        return None
+    code = response[1].get('Error', {}).get('Code')
+    if code in THROTTLE_CODES:
+        bucket = (request_dict or {}).get('context', {}).get('metrics_bucket')
+        _current.add(region, bucket, throttles=1)
+    return None
+
+
+def instrument(client):
+    """Attach metric hooks to a boto3 client; they report into the current run."""
+    region = client.meta.region_name
+    events = client.meta.events
+    events.register('before-call', functools.partial(_before_call, region))
+    events.register('after-call', functools.partial(_after_call, region))
+    events.register('after-call-error', functools.partial(_after_call_error, region))
+    events.register('needs-retry', functools.partial(_needs_retry, region))
+    return client
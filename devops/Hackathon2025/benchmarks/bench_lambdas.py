@@ -0,0 +1,246 @@
+"""
+Cleanup Lambda Benchmark
+Seeds an in-process moto S3/EC2 stand-in with a configurable account shape,
+runs clean_buckets and DisableTerminationProtection against it, and reports
+wall time, API calls issued and calls per object/instance. No network or AWS
+credentials are needed, so it can gate deletion-strategy changes in CI.
+Requires boto3 and moto (pip install "moto[s3,ec2]").
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Fake credentials before boto3 is imported anywhere
+os.environ.setdefault('AWS_ACCESS_KEY_ID', 'testing')
+os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'testing')
+os.environ.setdefault('AWS_SESSION_TOKEN', 'testing')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ.pop('VERBOSE', None)
+
+import boto3
+from moto import mock_aws
+
+LAMBDAS_DIR = Path(__file__).resolve().parent.parent / 'Lambdas'
+sys.path.insert(0, str(LAMBDAS_DIR))
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def seed_buckets(regions: List[str], buckets: int, versioned_ratio: float,
+                 objects: int, versions: int, object_size: int) -> int:
+    """
+    Create buckets spread round-robin over regions and fill them with objects.
+
+    Returns:
+        Number of object versions written (the work clean_buckets must delete)
+    """
+    body = b'x' * object_size
+    written = 0
+    versioned_count = int(round(buckets * versioned_ratio))
+
+    for b in range(buckets):
+        region = regions[b % len(regions)]
+        client = boto3.client('s3', region_name=region)
+        name = f"bench-bucket-{b:04d}"
+        if region == 'us-east-1':
+            client.create_bucket(Bucket=name)
+        else:
+            client.create_bucket(Bucket=name, CreateBucketConfiguration={'LocationConstraint': region})
+
+        versioned = b < versioned_count
+        if versioned:
+            client.put_bucket_versioning(Bucket=name, VersioningConfiguration={'Status': 'Enabled'})
+
+        for o in range(objects):
+            for _ in range(versions if versioned else 1):
+                client.put_object(Bucket=name, Key=f"data/object-{o:06d}", Body=body)
+                written += 1
+
+    return written
+
+
+def seed_instances(regions: List[str], instances: int, protected_ratio: float) -> int:
+    """
+    Launch instances spread over regions, protecting a share of them.
+
+    Returns:
+        Number of instances with termination protection enabled
+    """
+    protected = 0
+    per_region = [instances // len(regions)] * len(regions)
+    for i in range(instances % len(regions)):
+        per_region[i] += 1
+
+    for region, count in zip(regions, per_region):
+        if not count:
+            continue
+        ec2 = boto3.client('ec2', region_name=region)
+        image_id = ec2.describe_images()['Images'][0]['ImageId']
+        launched = []
+        while len(launched) < count:
+            batch = min(500, count - len(launched))
+            response = ec2.run_instances(ImageId=image_id, MinCount=batch, MaxCount=batch)
+            launched.extend(inst['InstanceId'] for inst in response['Instances'])
+
+        for instance_id in launched[:int(round(count * protected_ratio))]:
+            ec2.modify_instance_attribute(InstanceId=instance_id, DisableApiTermination={'Value': True})
+            protected += 1
+
+    return protected
+
+
+def run_handler(handler, event: Dict[str, Any]) -> Dict[str, Any]:
+    """Invoke a handler with its log output captured, returning result and wall time."""
+    captured = io.StringIO()
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(captured):
+        result = handler(event, None)
+    return {'result': result, 'wall_seconds': time.perf_counter() - started}
+
+
+def benchmark(args) -> Dict[str, Any]:
+    """Seed the stand-in account, run both handlers and collect the report."""
+    regions = [r.strip() for r in args.regions.split(',') if r.strip()]
+    report = {'shape': vars(args).copy()}
+
+    with mock_aws():
+        import clean_buckets
+        import DisableTerminationProtection
+
+        if args.buckets:
+            logger.info(f"Seeding {args.buckets} bucket(s) across {len(regions)} region(s)...")
+            started = time.perf_counter()
+            versions_written = seed_buckets(
+                regions, args.buckets, args.versioned_ratio,
+                args.objects, args.versions, args.object_size
+            )
+            logger.info(f"Seeded {versions_written:,} object versions in {time.perf_counter() - started:.1f}s")
+
+            run = run_handler(clean_buckets.lambda_handler, {'regions': regions})
+            summary = run['result']['summary']
+            report['clean_buckets'] = {
+                'wall_seconds': round(run['wall_seconds'], 3),
+                'objects_seeded': versions_written,
+                'objects_deleted': summary.get('objects_deleted', 0),
+                'bytes_reclaimed': summary.get('bytes_reclaimed', 0),
+                'api_calls': summary.get('api_calls', 0),
+                'calls_per_object': round(summary.get('api_calls', 0) / max(versions_written, 1), 3),
+                'objects_per_second': round(versions_written / max(run['wall_seconds'], 1e-9), 1),
+                'latency_ms': summary['latency_ms']
+            }
+
+        if args.instances:
+            logger.info(f"Seeding {args.instances} instance(s) across {len(regions)} region(s)...")
+            started = time.perf_counter()
+            protected = seed_instances(regions, args.instances, args.protected_ratio)
+            logger.info(f"Seeded {args.instances:,} instances ({protected:,} protected) "
+                        f"in {time.perf_counter() - started:.1f}s")
+
+            run = run_handler(DisableTerminationProtection.lambda_handler, {'regions': regions})
+            summary = run['result']['summary']
+            report['disable_termination_protection'] = {
+                'wall_seconds': round(run['wall_seconds'], 3),
+                'instances_seeded': args.instances,
+                'protected_seeded': protected,
+                'api_calls': summary.get('api_calls', 0),
+                'calls_per_instance': round(summary.get('api_calls', 0) / max(args.instances, 1), 3),
+                'instances_per_second': round(args.instances / max(run['wall_seconds'], 1e-9), 1),
+                'latency_ms': summary['latency_ms']
+            }
+
+    return report
+
+
+def check_budgets(report: Dict[str, Any], args) -> List[str]:
+    """Return a list of budget violations (empty when the run is within limits)."""
+    failures = []
+    buckets = report.get('clean_buckets')
+    if buckets:
+        if buckets['objects_deleted'] != buckets['objects_seeded']:
+            failures.append(f"clean_buckets deleted {buckets['objects_deleted']} of "
+                            f"{buckets['objects_seeded']} object versions")
+        if args.max_calls_per_object is not None and buckets['calls_per_object'] > args.max_calls_per_object:
+            failures.append(f"clean_buckets issued {buckets['calls_per_object']} calls/object "
+                            f"(budget {args.max_calls_per_object})")
+    instances = report.get('disable_termination_protection')
+    if instances and args.max_calls_per_instance is not None \
+            and instances['calls_per_instance'] > args.max_calls_per_instance:
+        failures.append(f"DisableTerminationProtection issued {instances['calls_per_instance']} "
+                        f"calls/instance (budget {args.max_calls_per_instance})")
+    return failures
+
+
+def parse_arguments():
+    """Parse command-line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the cleanup Lambdas against a local moto S3/EC2 stand-in.",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python bench_lambdas.py
+  python bench_lambdas.py --buckets 20 --objects 200 --versions 3 --instances 2000
+  python bench_lambdas.py --regions us-east-1,eu-west-1,ap-south-1 --json-output bench.json
+  python bench_lambdas.py --max-calls-per-object 1.1 --max-calls-per-instance 2.5
+        """
+    )
+
+    parser.add_argument('--regions', default='us-east-1,ap-south-1',
+                        help='Comma-separated regions to spread resources over (default: us-east-1,ap-south-1)')
+    parser.add_argument('--buckets', type=int, default=4, help='Number of buckets (default: 4)')
+    parser.add_argument('--versioned-ratio', type=float, default=0.5,
+                        help='Share of buckets with versioning enabled (default: 0.5)')
+    parser.add_argument('--objects', type=int, default=100, help='Objects per bucket (default: 100)')
+    parser.add_argument('--versions', type=int, default=2,
+                        help='Versions per object in versioned buckets (default: 2)')
+    parser.add_argument('--object-size', type=int, default=1024, help='Object size in bytes (default: 1024)')
+    parser.add_argument('--instances', type=int, default=500, help='Number of EC2 instances (default: 500)')
+    parser.add_argument('--protected-ratio', type=float, default=0.5,
+                        help='Share of instances with termination protection (default: 0.5)')
+    parser.add_argument('--max-calls-per-object', type=float,
+                        help='Fail if clean_buckets exceeds this many API calls per object version')
+    parser.add_argument('--max-calls-per-instance', type=float,
+                        help='Fail if DisableTerminationProtection exceeds this many API calls per instance')
+    parser.add_argument('--json-output', help='Write the report as JSON to this file')
+
+    return parser.parse_args()
+
+
+def main():
+    """Main execution function."""
+    args = parse_arguments()
+
+    report = benchmark(args)
+    failures = check_budgets(report, args)
+    report['failures'] = failures
+
+    if args.json_output:
+        Path(args.json_output).write_text(json.dumps(report, indent=2))
+        logger.info(f"Report written to: {args.json_output}")
+
+    print("\n" + "="*60)
+    print("CLEANUP LAMBDA BENCHMARK")
+    print("="*60)
+    for name in ('clean_buckets', 'disable_termination_protection'):
+        if name in report:
+            print(f"\n{name}:")
+            for key, value in report[name].items():
+                print(f"  - {key}: {value}")
+
+    if failures:
+        for failure in failures:
+            logger.error(failure)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()